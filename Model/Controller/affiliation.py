@@ -0,0 +1,281 @@
+"""Local large-institution detection from preview markdown.
+
+The gazetteer (``AFFILIATION_GAZETTEER_PATH``) lists large institutions with
+their aliases, e-mail domains and case-sensitive acronyms. They are compiled
+into trie-shaped regexes (:func:`Controller.pattern_index.trie_regex`), so one
+scan per line finds every alias. Acronyms that are ordinary words (``Meta``,
+``Apple``, ``FAIR``) are listed as ``context_acronyms`` and only count when
+they form a whole comma-separated segment or share the line with an
+institution cue. Only the affiliation region is scanned: the non-heading
+lines before the abstract, minus the title line, plus footnote lines
+(e-mails, corresponding author, ...) anywhere in the preview.
+
+:meth:`AffiliationMatcher.classify` returns
+
+* ``large`` – the first institution cue is a gazetteer alias,
+* ``small`` – institution cues (University, Institute, e-mail domain, ...) are
+  present and no gazetteer alias occurs in the affiliation region,
+* ``ambiguous`` – anything else (no front matter found, a large institution
+  after another one, only an internship footnote, ...); these go to the LLM.
+
+  python Controller/affiliation.py data/preview_pdf_to_mineru/2025-01-01/*.md
+  python Controller/affiliation.py --report            # 对照历史 data/pdf_info 结果
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from config.config import AFFILIATION_GAZETTEER_PATH, AFFILIATION_SHORTCUT, DATA_ROOT  # noqa: E402
+from Controller.pattern_index import trie_regex  # noqa: E402
+
+FRONT_MAX_LINES = 80
+ABSTRACT_MAX_CHARS = 4000
+
+FRONT_END_RE = re.compile(
+    r"^\s*(?:#+\s*)?(?:\*\*|__)?\s*(?:abstract\b|摘\s*要|(?:1\.?|I\.)?\s*introduction\b)",
+    re.I,
+)
+ABSTRACT_RE = re.compile(r"^\s*(?:#+\s*)?(?:\*\*|__)?\s*(?:abstract\b|摘\s*要)\s*(?:\*\*|__)?\s*[:：.—–-]?\s*", re.I)
+FOOTNOTE_RE = re.compile(r"@[\w-]+\.[\w.-]+|correspond|affiliat|equal contribution|work (?:was )?done|通讯作者|通信作者", re.I)
+WEAK_RE = re.compile(r"\bintern(?:ship)?\b|work (?:was )?done|\bwhile (?:at|visiting)\b|\bvisiting\b|实习", re.I)
+CUE_RE = re.compile(
+    r"\b(?:universit(?:y|ies|é|ä|à|at|ade|ad)\w*|institut(?:e|o|)\b|college\b|school of\b|laborator(?:y|ies)\b|labs?\b|"
+    r"academy\b|cent(?:er|re)\b|inc\b|ltd\b|corp(?:oration)?\b|company\b|research\b|hospital\b|foundation\b)"
+    r"|大学|研究院|研究所|实验室|学院|公司"
+    r"|@(?!(?:gmail|googlemail|outlook|hotmail|live|yahoo|icloud|qq|foxmail|163|126|protonmail)\.)[\w-]+(?:\.[\w-]+)+",
+    re.I,
+)
+MARKUP_RE = re.compile(r"\$[^$]{0,40}\$|<[^>]+>|[*_]{1,2}|[†‡§¶]|[⁰¹²³⁴⁵⁶⁷⁸⁹]+")
+# 文本抽取后粘在机构名前的脚注标记（"1Google Research"、"aStanford University"）
+MARKER_RE = re.compile(r"(?<!\w)(?:\d{1,2}|[a-z])(?=[A-Z])")
+
+
+class Decision(NamedTuple):
+    verdict: str  # large | small | ambiguous
+    institution: str
+    reason: str
+
+
+def _bounded(words: List[str], flags: int) -> Optional["re.Pattern"]:
+    """Alternation over ``words``; ASCII words are matched as whole words, CJK ones anywhere.
+
+    A digit may directly precede an ASCII word, so "1Google" (a glued footnote marker) still matches.
+    """
+    ascii_words = [w for w in words if w[0].isascii()]
+    other = [w for w in words if not w[0].isascii()]
+    parts = []
+    if ascii_words:
+        parts.append(r"(?<![A-Za-z_.-])(?:" + trie_regex(ascii_words) + r")(?![\w-])")
+    if other:
+        parts.append("(?:" + trie_regex(other) + ")")
+    return re.compile("|".join(parts), flags) if parts else None
+
+
+class AffiliationMatcher:
+    def __init__(self, path: str = AFFILIATION_GAZETTEER_PATH) -> None:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        self.path = path
+        self.aliases: Dict[str, str] = {}
+        self.acronyms: Dict[str, str] = {}
+        self.context_acronyms: Dict[str, str] = {}
+        for inst in data.get("institutions") or []:
+            name = inst["name"]
+            for a in inst.get("aliases") or []:
+                self.aliases[" ".join(a.split()).lower()] = name
+            for a in inst.get("acronyms") or []:
+                self.acronyms[a.strip()] = name
+            for a in inst.get("context_acronyms") or []:
+                self.context_acronyms[a.strip()] = name
+        self._alias_re = _bounded(sorted(self.aliases), re.I)
+        self._acronym_re = _bounded(sorted(self.acronyms), 0)
+        self._context_re = _bounded(sorted(self.context_acronyms), 0)
+
+    def large_matches(self, line: str) -> List[Tuple[int, int, str]]:
+        """``(start, end, institution)`` for every gazetteer hit in ``line``, longest first at a position."""
+        hits = []
+        if self._alias_re is not None:
+            hits += [(m.start(), m.end(), self.aliases[m.group().lower()]) for m in self._alias_re.finditer(line)]
+        if self._acronym_re is not None:
+            hits += [(m.start(), m.end(), self.acronyms[m.group()]) for m in self._acronym_re.finditer(line)]
+        if self._context_re is not None:
+            ctx = [(m.start(), m.end(), self.context_acronyms[m.group()]) for m in self._context_re.finditer(line)]
+            if ctx:
+                # "Meta Learning ..." 不算；"FAIR, Meta" 或 "Meta, Menlo Park" / "Apple Inc." 这类机构行才算
+                cue = any(not any(s <= m.start() < e for s, e, _ in ctx) for m in CUE_RE.finditer(line))
+                hits += [h for h in ctx if cue or _segment(line, h[0]) == line[h[0] : h[1]]]
+        hits.sort(key=lambda h: (h[0], -h[1]))
+        return hits
+
+    def classify(self, text: str) -> Decision:
+        lines = text.splitlines()
+        end = next((i for i, ln in enumerate(lines[:FRONT_MAX_LINES]) if FRONT_END_RE.match(ln)), None)
+        if end is None:
+            return Decision("ambiguous", "", "no abstract / introduction in the first lines")
+        front = [ln for ln in lines[:end] if ln.strip()]
+        if front and not front[0].lstrip().startswith("#"):
+            # 标题未识别成标题行时，第一行仍是论文标题，不参与机构匹配
+            front = front[1:]
+        region = [ln for ln in front if not ln.lstrip().startswith("#")]
+        region += [ln for ln in lines[end:] if FOOTNOTE_RE.search(ln)]
+
+        first: Optional[Tuple[str, str]] = None  # (kind, institution / affiliation)
+        large_seen = ""
+        weak_only = False
+        for ln in region:
+            clean = MARKER_RE.sub(" ", MARKUP_RE.sub(" ", ln))
+            hits = self.large_matches(clean)
+            weak = bool(WEAK_RE.search(clean))
+            if hits:
+                if weak and not large_seen:
+                    weak_only = True
+                if not weak:
+                    large_seen = large_seen or hits[0][2]
+            if first is not None:
+                continue
+            cue = next((m for m in CUE_RE.finditer(clean) if not any(s <= m.start() < e for s, e, _ in hits)), None)
+            if hits and not weak and (cue is None or hits[0][0] <= cue.start()):
+                first = ("large", hits[0][2])
+            elif cue is not None:
+                first = ("cue", _affiliation_near(clean, cue.start()))
+
+        if first is None:
+            return Decision("ambiguous", large_seen, "no institution cue")
+        if first[0] == "large":
+            return Decision("large", first[1], "first affiliation is listed")
+        if large_seen:
+            return Decision("ambiguous", large_seen, "listed institution after the first affiliation")
+        if weak_only:
+            return Decision("ambiguous", "", "listed institution only in an internship note")
+        hits = self.large_matches(first[1])
+        if hits:
+            # 兜底：第一个机构片段本身含名录机构时绝不判 small
+            return Decision("ambiguous", hits[0][2], "listed institution inside the first affiliation")
+        return Decision("small", first[1], "no listed institution")
+
+
+def _segment(line: str, pos: int) -> str:
+    """The comma / semicolon separated segment of ``line`` around ``pos``."""
+    start = max(line.rfind(",", 0, pos), line.rfind(";", 0, pos)) + 1
+    ends = [i for i in (line.find(",", pos), line.find(";", pos)) if i >= 0]
+    seg = line[start : min(ends) if ends else len(line)]
+    return " ".join(seg.split()).strip(" .:：0123456789")
+
+
+def _affiliation_near(line: str, pos: int) -> str:
+    return _segment(line, pos)[:120]
+
+
+def abstract_paragraph(text: str) -> str:
+    """The abstract paragraph of a preview, sent instead of the whole preview for gazetteer-decided papers."""
+    lines = text.splitlines()
+    for i, ln in enumerate(lines[:FRONT_MAX_LINES]):
+        m = ABSTRACT_RE.match(ln)
+        if not m:
+            continue
+        body: List[str] = []
+        rest = ln[m.end() :].strip()
+        if rest:
+            body.append(rest)
+        for nxt in lines[i + 1 :]:
+            if not nxt.strip():
+                if body:
+                    break
+                continue
+            if nxt.lstrip().startswith("#"):
+                break
+            body.append(nxt.strip())
+        return " ".join(body)[:ABSTRACT_MAX_CHARS]
+    return ""
+
+
+_MATCHER: Optional[AffiliationMatcher] = None
+
+
+def get_matcher(disabled: bool = False) -> Optional[AffiliationMatcher]:
+    global _MATCHER
+    if disabled or not AFFILIATION_SHORTCUT or not os.path.exists(AFFILIATION_GAZETTEER_PATH):
+        return None
+    if _MATCHER is None:
+        _MATCHER = AffiliationMatcher()
+    return _MATCHER
+
+
+# ---------------- report against historical LLM results ----------------
+
+ARXIV_ID_RE = re.compile(r"(\d{4}\.\d{4,5})")
+
+
+def _ratio(a: int, b: int) -> str:
+    return f"{a / b:.1%}" if b else "-"
+
+
+def report(info_root: Path, preview_root: Path, dates: List[str], matcher: AffiliationMatcher, show: int) -> None:
+    rows = []
+    elapsed = 0.0
+    for date in dates:
+        data = json.loads((info_root / f"{date}.json").read_text(encoding="utf-8"))
+        for item in data:
+            if item.get("decided_by"):
+                continue
+            m = ARXIV_ID_RE.search(str(item.get("source", "")))
+            md = preview_root / date / f"{m.group(1)}.md" if m else None
+            if md is None or not md.exists():
+                continue
+            text = md.read_text(encoding="utf-8", errors="ignore")
+            t0 = time.perf_counter()
+            d = matcher.classify(text)
+            elapsed += time.perf_counter() - t0
+            rows.append((date, m.group(1), d, bool(item.get("is_large")), str(item.get("instution", ""))))
+
+    n = len(rows)
+    if not n:
+        print("no historical pdf_info items with preview md found")
+        return
+    tp = sum(1 for r in rows if r[2].verdict == "large" and r[3])
+    fp = sum(1 for r in rows if r[2].verdict == "large" and not r[3])
+    tn = sum(1 for r in rows if r[2].verdict == "small" and not r[3])
+    fn = sum(1 for r in rows if r[2].verdict == "small" and r[3])
+    amb = n - tp - fp - tn - fn
+    llm_large = sum(1 for r in rows if r[3])
+    print(f"papers={n} dates={len(dates)} llm_large={llm_large} avg_classify={elapsed / n * 1e6:.0f}us")
+    print(f"decided locally: large={tp + fp} small={tn + fn} ambiguous={amb} coverage={_ratio(n - amb, n)}")
+    print(f"large verdicts: precision={_ratio(tp, tp + fp)} recall={_ratio(tp, llm_large)} (of all LLM is_large)")
+    print(f"small verdicts: precision={_ratio(tn, tn + fn)} missed_large={fn}")
+    print(f"agreement on decided={_ratio(tp + tn, n - amb)}  pipeline recall (ambiguous -> LLM)={_ratio(llm_large - fn, llm_large)}")
+    disagree = [r for r in rows if (r[2].verdict == "large") != r[3] and r[2].verdict != "ambiguous"]
+    for date, aid, d, llm, inst in disagree[:show]:
+        print(f"  {date} {aid}: local={d.verdict}({d.institution}) llm={'large' if llm else 'small'}({inst})")
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser("affiliation")
+    ap.add_argument("files", nargs="*", help="preview markdown files to classify")
+    ap.add_argument("--report", action="store_true", help="precision / recall against historical data/pdf_info results")
+    ap.add_argument("--date", action="append", default=None, help="report only these list dates (repeatable)")
+    ap.add_argument("--info-root", default=str(Path(DATA_ROOT) / "pdf_info"))
+    ap.add_argument("--in-md-root", default=str(Path(DATA_ROOT) / "preview_pdf_to_mineru"))
+    ap.add_argument("--show", type=int, default=20, help="disagreements to list in the report")
+    ap.add_argument("--gazetteer", default=AFFILIATION_GAZETTEER_PATH)
+    args = ap.parse_args(argv)
+
+    matcher = AffiliationMatcher(args.gazetteer)
+    if args.report:
+        info_root = Path(args.info_root)
+        dates = args.date or sorted(p.stem for p in info_root.glob("*.json"))
+        report(info_root, Path(args.in_md_root), dates, matcher, args.show)
+    for path in args.files:
+        text = Path(path).read_text(encoding="utf-8", errors="ignore")
+        d = matcher.classify(text)
+        print(f"{os.path.basename(path)}: {d.verdict} {d.institution!r} ({d.reason})")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import asyncio
 import logging
 import re
 import time
@@ -42,8 +43,13 @@ from config.config import (
     USE_PROXY_DEFAULT,
     RETRY_COUNT,
     PROGRESS_SINGLE_LINE,
+    ARXIV_FETCH_MODE,
+    ARXIV_SHARD_DEFAULT,
 )
 from Controller.http_session import build_session
+from Controller.rate_limit import AsyncTokenBucket
+from Controller.pattern_index import MultiPatternScanner, UnsupportedPattern
+from Controller.paper_store import get_store, STAGE_SEARCH
 
 try:
     from zoneinfo import ZoneInfo  # py3.9+
@@ -86,6 +92,16 @@ def compile_patterns() -> Dict[str, re.Pattern]:
 PATTERNS = compile_patterns()
 
 
+def build_scanner() -> Optional[MultiPatternScanner]:
+    try:
+        return MultiPatternScanner({k: PATTERN_REGEX[k] for k in ["CORE"] + list(GROUPS)})
+    except UnsupportedPattern:
+        return None
+
+
+SCANNER = build_scanner()
+
+
 def resolve_timezone(tz_name: Optional[str], logger):
     local_tz = datetime.now().astimezone().tzinfo
     if tz_name:
@@ -125,7 +141,43 @@ def build_arxiv_query() -> str:
     return f"{cats} AND {q}"
 
 
+def build_shard_queries(shard: str, window_start: datetime, window_end: datetime) -> List[str]:
+    terms = "(" + " OR ".join(SEARCH_TERMS) + ")"
+    if shard in ("category", "category_day"):
+        bases = [f"cat:{c} AND {terms}" for c in SEARCH_CATEGORIES]
+    else:
+        bases = [build_arxiv_query()]
+    if shard not in ("day", "category_day"):
+        return bases
+    queries = []
+    day_start = window_start
+    while day_start < window_end:
+        day_end = min(day_start + timedelta(days=1), window_end)
+        lo = day_start.astimezone(timezone.utc).strftime("%Y%m%d%H%M")
+        hi = day_end.astimezone(timezone.utc).strftime("%Y%m%d%H%M")
+        for base in bases:
+            queries.append(f"({base}) AND submittedDate:[{lo} TO {hi}]")
+        day_start = day_end
+    return queries
+
+
+def match_text(text: str) -> Tuple[bool, str, int, Dict[str, int]]:
+    """CORE 是否命中 + (bucket, score, hits)，一次扫描完成全部主题组计数。"""
+    if SCANNER is None:
+        return bool(PATTERNS["CORE"].search(text)), *bucket_and_score_legacy(text)
+    counts = SCANNER.count(text, presence_only=("CORE",))
+    hits = {k: counts[k] for k in GROUPS}
+    score = sum(1 for k in GROUPS if hits[k] > 0)
+    best = max(ORDER_GROUPS, key=lambda k: hits[k])
+    return counts["CORE"] > 0, BUCKET_NAME_MAP[best], score, hits
+
+
 def bucket_and_score(text: str) -> Tuple[str, int, Dict[str, int]]:
+    _core, bucket, score, hits = match_text(text)
+    return bucket, score, hits
+
+
+def bucket_and_score_legacy(text: str) -> Tuple[str, int, Dict[str, int]]:
     hits = {}
     groups = GROUPS
     score = 0
@@ -164,51 +216,85 @@ class Paper:
     arxiv_id: str
     link: str
     bucket: str
+    abstract: str = ""
+    score: int = 0
+
+
+def paper_from_entry(entry, tzinfo, min_score: int) -> Optional[Paper]:
+    title = normalize_text(getattr(entry, "title", ""))
+    abstract = normalize_text(getattr(entry, "summary", ""))
+    full_text = f"{title}\n{abstract}"
+
+    core, bucket, score, _hits = match_text(full_text)
+    if not core or score < min_score:
+        return None
+
+    arxiv_id = arxiv_id_from_entry_url(entry.id)
+    link = f"https://arxiv.org/abs/{arxiv_id}"
+    return Paper(
+        title=title,
+        published_local=entry_published_local_dt(entry, tzinfo),
+        arxiv_id=arxiv_id,
+        link=link,
+        bucket=bucket,
+        abstract=abstract,
+        score=score,
+    )
+
+
+async def fetch_shard_async(session, query: str, limiter: AsyncTokenBucket, tzinfo, window_start, page_size: int, max_entries: int, logger) -> list:
+    entries = []
+    start_idx = 0
+    while len(entries) < max_entries:
+        params = {
+            "search_query": query,
+            "start": start_idx,
+            "max_results": page_size,
+            "sortBy": "submittedDate",
+            "sortOrder": "descending",
+        }
+        await limiter.acquire()
+        feed = await asyncio.to_thread(fetch_page_with_retry, session, params, logger, RETRY_COUNT)
+        if not feed.entries:
+            break
+        stop = False
+        for entry in feed.entries:
+            if entry_published_local_dt(entry, tzinfo) < window_start:
+                stop = True
+                break
+            entries.append(entry)
+        if stop or len(feed.entries) < page_size:
+            break
+        start_idx += page_size
+    return entries
 
 
-def run():
-    print("START arxiv_search.py", flush=True)
-    logger = setup_logging()
-
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--tz", default=None)
-    ap.add_argument("--out", default=None)
-    ap.add_argument("--page-size", type=int, default=PAGE_SIZE_DEFAULT)
-    ap.add_argument("--max-papers", type=int, default=MAX_PAPERS_DEFAULT)
-    ap.add_argument("--sleep", type=float, default=SLEEP_DEFAULT)
-    ap.add_argument("--min-score", type=int, default=MIN_SCORE_DEFAULT)
-    ap.add_argument("--use-proxy", action="store_true", default=USE_PROXY_DEFAULT, help="Allow using proxy from env (default: OFF)")
-    ap.add_argument("--window-days", type=int, default=1)
-    args = ap.parse_args()
-
-    tz_name = args.tz if args.tz else DEFAULT_TZ
-    tzinfo = resolve_timezone(tz_name, logger)
+async def fetch_sharded_async(session, queries: List[str], rate_sleep: float, tzinfo, window_start, page_size: int, max_entries: int, logger) -> list:
+    # 所有分片共享一个全局限速：两次请求间隔不少于 rate_sleep 秒
+    limiter = AsyncTokenBucket(1.0 / rate_sleep if rate_sleep > 0 else 0, burst=1)
+    done = 0
 
-    now_local = datetime.now(tzinfo)
-    days = max(1, int(getattr(args, "window_days", 1) or 1))
-    yesterday = (now_local - timedelta(days=1)).date()
-    start_date = yesterday - timedelta(days=days - 1)
-    window_start = datetime.combine(start_date, dtime.min).replace(tzinfo=tzinfo)
-    window_end = window_start + timedelta(days=days)
+    async def one(q: str) -> list:
+        nonlocal done
+        got = await fetch_shard_async(session, q, limiter, tzinfo, window_start, page_size, max_entries, logger)
+        done += 1
+        print(f"[INFO] Shard 【{done}/{len(queries)}】 done, entries={len(got)}", flush=True)
+        return got
 
-    logger.info("Timezone: %s", tzinfo)
-    logger.info("Window  : %s -> %s", window_start.strftime("%Y-%m-%d %H:%M:%S %Z"), window_end.strftime("%Y-%m-%d %H:%M:%S %Z"))
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    out_filename = now_local.strftime(FILENAME_FMT)
-    out_path = os.path.join(OUTPUT_DIR, out_filename)
-    logger.info("Output  : %s", out_path)
-    logger.info("min-score: %d", args.min_score)
-    logger.info("Proxy from env enabled: %s", args.use_proxy)
+    parts = await asyncio.gather(*(one(q) for q in queries))
+    merged = {}
+    for part in parts:
+        for entry in part:
+            merged.setdefault(arxiv_id_from_entry_url(entry.id), entry)
+    return list(merged.values())
 
-    session = build_session(prefer_env_proxy=bool(args.use_proxy))
 
+def fetch_serial(session, tzinfo, window_start, window_end, page_size: int, args, logger) -> Tuple[List[Paper], int]:
     query = build_arxiv_query()
     results: List[Paper] = []
     start_idx = 0
-    page_size = max(1, min(args.page_size, 2000))
     candidates = 0
     pages = 0
-    print("============开始获取初始可下载列表==============", flush=True)
 
     while len(results) < args.max_papers:
         pages += 1
@@ -243,20 +329,9 @@ def run():
                 continue
 
             candidates += 1
-            title = normalize_text(getattr(entry, "title", ""))
-            abstract = normalize_text(getattr(entry, "summary", ""))
-            full_text = f"{title}\n{abstract}"
-
-            if not PATTERNS["CORE"].search(full_text):
-                continue
-
-            bucket, score, _hits = bucket_and_score(full_text)
-            if score < args.min_score:
-                continue
-
-            arxiv_id = arxiv_id_from_entry_url(entry.id)
-            link = f"https://arxiv.org/abs/{arxiv_id}"
-            results.append(Paper(title=title, published_local=pub_local, arxiv_id=arxiv_id, link=link, bucket=bucket))
+            paper = paper_from_entry(entry, tzinfo, args.min_score)
+            if paper is not None:
+                results.append(paper)
 
         if stop:
             logger.info("Reached entries older than window start; stopping.")
@@ -265,6 +340,76 @@ def run():
         start_idx += page_size
         time.sleep(args.sleep)
 
+    return results, candidates
+
+
+def run(argv=None):
+    print("START arxiv_search.py", flush=True)
+    logger = setup_logging()
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tz", default=None)
+    ap.add_argument("--out", default=None)
+    ap.add_argument("--page-size", type=int, default=PAGE_SIZE_DEFAULT)
+    ap.add_argument("--max-papers", type=int, default=MAX_PAPERS_DEFAULT)
+    ap.add_argument("--sleep", type=float, default=SLEEP_DEFAULT)
+    ap.add_argument("--min-score", type=int, default=MIN_SCORE_DEFAULT)
+    ap.add_argument("--use-proxy", action="store_true", default=USE_PROXY_DEFAULT, help="Allow using proxy from env (default: OFF)")
+    ap.add_argument("--window-days", type=int, default=1)
+    ap.add_argument("--fetch-mode", choices=["auto", "serial", "async"], default=ARXIV_FETCH_MODE)
+    ap.add_argument("--shard", choices=["none", "category", "day", "category_day"], default=ARXIV_SHARD_DEFAULT)
+    args = ap.parse_args(argv)
+
+    tz_name = args.tz if args.tz else DEFAULT_TZ
+    tzinfo = resolve_timezone(tz_name, logger)
+
+    now_local = datetime.now(tzinfo)
+    days = max(1, int(getattr(args, "window_days", 1) or 1))
+    yesterday = (now_local - timedelta(days=1)).date()
+    start_date = yesterday - timedelta(days=days - 1)
+    window_start = datetime.combine(start_date, dtime.min).replace(tzinfo=tzinfo)
+    window_end = window_start + timedelta(days=days)
+
+    logger.info("Timezone: %s", tzinfo)
+    logger.info("Window  : %s -> %s", window_start.strftime("%Y-%m-%d %H:%M:%S %Z"), window_end.strftime("%Y-%m-%d %H:%M:%S %Z"))
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    out_filename = now_local.strftime(FILENAME_FMT)
+    out_path = os.path.join(OUTPUT_DIR, out_filename)
+    logger.info("Output  : %s", out_path)
+    logger.info("min-score: %d", args.min_score)
+    logger.info("Proxy from env enabled: %s", args.use_proxy)
+
+    session = build_session(prefer_env_proxy=bool(args.use_proxy))
+
+    fetch_mode = args.fetch_mode
+    if fetch_mode == "auto":
+        fetch_mode = "async" if days > 1 else "serial"
+    logger.info("Fetch mode: %s (shard=%s)", fetch_mode, args.shard)
+
+    results: List[Paper] = []
+    page_size = max(1, min(args.page_size, 2000))
+    candidates = 0
+    print("============开始获取初始可下载列表==============", flush=True)
+
+    if fetch_mode == "async":
+        queries = build_shard_queries(args.shard, window_start, window_end)
+        logger.info("Shards  : %d", len(queries))
+        entries = asyncio.run(
+            fetch_sharded_async(session, queries, args.sleep, tzinfo, window_start, page_size, max(page_size, args.max_papers * 4), logger)
+        )
+        for entry in entries:
+            pub_local = entry_published_local_dt(entry, tzinfo)
+            if not (window_start <= pub_local < window_end):
+                continue
+            candidates += 1
+            paper = paper_from_entry(entry, tzinfo, args.min_score)
+            if paper is not None:
+                results.append(paper)
+        results.sort(key=lambda p: p.published_local, reverse=True)
+        results = results[: args.max_papers]
+    else:
+        results, candidates = fetch_serial(session, tzinfo, window_start, window_end, page_size, args, logger)
+
     print()  # newline after progress
     print("============结束获取初始可下载列表==============", flush=True)
     results.sort(key=lambda p: p.published_local, reverse=True)
@@ -295,10 +440,27 @@ def run():
                     f.write(f"   - Published: `{pub_str}`  \n")
                     f.write(f"   - arXiv: [{p.arxiv_id}]({p.link})\n\n")
 
+    list_date = os.path.splitext(out_filename)[0]
+    store = get_store()
+    store.upsert_papers(
+        {
+            "arxiv_id": p.arxiv_id,
+            "title": p.title,
+            "abstract": p.abstract,
+            "published": p.published_local.strftime("%Y-%m-%d %H:%M:%S %Z"),
+            "list_date": list_date,
+            "bucket": p.bucket,
+            "score": p.score,
+        }
+        for p in results
+    )
+    store.set_stages([p.arxiv_id for p in results], STAGE_SEARCH, "ok", list_date=list_date)
+
     logger.info("Candidates in window: %d", candidates)
     logger.info("Selected papers     : %d", len(results))
     logger.info("Saved to            : %s", out_path)
     print("END arxiv_search.py", flush=True)
+    return {"date": list_date, "path": out_path, "ids": [p.arxiv_id for p in results]}
 
 
 if __name__ == "__main__":
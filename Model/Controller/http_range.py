@@ -0,0 +1,129 @@
+"""Seekable read-only file over HTTP Range requests.
+
+``HttpRangeReader`` lets ``zipfile`` (or ``pypdf``) read a remote file
+without downloading it: the end of the file is fetched first (it usually
+holds a zip's central directory or a PDF's xref table), later reads fetch
+only the byte ranges they touch, with read-ahead of ``block_size`` bytes.
+Servers that ignore ``Range`` raise :class:`RangeNotSupported` so the caller
+can fall back to a full download; so does running past ``max_requests``
+(the file layout makes ranged reading no cheaper than a full download).
+"""
+
+import io
+import re
+import time
+from typing import Callable, List, Optional, Tuple
+
+import requests
+
+CONTENT_RANGE_RE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+
+class RangeNotSupported(RuntimeError):
+    pass
+
+
+class HttpRangeReader(io.RawIOBase):
+    def __init__(
+        self,
+        url: str,
+        session: Optional[requests.Session] = None,
+        headers: Optional[dict] = None,
+        block_size: int = 256 * 1024,
+        tail_size: int = 64 * 1024,
+        max_retries: int = 3,
+        timeout=(30, 300),
+        max_requests: Optional[int] = None,
+        on_request: Optional[Callable[[], None]] = None,
+    ) -> None:
+        super().__init__()
+        self.url = url
+        self.session = session or requests.Session()
+        self.headers = dict(headers or {})
+        self.block_size = max(4096, int(block_size))
+        self.max_retries = max(1, int(max_retries))
+        self.timeout = timeout
+        self.max_requests = max_requests
+        self.on_request = on_request
+        self.requests = 0
+        self.bytes_fetched = 0
+        self._pos = 0
+        self._chunks: List[Tuple[int, bytes]] = []
+        start, data, total = self._fetch(f"bytes=-{int(tail_size)}")
+        self.size = total
+        self._chunks.append((start, data))
+
+    def _fetch(self, spec: str) -> Tuple[int, bytes, int]:
+        if self.max_requests is not None and self.requests >= self.max_requests:
+            raise RangeNotSupported(f"more than {self.max_requests} range requests for {self.url}")
+        last: Optional[Exception] = None
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                if self.on_request is not None:
+                    self.on_request()
+                with self.session.get(self.url, headers={**self.headers, "Range": spec}, stream=True, timeout=self.timeout) as r:
+                    if r.status_code == 200:
+                        # 服务端忽略 Range 会返回整个文件，不读 body 直接放弃
+                        raise RangeNotSupported(f"server ignored Range for {self.url}")
+                    if 400 <= r.status_code < 500 and r.status_code not in (408, 429):
+                        raise RangeNotSupported(f"HTTP {r.status_code} for {self.url}")
+                    r.raise_for_status()
+                    m = CONTENT_RANGE_RE.match(r.headers.get("Content-Range", ""))
+                    if r.status_code != 206 or not m or m.group(3) == "*":
+                        raise RangeNotSupported(f"unexpected range response {r.status_code} for {self.url}")
+                    data = r.content
+                self.requests += 1
+                self.bytes_fetched += len(data)
+                return int(m.group(1)), data, int(m.group(3))
+            except RangeNotSupported:
+                raise
+            except Exception as e:
+                last = e
+                time.sleep(min(10.0, 2 ** (attempt - 1)))
+        raise RuntimeError(f"range request failed: {spec} {self.url}. last={last!r}")
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError("negative seek position")
+        self._pos = pos
+        return pos
+
+    def _cached(self, pos: int) -> Optional[Tuple[int, bytes]]:
+        for start, data in self._chunks:
+            if start <= pos < start + len(data):
+                return start, data
+        return None
+
+    def readinto(self, b) -> int:
+        if self._pos >= self.size or len(b) == 0:
+            return 0
+        hit = self._cached(self._pos)
+        if hit is None:
+            end = min(self.size, self._pos + max(len(b), self.block_size)) - 1
+            start, data, _ = self._fetch(f"bytes={self._pos}-{end}")
+            hit = (start, data)
+            # 只保留尾块（目录）和最近一块，内存占用与文件大小无关
+            self._chunks = self._chunks[:1] + [hit]
+        start, data = hit
+        off = self._pos - start
+        n = min(len(b), len(data) - off)
+        b[:n] = data[off : off + n]
+        self._pos += n
+        return n
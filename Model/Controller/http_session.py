@@ -6,18 +6,32 @@ from requests.adapters import HTTPAdapter
 from config.config import RETRY_TOTAL, RETRY_BACKOFF, REQUESTS_UA, PROXIES, RESPECT_ENV_PROXIES
 
 
-def build_session(prefer_env_proxy: bool = False) -> requests.Session:
+def build_session(prefer_env_proxy: bool = False, pool_size: int = 10, rate_limited: bool = False) -> requests.Session:
     s = requests.Session()
-    retry = Retry(
-        total=RETRY_TOTAL,
-        connect=RETRY_TOTAL,
-        read=RETRY_TOTAL,
-        backoff_factor=RETRY_BACKOFF,
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["GET", "HEAD"],
-        raise_on_status=False,
-    )
-    adapter = HTTPAdapter(max_retries=retry, pool_connections=10, pool_maxsize=10)
+    if rate_limited:
+        # 调用方按令牌桶限速并自行重试：适配器只重试未发出请求的连接失败，
+        # 429/5xx 与读超时直接返回给调用方，保证每次重发都经过 limiter.acquire()
+        retry = Retry(
+            total=RETRY_TOTAL,
+            connect=RETRY_TOTAL,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=RETRY_BACKOFF,
+            allowed_methods=["GET", "HEAD"],
+            raise_on_status=False,
+        )
+    else:
+        retry = Retry(
+            total=RETRY_TOTAL,
+            connect=RETRY_TOTAL,
+            read=RETRY_TOTAL,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET", "HEAD"],
+            raise_on_status=False,
+        )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=10, pool_maxsize=max(10, int(pool_size)))
     s.mount("http://", adapter)
     s.mount("https://", adapter)
     s.headers.update({"User-Agent": REQUESTS_UA})
@@ -8,6 +8,7 @@ from typing import List, Dict, Any, Tuple
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from config.config import DATA_ROOT  # noqa: E402
+from Controller.paper_store import get_store, STAGE_FILTER  # noqa: E402
 
 
 def find_latest_json(root: Path) -> Tuple[Path, str]:
@@ -42,7 +43,20 @@ def load_items(path: Path) -> List[Dict[str, Any]]:
     return []
 
 
-def run(args: argparse.Namespace) -> None:
+def item_arxiv_id(item: Dict[str, Any]) -> str:
+    m = re.search(r"arxiv,\s*([0-9]+\.[0-9]+)", str(item.get("source") or ""))
+    return m.group(1) if m else ""
+
+
+def record_filter_stage(items: List[Dict[str, Any]], date_str: str) -> None:
+    store = get_store()
+    kept_ids = [item_arxiv_id(it) for it in items if bool(it.get("is_large"))]
+    dropped_ids = [item_arxiv_id(it) for it in items if not bool(it.get("is_large"))]
+    store.set_stages(kept_ids, STAGE_FILTER, "ok", list_date=date_str)
+    store.set_stages(dropped_ids, STAGE_FILTER, "dropped", list_date=date_str)
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
     root = Path(args.input_root)
     if args.input:
         in_path = Path(args.input)
@@ -63,21 +77,23 @@ def run(args: argparse.Namespace) -> None:
         out_path = out_dir / f"{date_str}.json"
     out_dir.mkdir(parents=True, exist_ok=True)
     out_path.write_text(json.dumps(kept, ensure_ascii=False, indent=2), encoding="utf-8")
+    record_filter_stage(items, date_str)
     total = len(items)
     kept_count = len(kept)
     dropped = total - kept_count
     print(f"[FILTER] total={total} kept={kept_count} dropped={dropped}", flush=True)
     print("============结束筛选大机构论文==============", flush=True)
+    return {"date": date_str, "path": str(out_path), "ids": [item_arxiv_id(it) for it in kept]}
 
 
-def main() -> None:
+def main(argv: List[str] | None = None) -> Dict[str, Any]:
     ap = argparse.ArgumentParser("instutions_filter")
     ap.add_argument("--input-root", default=str(Path(DATA_ROOT) / "pdf_info"))
     ap.add_argument("--input", default="")
     ap.add_argument("--output-root", default=str(Path(DATA_ROOT) / "instutions_filter"))
     ap.add_argument("--output", default="")
-    args = ap.parse_args()
-    run(args)
+    args = ap.parse_args(argv)
+    return run(args)
 
 
 if __name__ == "__main__":
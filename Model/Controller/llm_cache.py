@@ -0,0 +1,137 @@
+"""Persistent response cache for chat-completion calls.
+
+Keyed by (model, sha256(system prompt), sha256(user content), temperature,
+max_tokens). Entries are evicted least-recently-used once the stored
+responses exceed ``LLM_CACHE_MAX_MB``. Empty responses are never cached.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Callable, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from config.config import LLM_CACHE_ENABLED, LLM_CACHE_MAX_MB, LLM_CACHE_PATH  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key        TEXT PRIMARY KEY,
+    model      TEXT,
+    response   TEXT NOT NULL,
+    size       INTEGER NOT NULL,
+    created_at REAL,
+    last_used  REAL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used);
+"""
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def make_key(model: str, system_prompt: str, user_content: str, temperature, max_tokens) -> str:
+    parts = [model, _sha256(system_prompt), _sha256(user_content), temperature, max_tokens]
+    return _sha256(json.dumps(parts, ensure_ascii=False))
+
+
+class LLMCache:
+    def __init__(self, path: str = LLM_CACHE_PATH, max_mb: float = LLM_CACHE_MAX_MB) -> None:
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self._total = int(self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0])
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evicted = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT response FROM llm_cache WHERE key=?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE llm_cache SET last_used=? WHERE key=?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model: str, response: str) -> None:
+        if not response:
+            return
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        with self._lock, self.conn:
+            old = self.conn.execute("SELECT size FROM llm_cache WHERE key=?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, size, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now),
+            )
+            self._total += size - (old[0] if old else 0)
+            self.stores += 1
+            self._evict()
+
+    def _evict(self) -> None:
+        if self.max_bytes <= 0 or self._total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        rows = self.conn.execute("SELECT key, size FROM llm_cache ORDER BY last_used").fetchall()
+        drop = []
+        for key, size in rows:
+            if self._total <= target:
+                break
+            drop.append((key,))
+            self._total -= size
+        self.conn.executemany("DELETE FROM llm_cache WHERE key=?", drop)
+        self.evicted += len(drop)
+
+    def summary(self) -> str:
+        return (
+            f"hits={self.hits} misses={self.misses} stores={self.stores} evicted={self.evicted} "
+            f"size={self._total / 1024 / 1024:.1f}MB/{self.max_bytes / 1024 / 1024:.0f}MB"
+        )
+
+
+def open_llm_cache(disabled: bool = False) -> Optional[LLMCache]:
+    if disabled or not LLM_CACHE_ENABLED:
+        return None
+    return LLMCache()
+
+
+def cached_completion(
+    cache: Optional[LLMCache],
+    model: str,
+    system_prompt: str,
+    user_content: str,
+    temperature,
+    max_tokens,
+    call: Callable[[], str],
+    cacheable: Callable[[str], bool] = bool,
+) -> str:
+    """Return the cached response for these inputs, or ``call()`` and cache its result if ``cacheable``."""
+    if cache is None:
+        return call()
+    key = make_key(model, system_prompt, user_content, temperature, max_tokens)
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+    out = call()
+    if cacheable(out):
+        cache.put(key, model, out)
+    return out
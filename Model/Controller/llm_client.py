@@ -0,0 +1,168 @@
+"""Pooled chat-completions client with AIMD concurrency control.
+
+One ``requests.Session`` (keep-alive connection pool) is shared by all worker
+threads. :class:`AIMDLimiter` caps how many requests are in flight: the cap
+grows by one per window of successful calls while latency stays near its
+observed baseline and is halved on 429/5xx. Each request is retried with
+full-jitter exponential backoff, honouring ``Retry-After``.
+"""
+
+import random
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class LLMHTTPError(RuntimeError):
+    def __init__(self, status: int, body: str) -> None:
+        super().__init__(f"HTTP {status}: {body[:200]}")
+        self.status = status
+
+
+class AIMDLimiter:
+    """Adaptive in-flight limit: additive increase, multiplicative decrease."""
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 64, latency_tolerance: float = 1.5) -> None:
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = float(min(self.max_limit, max(self.min_limit, int(initial))))
+        self.latency_tolerance = latency_tolerance
+        self.baseline: Optional[float] = None
+        self.in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency: Optional[float] = None, throttled: bool = False) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self._decrease(latency)
+            elif latency is not None:
+                self._on_success(latency)
+            self._cond.notify_all()
+
+    def _on_success(self, latency: float) -> None:
+        if self.baseline is None:
+            self.baseline = latency
+        else:
+            # 基线跟随最小延迟，缓慢上浮以适应服务端整体变慢
+            self.baseline = min(latency, self.baseline + 0.05 * (latency - self.baseline))
+        if latency <= self.baseline * self.latency_tolerance and self.limit < self.max_limit:
+            before = int(self.limit)
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            if int(self.limit) > before:
+                self.increases += 1
+
+    def _decrease(self, latency: Optional[float]) -> None:
+        now = time.monotonic()
+        # 同一拥塞事件中并发返回的多个 429 只减半一次
+        window = latency if latency else (self.baseline or 1.0)
+        if now - self._last_decrease < window:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit / 2.0)
+        self.decreases += 1
+
+    def summary(self) -> str:
+        with self._cond:
+            return f"limit={int(self.limit)} up={self.increases} down={self.decreases}"
+
+
+class LLMClient:
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        limiter: AIMDLimiter,
+        retries: int = 5,
+        timeout=(20, 120),
+        backoff_base: float = 1.0,
+        backoff_cap: float = 30.0,
+    ) -> None:
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.limiter = limiter
+        self.retries = max(1, int(retries))
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(10, limiter.max_limit))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+            }
+        )
+        self.retried = 0
+
+    def _sleep(self, attempt: int, retry_after: Optional[str]) -> None:
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        time.sleep(delay)
+
+    def post(self, payload: dict) -> dict:
+        last: Optional[Exception] = None
+        for attempt in range(self.retries):
+            retry_after = None
+            self.limiter.acquire()
+            t0 = time.monotonic()
+            try:
+                r = self.session.post(self.url, json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.limiter.release(time.monotonic() - t0, throttled=True)
+                last = e
+            else:
+                latency = time.monotonic() - t0
+                if r.status_code in RETRY_STATUS:
+                    self.limiter.release(latency, throttled=True)
+                    retry_after = r.headers.get("Retry-After")
+                    last = LLMHTTPError(r.status_code, r.text)
+                else:
+                    self.limiter.release(latency)
+                    if r.status_code >= 400:
+                        raise LLMHTTPError(r.status_code, r.text)
+                    return r.json()
+            if attempt + 1 < self.retries:
+                self.retried += 1
+                self._sleep(attempt, retry_after)
+        raise RuntimeError(f"chat completion failed after {self.retries} attempts: {last!r}")
+
+    def chat(self, model: str, system_prompt: str, user_content: str, temperature: float, max_tokens: int) -> str:
+        payload = {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content},
+            ],
+            "temperature": float(temperature) if temperature is not None else 1.0,
+            "max_tokens": int(max_tokens) if max_tokens is not None else 1024,
+            "stream": False,
+        }
+        data = self.post(payload)
+        if not isinstance(data, dict):
+            return "{}"
+        choices = data.get("choices") or []
+        if not choices:
+            return "{}"
+        msg = choices[0].get("message") or {}
+        return msg.get("content") or "{}"
@@ -0,0 +1,189 @@
+"""Per-task reduction of MinerU markdown before it is sent to an LLM.
+
+MinerU output carries a lot that costs prompt tokens without helping the
+model: image links, HTML/LaTeX/pipe tables, long display equations, the
+bibliography and the appendix. ``reduce_markdown`` applies a policy from
+``MD_REDUCE_POLICIES`` (one per task) to strip or compress them, using the
+section split of :mod:`Controller.token_budget`. :class:`MarkdownReducer`
+adds an on-disk cache keyed by sha256(policy + text).
+
+  python Controller/md_reduce.py data/selectedpaper_to_mineru/2025-01-01/*.md --task summary
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from pathlib import Path
+from typing import Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from config.config import MD_REDUCE_CACHE_DIR, MD_REDUCE_ENABLED, MD_REDUCE_POLICIES  # noqa: E402
+from Controller.token_budget import split_sections  # noqa: E402
+
+# 规则变化时递增，使旧缓存失效
+REDUCE_VERSION = 1
+
+IMAGE_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+HTML_TABLE_RE = re.compile(r"<table\b.*?</table>", re.I | re.S)
+HTML_WRAPPER_RE = re.compile(r"</?(?:html|body)\s*>", re.I)
+LATEX_TABLE_RE = re.compile(r"\\begin\{(tabular\*?|tabularx|longtable|array)\}.*?\\end\{\1\}", re.S)
+PIPE_TABLE_RE = re.compile(r"(?:^[ \t]*\|.*\|[ \t]*\n?){3,}", re.M)
+DISPLAY_MATH_RE = re.compile(r"\$\$.+?\$\$", re.S)
+TAG_RE = re.compile(r"<[^>]+>")
+BLANK_RUN_RE = re.compile(r"\n{3,}")
+
+
+def _table_summary(block: str) -> str:
+    """One-line stand-in for a table: row count and its first row."""
+    if block.lstrip().startswith("<"):
+        rows = re.findall(r"<tr\b.*?</tr>", block, re.I | re.S)
+        first = [TAG_RE.sub("", c).strip() for c in re.findall(r"<t[hd]\b.*?</t[hd]>", rows[0], re.I | re.S)] if rows else []
+    elif block.lstrip().startswith("\\"):
+        rows = [r for r in re.split(r"\\\\", block) if r.strip()]
+        first = [c.strip() for c in re.sub(r"\\begin\{[^}]*\}(\{[^}]*\})?", "", rows[0]).split("&")] if rows else []
+    else:
+        rows = [ln for ln in block.strip().splitlines() if not re.fullmatch(r"[\s|:\-]+", ln)]
+        first = [c.strip() for c in rows[0].strip().strip("|").split("|")] if rows else []
+    head = " | ".join(c for c in first if c)[:200]
+    return f"[table: {len(rows)} rows; {head}]" if head else f"[table: {len(rows)} rows]"
+
+
+def reduce_markdown(text: str, policy: dict) -> Tuple[str, dict]:
+    """Apply ``policy`` to ``text``; returns ``(reduced, stats)``.
+
+    Policy keys (all optional): ``drop_sections`` (kinds from
+    ``token_budget.DROP_ORDER``), ``images`` (``keep``/``drop``), ``tables``
+    (``keep``/``compress``/``drop``; tables not longer than
+    ``max_table_chars`` are kept), ``max_math_chars`` (longer display
+    equations become ``[equation]``; 0 keeps all).
+    """
+    stats = {"chars_in": len(text), "sections": [], "images": 0, "tables": 0, "equations": 0}
+    drop = set(policy.get("drop_sections") or [])
+    if drop:
+        kept = []
+        for kind, body in split_sections(text):
+            if kind in drop:
+                stats["sections"].append(kind)
+            else:
+                kept.append(body)
+        text = "".join(kept)
+
+    if policy.get("images", "keep") == "drop":
+        text, stats["images"] = IMAGE_RE.subn("", text)
+
+    mode = policy.get("tables", "keep")
+    if mode != "keep":
+        limit = int(policy.get("max_table_chars") or 0)
+
+        def table(m: "re.Match") -> str:
+            block = m.group(0)
+            if len(block) <= limit:
+                return block
+            stats["tables"] += 1
+            tail = "\n" if block.endswith("\n") else ""
+            return tail if mode == "drop" else _table_summary(block) + tail
+
+        for rx in (HTML_TABLE_RE, LATEX_TABLE_RE, PIPE_TABLE_RE):
+            text = rx.sub(table, text)
+        text = HTML_WRAPPER_RE.sub("", text)
+
+    max_math = int(policy.get("max_math_chars") or 0)
+    if max_math > 0:
+
+        def math(m: "re.Match") -> str:
+            if len(m.group(0)) <= max_math:
+                return m.group(0)
+            stats["equations"] += 1
+            return "[equation]"
+
+        text = DISPLAY_MATH_RE.sub(math, text)
+
+    text = BLANK_RUN_RE.sub("\n\n", text).strip() + "\n"
+    stats["chars_out"] = len(text)
+    return text, stats
+
+
+class MarkdownReducer:
+    def __init__(self, task: str, policy: Optional[dict] = None, cache_dir: Optional[str] = MD_REDUCE_CACHE_DIR) -> None:
+        if policy is None:
+            if task not in MD_REDUCE_POLICIES:
+                raise ValueError(f"no md reduce policy for task {task!r}")
+            policy = MD_REDUCE_POLICIES[task]
+        self.task = task
+        self.policy = policy
+        self._prefix = json.dumps([REDUCE_VERSION, policy], sort_keys=True, ensure_ascii=False)
+        self.cache_dir = Path(cache_dir) / task if cache_dir else None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.chars_in = 0
+        self.chars_out = 0
+
+    def _key(self, text: str) -> str:
+        h = hashlib.sha256(self._prefix.encode("utf-8"))
+        h.update(b"\0")
+        h.update(text.encode("utf-8", errors="ignore"))
+        return h.hexdigest()
+
+    def reduce(self, text: str) -> str:
+        path = None
+        if self.cache_dir is not None:
+            key = self._key(text)
+            path = self.cache_dir / key[:2] / f"{key}.md"
+            if path.exists():
+                out = path.read_text(encoding="utf-8")
+                self._count(text, out, hit=True)
+                return out
+        out, _ = reduce_markdown(text, self.policy)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(out, encoding="utf-8")
+            os.replace(tmp, path)
+        self._count(text, out, hit=False)
+        return out
+
+    def _count(self, text: str, out: str, hit: bool) -> None:
+        with self._lock:
+            self.hits += int(hit)
+            self.misses += int(not hit)
+            self.chars_in += len(text)
+            self.chars_out += len(out)
+
+    def summary(self) -> str:
+        ratio = self.chars_out / self.chars_in if self.chars_in else 1.0
+        return f"task={self.task} hits={self.hits} misses={self.misses} chars {self.chars_in}->{self.chars_out} ({ratio:.0%})"
+
+
+def get_reducer(task: str, disabled: bool = False) -> Optional[MarkdownReducer]:
+    if disabled or not MD_REDUCE_ENABLED:
+        return None
+    return MarkdownReducer(task)
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser("md_reduce")
+    ap.add_argument("files", nargs="+")
+    ap.add_argument("--task", default="summary", choices=sorted(MD_REDUCE_POLICIES))
+    ap.add_argument("--show", action="store_true", help="print the reduced text")
+    args = ap.parse_args(argv)
+
+    policy = MD_REDUCE_POLICIES[args.task]
+    for path in args.files:
+        text = Path(path).read_text(encoding="utf-8", errors="ignore")
+        out, stats = reduce_markdown(text, policy)
+        print(
+            f"{os.path.basename(path)}: chars {stats['chars_in']}->{stats['chars_out']} "
+            f"sections={','.join(stats['sections']) or '-'} images={stats['images']} "
+            f"tables={stats['tables']} equations={stats['equations']}"
+        )
+        if args.show:
+            print(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Content-addressed cache of MinerU conversions.
+
+Entries live under ``<root>/<model_version>/<sha256[:2]>/<sha256>.md`` (and
+``.zip`` when the whole result archive is kept), where the hash is taken over
+the uploaded PDF bytes. Any date folder, ``--outdir`` or re-run that sees the
+same PDF again is served from here instead of uploading it to MinerU.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from config.config import MINERU_CACHE_DIR, MINERU_CACHE_KEEP_ZIP  # noqa: E402
+
+
+def file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _atomic_write_bytes(dest: Path, data: bytes) -> None:
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f".{dest.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, dest)
+
+
+class MinerUCache:
+    def __init__(self, model_version: str, root: str = MINERU_CACHE_DIR, keep_zip: bool = MINERU_CACHE_KEEP_ZIP) -> None:
+        safe_version = re.sub(r"[^A-Za-z0-9._-]+", "_", model_version or "default")
+        self.root = Path(root) / safe_version
+        self.keep_zip = keep_zip
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    def _base(self, sha: str) -> Path:
+        return self.root / sha[:2] / sha
+
+    def get_md(self, sha: str) -> Optional[str]:
+        p = self._base(sha).with_suffix(".md")
+        try:
+            text = p.read_text(encoding="utf-8")
+        except (FileNotFoundError, OSError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return text
+
+    def put(self, sha: str, md_text: str, zip_path: Optional[Path] = None) -> None:
+        base = self._base(sha)
+        if self.keep_zip and zip_path is not None and Path(zip_path).exists():
+            base.parent.mkdir(parents=True, exist_ok=True)
+            tmp = base.with_name(f".{base.name}.{os.getpid()}.zip.tmp")
+            shutil.copyfile(zip_path, tmp)
+            os.replace(tmp, base.with_suffix(".zip"))
+        _atomic_write_bytes(base.with_suffix(".md"), md_text.encode("utf-8"))
+        self.stored += 1
+
+    def serve(self, pdfs: Iterable[Path], out_root: Path) -> Tuple[List[Path], List[Path], Dict[str, str]]:
+        """Write cached md for ``pdfs`` into ``out_root``.
+
+        Returns (served, missing, sha_by_stem); ``sha_by_stem`` is reused by
+        the caller to :meth:`put` the results of the missing ones.
+        """
+        served: List[Path] = []
+        missing: List[Path] = []
+        sha_by_stem: Dict[str, str] = {}
+        for p in pdfs:
+            try:
+                sha = file_sha256(p)
+            except OSError:
+                missing.append(p)
+                continue
+            sha_by_stem[p.stem] = sha
+            md_text = self.get_md(sha)
+            if md_text is None:
+                missing.append(p)
+                continue
+            (out_root / f"{p.stem}.md").write_text(md_text, encoding="utf-8")
+            served.append(p)
+        return served, missing, sha_by_stem
+
+    def summary(self) -> str:
+        return f"hits={self.hits} misses={self.misses} stored={self.stored} dir={self.root}"
@@ -0,0 +1,562 @@
+"""MinerU batch API client shared by the MinerU steps.
+
+``MinerUClient`` wraps the v4 batch endpoints and owns a second, header-free
+pooled session for the presigned PUT uploads. ``upload_files`` pushes a batch
+through a bounded thread pool, streaming each file from disk.
+``iter_ready_results`` extracts each result's md as soon as its item is done,
+while the rest of the batch is still being parsed. ``run_batches`` splits a
+large job into chunks, keeps a few batches in flight, and records submitted
+batches in a :class:`BatchState` file so a re-run re-attaches to them.
+"""
+
+import json
+import io
+import os
+import shutil
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from config.config import (  # noqa: E402
+    MINERU_BATCH_SIZE,
+    MINERU_DOWNLOAD_WORKERS,
+    MINERU_MAX_INFLIGHT,
+    MINERU_UPLOAD_WORKERS,
+)
+from Controller.http_range import HttpRangeReader, RangeNotSupported  # noqa: E402
+
+
+def _open_zip(src) -> zipfile.ZipFile:
+    return src if isinstance(src, zipfile.ZipFile) else zipfile.ZipFile(src, "r")
+
+
+def pick_first_md(src) -> str:
+    """Text of the shallowest .md member; ``src`` is a zip path, file object or ``ZipFile``."""
+    zf = _open_zip(src)
+    try:
+        names = [n for n in zf.namelist() if n.lower().endswith(".md")]
+        if not names:
+            raise RuntimeError(f"no .md in zip: {zf.filename or src}")
+        names.sort(key=lambda s: (s.count("/"), len(s)))
+        raw = zf.read(names[0])
+    finally:
+        if zf is not src:
+            zf.close()
+    return raw.decode("utf-8", errors="replace")
+
+
+def pick_preferred_json(src):
+    zf = _open_zip(src)
+    try:
+        names = [n for n in zf.namelist() if n.lower().endswith(".json")]
+        if not names:
+            raise RuntimeError(f"no .json in zip: {zf.filename or src}")
+        prefer = [n for n in names if n.lower().endswith("content_list.json")] or [n for n in names if n.lower().endswith("model.json")]
+        cand = prefer or names
+        cand.sort(key=lambda s: (s.count("/"), len(s)))
+        text = zf.read(cand[0]).decode("utf-8", errors="replace")
+    finally:
+        if zf is not src:
+            zf.close()
+    try:
+        return json.loads(text)
+    except Exception:
+        return text
+
+
+def extract_assets(zf: zipfile.ZipFile, dest: Path) -> int:
+    """Copy ``images/*`` and ``*content_list.json`` members of a result zip into ``dest``."""
+    n = 0
+    for info in zf.infolist():
+        name = info.filename
+        if info.is_dir() or ".." in Path(name).parts:
+            continue
+        if "images/" in name:
+            target = dest / "images" / Path(name).name
+        elif name.lower().endswith("content_list.json"):
+            target = dest / "content_list.json"
+        else:
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with zf.open(info) as src, target.open("wb") as out:
+            shutil.copyfileobj(src, out, 1024 * 128)
+        n += 1
+    return n
+
+
+class MinerUClient:
+    def __init__(self, base_url: str, token: str, pool_size: int = MINERU_UPLOAD_WORKERS) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {token}", "Content-Type": "application/json", "Accept": "*/*"})
+        # 预签名 PUT 不能带 Authorization / Content-Type（会破坏签名），单独用一个无默认头的连接池
+        self.upload_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(10, int(pool_size)))
+        self.upload_session.mount("https://", adapter)
+        self.upload_session.mount("http://", adapter)
+
+    def _post(self, path: str, payload: dict) -> dict:
+        url = f"{self.base_url}{path}"
+        r = self.session.post(url, json=payload, timeout=(20, 120))
+        r.raise_for_status()
+        data = r.json()
+        if data.get("code") != 0:
+            raise RuntimeError(f"MinerU API error: {data}")
+        return data
+
+    def _get(self, path: str) -> dict:
+        url = f"{self.base_url}{path}"
+        r = self.session.get(url, timeout=(20, 120))
+        r.raise_for_status()
+        data = r.json()
+        if data.get("code") != 0:
+            raise RuntimeError(f"MinerU API error: {data}")
+        return data
+
+    def apply_upload_urls(self, files: List[dict], model_version: str, extra: dict) -> dict:
+        payload = {"files": files, "model_version": model_version}
+        payload.update(extra or {})
+        return self._post("/api/v4/file-urls/batch", payload)
+
+    def get_batch_results(self, batch_id: str) -> dict:
+        return self._get(f"/api/v4/extract-results/batch/{batch_id}")
+
+
+def backoff_sleep(attempt: int, base: float = 1.0, cap: float = 10.0) -> None:
+    time.sleep(min(cap, base * (2 ** (attempt - 1))))
+
+
+def upload_to_presigned_url(file_path: Path, put_url: str, max_retries: int = 6, session: Optional[requests.Session] = None) -> None:
+    last: Exception | None = None
+    put = session.put if session is not None else requests.put
+    for attempt in range(1, max_retries + 1):
+        try:
+            # 传文件对象而非 bytes：requests 按块流式发送，不把整个文件读入内存
+            with file_path.open("rb") as f:
+                r = put(put_url, data=f, timeout=(30, 900))
+            r.raise_for_status()
+            return
+        except Exception as e:
+            last = e
+            backoff_sleep(attempt)
+    raise RuntimeError(f"upload failed: {file_path.name}. last={last!r}")
+
+
+def upload_files(
+    client: MinerUClient,
+    files: List[Path],
+    urls: List[str],
+    workers: int = MINERU_UPLOAD_WORKERS,
+    max_retries: int = 6,
+    on_done: Optional[Callable[[Path], None]] = None,
+) -> None:
+    """Upload ``files[i]`` to ``urls[i]`` with at most ``workers`` concurrent PUTs.
+
+    Every file is attempted; if any upload still fails after its retries, a
+    RuntimeError naming the failed files is raised at the end.
+    """
+    failed: List[str] = []
+    with ThreadPoolExecutor(max_workers=max(1, int(workers))) as ex:
+        futures = {
+            ex.submit(upload_to_presigned_url, p, url, max_retries, client.upload_session): p
+            for p, url in zip(files, urls)
+        }
+        for fut in as_completed(futures):
+            p = futures[fut]
+            try:
+                fut.result()
+            except Exception:
+                failed.append(p.name)
+                continue
+            if on_done is not None:
+                on_done(p)
+    if failed:
+        raise RuntimeError(f"upload failed for {len(failed)} file(s): {', '.join(sorted(failed)[:10])}")
+
+
+def download_zip(zip_url: str, token: str, dest: Path, max_retries: int = 6, session: Optional[requests.Session] = None) -> None:
+    last: Exception | None = None
+    headers = {"Authorization": f"Bearer {token}"}
+    get = session.get if session is not None else requests.get
+    for attempt in range(1, max_retries + 1):
+        try:
+            with get(zip_url, headers=headers, stream=True, timeout=(30, 900)) as r:
+                r.raise_for_status()
+                with dest.open("wb") as f:
+                    for chunk in r.iter_content(chunk_size=1024 * 128):
+                        if chunk:
+                            f.write(chunk)
+            return
+        except Exception as e:
+            last = e
+            backoff_sleep(attempt)
+    raise RuntimeError(f"download zip failed. last={last!r}")
+
+
+class ReadyResult(NamedTuple):
+    path: Path
+    state: str
+    md_text: Optional[str] = None
+    zip_path: Optional[Path] = None
+    error: Optional[str] = None
+
+
+def download_bytes(url: str, headers: dict, max_retries: int = 6, session: Optional[requests.Session] = None) -> bytes:
+    last: Exception | None = None
+    get = session.get if session is not None else requests.get
+    for attempt in range(1, max_retries + 1):
+        try:
+            r = get(url, headers=headers, timeout=(30, 900))
+            r.raise_for_status()
+            return r.content
+        except Exception as e:
+            last = e
+            backoff_sleep(attempt)
+    raise RuntimeError(f"download failed. last={last!r}")
+
+
+def open_result_zip(zip_url: str, token: str, max_retries: int = 6, session: Optional[requests.Session] = None, whole: bool = False) -> zipfile.ZipFile:
+    """Open a result zip without touching disk.
+
+    By default only the central directory and the members actually read are
+    fetched, via HTTP Range; ``whole`` (or a server without Range support)
+    downloads the zip into memory instead.
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    if not whole:
+        try:
+            return zipfile.ZipFile(HttpRangeReader(zip_url, session=session, headers=headers, max_retries=max_retries))
+        except RangeNotSupported:
+            pass
+    return zipfile.ZipFile(io.BytesIO(download_bytes(zip_url, headers, max_retries=max_retries, session=session)))
+
+
+def fetch_md(
+    zip_url: str,
+    token: str,
+    max_retries: int = 6,
+    session: Optional[requests.Session] = None,
+    zip_dest: Optional[Path] = None,
+    assets_dir: Optional[Path] = None,
+) -> str:
+    """md text of a result zip, optionally keeping its assets and/or the zip itself.
+
+    Only when ``zip_dest`` is given (the MinerU cache keeps zips) is the zip
+    written to disk; otherwise it is read remotely or from memory.
+    """
+    if zip_dest is not None:
+        download_zip(zip_url, token, zip_dest, max_retries=max_retries, session=session)
+        zf = zipfile.ZipFile(zip_dest, "r")
+    else:
+        zf = open_result_zip(zip_url, token, max_retries=max_retries, session=session, whole=assets_dir is not None)
+    with zf:
+        md_text = pick_first_md(zf)
+        if assets_dir is not None:
+            extract_assets(zf, assets_dir)
+    return md_text
+
+
+def iter_ready_results(
+    client: MinerUClient,
+    batch_id: str,
+    files: List[Path],
+    token: str,
+    zip_dir: Optional[Path] = None,
+    timeout_sec: int = 900,
+    poll_sec: int = 3,
+    workers: int = MINERU_DOWNLOAD_WORKERS,
+    max_retries: int = 6,
+    progress: bool = True,
+    assets_root: Optional[Path] = None,
+) -> Iterator[ReadyResult]:
+    """Yield one :class:`ReadyResult` per file in ``files`` as soon as it is settled.
+
+    The batch is polled every ``poll_sec``; an item whose state turns ``done``
+    has its md extracted (see :func:`fetch_md`) on a pool of ``workers``
+    threads while the remaining items are still being parsed. The zip is
+    kept as ``zip_dir/<stem>.zip`` only if ``zip_dir`` is given; images and
+    content_list.json go to ``assets_root/<stem>/`` if ``assets_root`` is. Results are yielded in the caller's thread in completion order.
+    A result with ``error`` set is a failure; its ``state`` is ``failed``
+    (MinerU failed), ``done`` (no zip URL), ``fetch`` (download/extract error)
+    or ``timeout`` (the batch deadline passed).
+    """
+    by_dataid = {p.stem: p for p in files}
+    by_name = {p.name: p for p in files}
+    pending = dict(by_dataid)
+    futures = {}
+    total = len(files)
+    fetched = 0
+    states: dict[str, int] = {}
+    deadline = time.time() + timeout_sec
+    next_poll = 0.0
+    with ThreadPoolExecutor(max_workers=max(1, int(workers))) as ex:
+        while pending or futures:
+            now = time.time()
+            if pending and now >= deadline:
+                for p in pending.values():
+                    yield ReadyResult(p, "timeout", error="batch not finished in time")
+                pending.clear()
+            elif pending and now >= next_poll:
+                next_poll = now + poll_sec
+                try:
+                    items = (client.get_batch_results(batch_id).get("data") or {}).get("extract_result") or []
+                except Exception as e:
+                    # 轮询偶发失败不影响已在下载的结果，下一轮再试
+                    items = []
+                    if progress:
+                        print(f"\n[parse] poll failed: {e!r}", flush=True)
+                states = {}
+                for it in items if isinstance(items, list) else []:
+                    if not isinstance(it, dict):
+                        continue
+                    st = str(it.get("state") or "unknown").lower()
+                    states[st] = states.get(st, 0) + 1
+                    p = by_dataid.get(str(it.get("data_id") or "")) or by_name.get(str(it.get("file_name") or ""))
+                    if p is None or p.stem not in pending:
+                        continue
+                    if st == "done":
+                        del pending[p.stem]
+                        zip_url = it.get("full_zip_url")
+                        if not zip_url:
+                            yield ReadyResult(p, st, error="no full_zip_url")
+                            continue
+                        zip_path = zip_dir / f"{p.stem}.zip" if zip_dir is not None else None
+                        assets_dir = assets_root / p.stem if assets_root is not None else None
+                        fut = ex.submit(fetch_md, zip_url, token, max_retries, client.upload_session, zip_path, assets_dir)
+                        futures[fut] = (p, zip_path)
+                    elif st == "failed":
+                        del pending[p.stem]
+                        yield ReadyResult(p, st, error=str(it.get("err_msg") or "failed"))
+            if progress:
+                print(f"\r[parse] {total - len(pending)}/{total} {states} [download] {fetched}/{total}", end="", flush=True)
+            if not futures:
+                if pending:
+                    time.sleep(max(0.0, min(next_poll, deadline) - time.time()))
+                continue
+            timeout = max(0.0, min(next_poll, deadline) - time.time()) if pending else None
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                p, zip_path = futures.pop(fut)
+                try:
+                    md_text = fut.result()
+                except Exception as e:
+                    yield ReadyResult(p, "fetch", error=repr(e))
+                    continue
+                fetched += 1
+                yield ReadyResult(p, "done", md_text=md_text, zip_path=zip_path)
+    if progress:
+        print(f"\r[parse] {total}/{total} {states} [download] {fetched}/{total}", flush=True)
+
+
+class BatchState:
+    """Submitted MinerU batches of one output dir that still have unsettled files.
+
+    Persisted as JSON (atomic replace on every change). A batch is recorded
+    only after its uploads finished; a file is removed once its md is written
+    or MinerU reports it failed, so files that timed out or failed to download
+    stay attached to their batch for the next run.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.batches: Dict[str, dict] = {}
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                self.batches = dict(data.get("batches") or {})
+            except Exception:
+                self.batches = {}
+
+    def _save(self) -> None:
+        if not self.batches:
+            self.path.unlink(missing_ok=True)
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"batches": self.batches}, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def add(self, batch_id: str, model_version: str, files: List[Path]) -> None:
+        with self._lock:
+            self.batches[batch_id] = {
+                "model_version": model_version,
+                "created_at": time.time(),
+                "files": {p.stem: p.name for p in files},
+            }
+            self._save()
+
+    def settle(self, batch_id: str, stem: str) -> None:
+        with self._lock:
+            b = self.batches.get(batch_id)
+            if b is None:
+                return
+            b["files"].pop(stem, None)
+            if not b["files"]:
+                del self.batches[batch_id]
+            self._save()
+
+    def drop(self, batch_id: str) -> None:
+        with self._lock:
+            if self.batches.pop(batch_id, None) is not None:
+                self._save()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.batches = {}
+            self._save()
+
+    def attachable(self, model_version: str, files: List[Path]) -> List[Tuple[str, List[Path]]]:
+        """(batch_id, files) of recorded batches that still owe a result for one of ``files``."""
+        by_stem = {p.stem: p for p in files}
+        out = []
+        with self._lock:
+            for batch_id, b in list(self.batches.items()):
+                if b.get("model_version") != model_version:
+                    continue
+                paths = [by_stem[stem] for stem in b.get("files") or {} if stem in by_stem]
+                if paths:
+                    out.append((batch_id, paths))
+                else:
+                    # 剩余文件都已有 md（或已不在输入中），记录作废
+                    del self.batches[batch_id]
+            self._save()
+        return out
+
+
+def _batch_alive(client: MinerUClient, batch_id: str) -> bool:
+    try:
+        items = (client.get_batch_results(batch_id).get("data") or {}).get("extract_result")
+    except Exception:
+        return False
+    return bool(items)
+
+
+def run_batches(
+    client: MinerUClient,
+    files: List[Path],
+    token: str,
+    zip_dir: Optional[Path],
+    state: BatchState,
+    model_version: str,
+    on_result: Callable[[ReadyResult], None],
+    batch_size: int = MINERU_BATCH_SIZE,
+    max_inflight: int = MINERU_MAX_INFLIGHT,
+    timeout_sec: int = 900,
+    poll_sec: int = 3,
+    upload_workers: int = MINERU_UPLOAD_WORKERS,
+    download_workers: int = MINERU_DOWNLOAD_WORKERS,
+    upload_retries: int = 6,
+    extra: Optional[dict] = None,
+    assets_root: Optional[Path] = None,
+) -> None:
+    """Convert ``files`` in batches of ``batch_size``, at most ``max_inflight`` at a time.
+
+    Batches recorded in ``state`` that are still known to MinerU are
+    re-attached first (no upload); their files are not resubmitted.
+    ``timeout_sec`` applies to each batch. ``on_result`` is called once per
+    settled file, serialised under a lock, from the batch worker threads; a
+    file is marked settled in ``state`` only after ``on_result`` returned, so
+    a result that could not be stored is fetched again on the next run.
+    """
+    lock = threading.Lock()
+    total = len(files)
+    counts = {"batches": 0, "uploaded": 0, "settled": 0}
+    jobs: List[Tuple[Optional[str], List[Path]]] = []
+    attached = set()
+    for batch_id, paths in state.attachable(model_version, files):
+        if _batch_alive(client, batch_id):
+            jobs.append((batch_id, paths))
+            attached.update(p.stem for p in paths)
+        else:
+            state.drop(batch_id)
+    if jobs:
+        print(f"[mineru] re-attached {len(attached)} file(s) in {len(jobs)} submitted batch(es)", flush=True)
+    rest = [p for p in files if p.stem not in attached]
+    size = max(1, int(batch_size))
+    jobs.extend((None, rest[i : i + size]) for i in range(0, len(rest), size))
+    n_jobs = len(jobs)
+
+    def report(res: Optional[ReadyResult] = None, uploaded: int = 0, batch_done: bool = False) -> bool:
+        ok = True
+        with lock:
+            if res is not None:
+                counts["settled"] += 1
+                try:
+                    on_result(res)
+                except Exception as e:
+                    # 单个文件的结果处理失败不影响同批次其它文件，也不中断整个执行器
+                    ok = False
+                    print(f"\n[mineru] handling result of {res.path.name} failed: {e!r}", flush=True)
+            counts["uploaded"] += uploaded
+            counts["batches"] += int(batch_done)
+            print(
+                f"\r[mineru] batches {counts['batches']}/{n_jobs} uploaded {counts['uploaded']} settled {counts['settled']}/{total}",
+                end="",
+                flush=True,
+            )
+        return ok
+
+    def run_one(batch_id: Optional[str], batch: List[Path]) -> None:
+        if batch_id is None:
+            payload = [{"name": p.name, "data_id": p.stem} for p in batch]
+            try:
+                applied = client.apply_upload_urls(payload, model_version=model_version, extra=extra or {}).get("data") or {}
+                urls = applied.get("file_urls") or []
+                batch_id = applied.get("batch_id") or ""
+                if not batch_id or len(urls) != len(batch):
+                    raise RuntimeError("Failed to apply upload URLs")
+            except Exception as e:
+                for p in batch:
+                    report(ReadyResult(p, "submit", error=repr(e)))
+                report(batch_done=True)
+                return
+            uploaded: List[Path] = []
+
+            def on_uploaded(p: Path) -> None:
+                uploaded.append(p)
+                report(uploaded=1)
+
+            try:
+                upload_files(client, batch, urls, workers=upload_workers, max_retries=upload_retries, on_done=on_uploaded)
+            except Exception as e:
+                done = {p.stem for p in uploaded}
+                for p in batch:
+                    if p.stem not in done:
+                        report(ReadyResult(p, "upload", error=repr(e)))
+                batch = uploaded
+            if not batch:
+                report(batch_done=True)
+                return
+            state.add(batch_id, model_version, batch)
+        results = iter_ready_results(
+            client,
+            batch_id,
+            batch,
+            token,
+            zip_dir,
+            timeout_sec=timeout_sec,
+            poll_sec=poll_sec,
+            workers=download_workers,
+            progress=False,
+            assets_root=assets_root,
+        )
+        for res in results:
+            # 超时 / 下载失败 / 结果未能落盘的文件留在记录里，下次运行重新挂接该批次
+            if report(res) and res.state in ("done", "failed"):
+                state.settle(batch_id, res.path.stem)
+        report(batch_done=True)
+
+    with ThreadPoolExecutor(max_workers=max(1, int(max_inflight))) as ex:
+        for fut in [ex.submit(run_one, batch_id, batch) for batch_id, batch in jobs]:
+            fut.result()
+    print(flush=True)
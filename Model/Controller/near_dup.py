@@ -0,0 +1,189 @@
+"""MinHash/LSH near-duplicate index over normalized title + abstract.
+
+Signatures (``NEAR_DUP_NUM_PERM`` 32-bit minima over word 3-shingles) are kept
+in SQLite next to the paper store; each signature is cut into
+``NEAR_DUP_BANDS`` bands whose hashes go into an indexed table. A query is one
+indexed lookup per band plus a signature comparison for the few candidates,
+so its cost does not grow with the number of stored papers.
+"""
+
+import os
+import random
+import re
+import sqlite3
+import sys
+import threading
+import zlib
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from config.config import (  # noqa: E402
+    NEAR_DUP_BANDS,
+    NEAR_DUP_NUM_PERM,
+    PAPER_STORE_PATH,
+)
+
+SHINGLE_WORDS = 3
+_MERSENNE = (1 << 61) - 1
+_MASK32 = 0xFFFFFFFF
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS near_dup_sigs (
+    arxiv_id TEXT PRIMARY KEY,
+    title    TEXT,
+    sig      BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS near_dup_bands (
+    band     INTEGER NOT NULL,
+    hash     INTEGER NOT NULL,
+    arxiv_id TEXT NOT NULL,
+    PRIMARY KEY (band, hash, arxiv_id)
+) WITHOUT ROWID;
+"""
+
+
+def _perms(num_perm: int):
+    rnd = random.Random(20240229)
+    return [(rnd.randrange(1, _MERSENNE), rnd.randrange(0, _MERSENNE)) for _ in range(num_perm)]
+
+
+def shingles(text: str, k: int = SHINGLE_WORDS) -> set:
+    words = _WORD_RE.findall((text or "").lower())
+    if len(words) < k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i : i + k]) for i in range(len(words) - k + 1)}
+
+
+@dataclass
+class NearDupMatch:
+    arxiv_id: str
+    title: str
+    similarity: float
+
+
+class NearDupIndex:
+    def __init__(self, path: str = PAPER_STORE_PATH, num_perm: int = NEAR_DUP_NUM_PERM, bands: int = NEAR_DUP_BANDS) -> None:
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._perms = _perms(num_perm)
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+    def signature(self, text: str) -> array:
+        """MinHash signature of ``text``; empty when the text has no words."""
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles(text)]
+        if not hashes:
+            return array("I")
+        sig = array("I", [_MASK32] * self.num_perm)
+        for i, (a, b) in enumerate(self._perms):
+            sig[i] = min(((a * h + b) % _MERSENNE) & _MASK32 for h in hashes)
+        return sig
+
+    def band_hashes(self, sig: array) -> List[int]:
+        r = self.rows
+        return [zlib.crc32(sig[i * r : (i + 1) * r].tobytes()) for i in range(self.bands)]
+
+    @staticmethod
+    def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+        return sum(1 for x, y in zip(a, b) if x == y) / len(a) if len(a) else 0.0
+
+    def contains(self, arxiv_id: str) -> Optional[str]:
+        """Title stored for ``arxiv_id`` if it is already indexed, else None."""
+        with self._lock:
+            row = self.conn.execute("SELECT title FROM near_dup_sigs WHERE arxiv_id=?", (arxiv_id,)).fetchone()
+        return None if row is None else (row[0] or "")
+
+    def query(self, sig: array, threshold: float, exclude: str = "") -> Optional[NearDupMatch]:
+        """Best stored paper whose estimated Jaccard similarity with ``sig`` is >= ``threshold``."""
+        bh = self.band_hashes(sig)
+        with self._lock:
+            cand = set()
+            for band, h in enumerate(bh):
+                cand.update(r[0] for r in self.conn.execute(
+                    "SELECT arxiv_id FROM near_dup_bands WHERE band=? AND hash=?", (band, h)
+                ))
+            cand.discard(exclude)
+            if not cand:
+                return None
+            ids = list(cand)
+            marks = ", ".join("?" for _ in ids)
+            rows = self.conn.execute(f"SELECT arxiv_id, title, sig FROM near_dup_sigs WHERE arxiv_id IN ({marks})", ids).fetchall()
+        best: Optional[NearDupMatch] = None
+        for aid, title, blob in rows:
+            other = array("I")
+            other.frombytes(blob)
+            sim = self.similarity(sig, other)
+            if sim >= threshold and (best is None or sim > best.similarity):
+                best = NearDupMatch(aid, title or "", sim)
+        return best
+
+    def add(self, arxiv_id: str, title: str, sig: array) -> None:
+        bh = self.band_hashes(sig)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO near_dup_sigs (arxiv_id, title, sig) VALUES (?, ?, ?)",
+                (arxiv_id, title, sig.tobytes()),
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO near_dup_bands (band, hash, arxiv_id) VALUES (?, ?, ?)",
+                [(band, h, arxiv_id) for band, h in enumerate(bh)],
+            )
+
+    def count(self) -> int:
+        with self._lock:
+            return int(self.conn.execute("SELECT COUNT(*) FROM near_dup_sigs").fetchone()[0])
+
+
+def collapse(
+    index: NearDupIndex,
+    items: List[Dict[str, str]],
+    texts: Dict[str, str],
+    threshold: float,
+) -> Tuple[List[Dict[str, str]], List[Dict[str, object]]]:
+    """Split ``items`` ({title, source}) into kept items and a report of collapsed ones.
+
+    Kept items are added to the index, so later items of the same batch are
+    also compared against them.
+    """
+    kept: List[Dict[str, str]] = []
+    report: List[Dict[str, object]] = []
+    for item in items:
+        aid = str(item.get("source", "")).strip()
+        title = str(item.get("title", "")).strip()
+        if not aid:
+            kept.append(item)
+            continue
+        old_title = index.contains(aid)
+        if old_title is not None:
+            report.append({"arxiv_id": aid, "title": title, "matched_id": aid, "matched_title": old_title,
+                           "similarity": 1.0, "reason": "same_id"})
+            continue
+        sig = index.signature(texts.get(aid) or title)
+        if not sig:
+            kept.append(item)
+            continue
+        m = index.query(sig, threshold, exclude=aid)
+        if m is not None:
+            report.append({"arxiv_id": aid, "title": title, "matched_id": m.arxiv_id, "matched_title": m.title,
+                           "similarity": round(m.similarity, 3), "reason": "near_duplicate"})
+            continue
+        index.add(aid, title, sig)
+        kept.append(item)
+    return kept, report
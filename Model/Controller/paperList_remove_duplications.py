@@ -11,12 +11,15 @@ from typing import List, Dict, Any
 
 ROOT = Path(os.path.dirname(os.path.dirname(__file__)))
 sys.path.insert(0, str(ROOT))
-from config.config import DATA_ROOT  # noqa: E402
+from config.config import DATA_ROOT, NEAR_DUP_ENABLED, NEAR_DUP_THRESHOLD  # noqa: E402
+from Controller.paper_store import get_store, STAGE_DEDUP  # noqa: E402
+from Controller.near_dup import NearDupIndex, collapse  # noqa: E402
 
 CONFIG_PATH = ROOT / "config" / "paperList.json"
 DATA_DIR = ROOT / DATA_ROOT
 ARXIV_LIST_DIR = DATA_DIR / "arxivList"
 DEDUP_DIR = DATA_DIR / "paperList_remove_duplications"
+MIGRATED_KEY = "paperList_json_migrated"
 
 
 def load_existing() -> List[Dict[str, Any]]:
@@ -34,14 +37,23 @@ def load_existing() -> List[Dict[str, Any]]:
     return []
 
 
-def build_seen_keys(items: List[Dict[str, Any]]) -> set:
-    seen = set()
+def seen_rows(items: List[Dict[str, Any]], default_dt: str = ""):
     for item in items:
         title = str(item.get("title", "")).strip()
         source = str(item.get("source", "")).strip()
         if title or source:
-            seen.add((title, source))
-    return seen
+            yield title, source, str(item.get("writing_datetime") or default_dt)
+
+
+def migrate_from_json(store, force: bool = False) -> int:
+    """One-time import of config/paperList.json into the store's seen_papers table."""
+    if store.get_meta(MIGRATED_KEY) and not force:
+        return 0
+    existing = load_existing()
+    added = store.add_seen(seen_rows(existing))
+    store.set_meta(MIGRATED_KEY, datetime.now(timezone.utc).isoformat())
+    print(f"[DEDUP] migrated {len(added)}/{len(existing)} records from {CONFIG_PATH}", flush=True)
+    return len(added)
 
 
 def find_latest_md(explicit: str | None = None) -> Path:
@@ -100,34 +112,19 @@ def parse_md(md_path: Path) -> List[Dict[str, str]]:
     return result
 
 
-def filter_new_items(today_items: List[Dict[str, str]], seen: set) -> List[Dict[str, str]]:
+def filter_new_items(store, today_items: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Keep items whose (title, source) is not in the store yet and record them as seen."""
+    now = datetime.now(timezone.utc).isoformat()
+    added = set(store.add_seen(seen_rows(today_items, now)))
     new_items: List[Dict[str, str]] = []
     for item in today_items:
-        title = str(item.get("title", "")).strip()
-        source = str(item.get("source", "")).strip()
-        key = (title, source)
-        if key in seen:
-            continue
-        new_items.append(item)
-        seen.add(key)
+        key = (str(item.get("title", "")).strip(), str(item.get("source", "")).strip())
+        if key in added:
+            new_items.append(item)
+            added.discard(key)
     return new_items
 
 
-def append_to_config(existing: List[Dict[str, Any]], new_items: List[Dict[str, str]]) -> None:
-    if not new_items:
-        return
-    now = datetime.now(timezone.utc).isoformat()
-    for item in new_items:
-        rec = {
-            "title": str(item.get("title", "")).strip(),
-            "source": str(item.get("source", "")).strip(),
-            "writing_datetime": now,
-        }
-        existing.append(rec)
-    CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
-    CONFIG_PATH.write_text(json.dumps(existing, ensure_ascii=False, indent=2), encoding="utf-8")
-
-
 def collect_blocks(lines: List[str]) -> List[Dict[str, Any]]:
     blocks: List[Dict[str, Any]] = []
     current_start = None
@@ -221,18 +218,72 @@ def write_dedup_md(md_path: Path, new_items: List[Dict[str, str]]) -> None:
     out_path.write_text("".join(out_lines), encoding="utf-8")
 
 
-def run() -> None:
+def near_dup_filter(store, items: List[Dict[str, str]], threshold: float, report_path: Path) -> tuple:
+    ids = [str(it.get("source", "")).strip() for it in items]
+    papers = store.get_papers(ids)
+    texts = {
+        aid: f"{p.get('title') or ''}\n{p.get('abstract') or ''}"
+        for aid, p in papers.items()
+    }
+    index = NearDupIndex()
+    try:
+        kept, report = collapse(index, items, texts, threshold)
+        total = index.count()
+    finally:
+        index.close()
+    if report:
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        report_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        for r in report:
+            print(f"[NEAR-DUP] {r['arxiv_id']} ~ {r['matched_id']} sim={r['similarity']} ({r['reason']})", flush=True)
+    print(f"[NEAR-DUP] collapsed={len(report)} kept={len(kept)} index={total}", flush=True)
+    return kept, report
+
+
+def record_dedup_stage(
+    list_date: str,
+    today_items: List[Dict[str, str]],
+    new_items: List[Dict[str, str]],
+    near_dups: List[Dict[str, Any]] = (),
+) -> None:
+    new_ids = {str(it.get("source", "")).strip() for it in new_items}
+    near_ids = {str(r.get("arxiv_id", "")).strip() for r in near_dups}
+    all_ids = {str(it.get("source", "")).strip() for it in today_items}
+    store = get_store()
+    store.set_stages(sorted(new_ids), STAGE_DEDUP, "ok", list_date=list_date)
+    store.set_stages(sorted(near_ids), STAGE_DEDUP, "near_duplicate", list_date=list_date)
+    store.set_stages(sorted(all_ids - new_ids - near_ids), STAGE_DEDUP, "duplicate", list_date=list_date)
+
+
+def run(argv: List[str] | None = None) -> Dict[str, Any]:
     ap = argparse.ArgumentParser("paperList_remove_duplications")
     ap.add_argument("--md", help="arxiv list markdown path; default latest in data/arxivList")
-    args = ap.parse_args()
+    ap.add_argument("--migrate", action="store_true", help="re-import config/paperList.json into the store")
+    ap.add_argument("--near-dup-threshold", type=float, default=NEAR_DUP_THRESHOLD, help="estimated Jaccard similarity to collapse")
+    ap.add_argument("--no-near-dup", action="store_true", help="exact (title, source) dedup only")
+    args = ap.parse_args(argv)
 
+    store = get_store()
+    migrate_from_json(store, force=args.migrate)
     md_path = find_latest_md(args.md)
-    existing = load_existing()
-    seen = build_seen_keys(existing)
     today_items = parse_md(md_path)
-    new_items = filter_new_items(today_items, seen)
-    append_to_config(existing, new_items)
+    prev_ok = store.ids_with_stage(STAGE_DEDUP, "ok", list_date=md_path.stem)
+    new_items = filter_new_items(store, today_items)
+    print(f"[DEDUP] {md_path.name}: {len(new_items)}/{len(today_items)} new, history={store.seen_count()}", flush=True)
+    near_dups: List[Dict[str, Any]] = []
+    if NEAR_DUP_ENABLED and not args.no_near_dup:
+        report_path = DEDUP_DIR / f"{md_path.stem}.near_dup.json"
+        new_items, near_dups = near_dup_filter(store, new_items, args.near_dup_threshold, report_path)
+    if prev_ok:
+        # 同一日期重跑：首次运行已判定保留的论文已写入历史，维持原判定，避免下载阶段把它们当作重复跳过
+        have = {str(it.get("source", "")).strip() for it in new_items}
+        again = [it for it in today_items if str(it.get("source", "")).strip() in prev_ok - have]
+        if again:
+            print(f"[DEDUP] re-run of {md_path.stem}: keeping {len(again)} paper(s) accepted earlier", flush=True)
+            new_items = new_items + again
     write_dedup_md(md_path, new_items)
+    record_dedup_stage(md_path.stem, today_items, new_items, near_dups)
+    return {"date": md_path.stem, "path": str(md_path), "ids": [str(it.get("source", "")).strip() for it in new_items]}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,309 @@
+"""Embedded SQLite (WAL) store for every paper the pipeline has seen.
+
+One row per arxiv_id in ``papers`` plus one row per (arxiv_id, stage) in
+``stages``. Steps keep writing their dated files as before; the store is the
+indexed view used to answer "which papers of date X still need stage Y".
+pdf_split, pdfsplite_to_minerU, selectpaper, selectedpaper_to_mineru and
+paper_summary take their work set from :meth:`PaperStore.pending_paths` and
+only scan their input directory for dates the store does not know.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from config.config import PAPER_STORE_PATH  # noqa: E402
+
+# 各步骤写入 stages 表时使用的阶段名
+STAGE_SEARCH = "search"
+STAGE_DEDUP = "dedup"
+STAGE_DOWNLOAD = "download"
+STAGE_SPLIT = "split"
+STAGE_PREVIEW_MD = "preview_md"
+STAGE_INFO = "info"
+STAGE_FILTER = "filter"
+STAGE_SELECT = "select"
+STAGE_FULL_MD = "full_md"
+STAGE_SUMMARY = "summary"
+STAGE_ZOTERO = "zotero"
+
+PAPER_FIELDS = (
+    "title",
+    "abstract",
+    "published",
+    "list_date",
+    "bucket",
+    "score",
+    "instution",
+    "is_large",
+    "info_abstract",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    arxiv_id      TEXT PRIMARY KEY,
+    title         TEXT,
+    abstract      TEXT,
+    published     TEXT,
+    list_date     TEXT,
+    bucket        TEXT,
+    score         INTEGER,
+    instution     TEXT,
+    is_large      INTEGER,
+    info_abstract TEXT,
+    updated_at    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_papers_list_date ON papers(list_date);
+CREATE INDEX IF NOT EXISTS idx_papers_bucket ON papers(bucket);
+CREATE INDEX IF NOT EXISTS idx_papers_score ON papers(score);
+CREATE INDEX IF NOT EXISTS idx_papers_instution ON papers(instution);
+CREATE INDEX IF NOT EXISTS idx_papers_is_large ON papers(is_large);
+
+CREATE TABLE IF NOT EXISTS stages (
+    arxiv_id   TEXT NOT NULL,
+    stage      TEXT NOT NULL,
+    status     TEXT NOT NULL,
+    path       TEXT,
+    list_date  TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (arxiv_id, stage)
+);
+CREATE INDEX IF NOT EXISTS idx_stages_stage_status ON stages(stage, status, list_date);
+
+CREATE TABLE IF NOT EXISTS seen_papers (
+    title            TEXT NOT NULL,
+    source           TEXT NOT NULL,
+    writing_datetime TEXT,
+    PRIMARY KEY (title, source)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class PaperStore:
+    def __init__(self, path: str = PAPER_STORE_PATH) -> None:
+        self.path = path
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+    def upsert_papers(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Insert or update papers; only the fields present in each record are overwritten."""
+        n = 0
+        now = _now()
+        with self._lock, self.conn:
+            for rec in records:
+                aid = str(rec.get("arxiv_id") or "").strip()
+                if not aid:
+                    continue
+                fields = [f for f in PAPER_FIELDS if f in rec]
+                values = [int(bool(rec[f])) if f == "is_large" else rec[f] for f in fields]
+                cols = ", ".join(["arxiv_id"] + fields + ["updated_at"])
+                marks = ", ".join("?" for _ in range(len(fields) + 2))
+                updates = ", ".join([f"{f}=excluded.{f}" for f in fields] + ["updated_at=excluded.updated_at"])
+                self.conn.execute(
+                    f"INSERT INTO papers ({cols}) VALUES ({marks}) ON CONFLICT(arxiv_id) DO UPDATE SET {updates}",
+                    [aid] + values + [now],
+                )
+                n += 1
+        return n
+
+    def set_stage(self, arxiv_id: str, stage: str, status: str, path: str = "", list_date: str = "") -> None:
+        self.set_stages([arxiv_id], stage, status, paths={arxiv_id: path} if path else None, list_date=list_date)
+
+    def set_stages(
+        self,
+        arxiv_ids: Iterable[str],
+        stage: str,
+        status: str,
+        paths: Optional[Dict[str, str]] = None,
+        list_date: str = "",
+    ) -> None:
+        now = _now()
+        paths = paths or {}
+        rows = [(aid, stage, status, paths.get(aid, ""), list_date, now) for aid in arxiv_ids if aid]
+        if not rows:
+            return
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO stages (arxiv_id, stage, status, path, list_date, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(arxiv_id, stage) DO UPDATE SET status=excluded.status, "
+                "path=CASE WHEN excluded.path != '' THEN excluded.path ELSE stages.path END, "
+                "list_date=CASE WHEN excluded.list_date != '' THEN excluded.list_date ELSE stages.list_date END, "
+                "updated_at=excluded.updated_at",
+                rows,
+            )
+
+    def get_papers(self, arxiv_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        ids = list(dict.fromkeys(a for a in arxiv_ids if a))
+        out: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i : i + 500]
+                marks = ", ".join("?" for _ in chunk)
+                for row in self.conn.execute(f"SELECT * FROM papers WHERE arxiv_id IN ({marks})", chunk):
+                    out[row["arxiv_id"]] = dict(row)
+        return out
+
+    def ids_with_stage(self, stage: str, status: str = "ok", list_date: str = "") -> Set[str]:
+        sql = "SELECT arxiv_id FROM stages WHERE stage=? AND status=?"
+        params: List[Any] = [stage, status]
+        if list_date:
+            sql += " AND list_date=?"
+            params.append(list_date)
+        with self._lock:
+            return {row[0] for row in self.conn.execute(sql, params)}
+
+    def pending(self, stage: str, after: str, list_date: str = "") -> List[str]:
+        """Ids whose ``after`` stage is ok but ``stage`` is not ok yet."""
+        sql = (
+            "SELECT a.arxiv_id FROM stages a LEFT JOIN stages b ON b.arxiv_id = a.arxiv_id AND b.stage = ? "
+            "WHERE a.stage = ? AND a.status = 'ok' AND (b.status IS NULL OR b.status != 'ok')"
+        )
+        params: List[Any] = [stage, after]
+        if list_date:
+            sql += " AND a.list_date = ?"
+            params.append(list_date)
+        sql += " ORDER BY a.arxiv_id"
+        with self._lock:
+            return [row[0] for row in self.conn.execute(sql, params)]
+
+    def pending_paths(self, stage: str, after: str, list_date: str) -> Optional[List[Tuple[str, str]]]:
+        """``(arxiv_id, path of the after stage)`` for ids of ``list_date`` that still need ``stage``.
+
+        Returns None when the store has no ok ``after`` row for ``list_date`` at
+        all (the date predates the store or the previous step ran elsewhere);
+        callers then fall back to scanning their input directory.
+        """
+        with self._lock:
+            known = self.conn.execute(
+                "SELECT 1 FROM stages WHERE stage = ? AND status = 'ok' AND list_date = ? LIMIT 1", (after, list_date)
+            ).fetchone()
+            if known is None:
+                return None
+            rows = self.conn.execute(
+                "SELECT a.arxiv_id, a.path FROM stages a LEFT JOIN stages b ON b.arxiv_id = a.arxiv_id AND b.stage = ? "
+                "WHERE a.stage = ? AND a.status = 'ok' AND a.list_date = ? AND (b.status IS NULL OR b.status != 'ok') "
+                "ORDER BY a.arxiv_id",
+                (stage, after, list_date),
+            ).fetchall()
+        return [(row[0], row[1] or "") for row in rows]
+
+    def pending_files(self, stage: str, after: str, list_date: str, in_dir: Path, suffix: str) -> Optional[List[Path]]:
+        """:meth:`pending_paths` resolved to existing files: ``in_dir/<id><suffix>``, else the recorded path."""
+        items = self.pending_paths(stage, after, list_date)
+        if items is None:
+            return None
+        files: List[Path] = []
+        for aid, recorded in items:
+            p = Path(in_dir) / f"{aid}{suffix}"
+            if not p.exists() and recorded.endswith(suffix) and os.path.exists(recorded):
+                p = Path(recorded)
+            if p.exists():
+                files.append(p)
+        return files
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+                (key, value),
+            )
+
+    def add_seen(self, items: Iterable[Tuple[str, str, str]]) -> List[Tuple[str, str]]:
+        """Insert (title, source, writing_datetime) rows; return the (title, source) keys that were new.
+
+        Membership is checked by the primary key, so the cost does not depend on
+        how much history is stored; a key repeated within ``items`` counts once.
+        """
+        added: List[Tuple[str, str]] = []
+        with self._lock, self.conn:
+            for title, source, written in items:
+                cur = self.conn.execute(
+                    "INSERT OR IGNORE INTO seen_papers (title, source, writing_datetime) VALUES (?, ?, ?)",
+                    (title, source, written),
+                )
+                if cur.rowcount:
+                    added.append((title, source))
+        return added
+
+    def is_seen(self, title: str, source: str) -> bool:
+        with self._lock:
+            row = self.conn.execute("SELECT 1 FROM seen_papers WHERE title=? AND source=?", (title, source)).fetchone()
+        return row is not None
+
+    def seen_count(self) -> int:
+        with self._lock:
+            return int(self.conn.execute("SELECT COUNT(*) FROM seen_papers").fetchone()[0])
+
+
+_store: Optional[PaperStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> PaperStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PaperStore()
+        return _store
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser("paper_store")
+    ap.add_argument("--path", default=PAPER_STORE_PATH)
+    ap.add_argument("--date", default="")
+    ap.add_argument("--pending", default="", help="stage name, e.g. summary")
+    ap.add_argument("--after", default=STAGE_FULL_MD, help="prerequisite stage for --pending")
+    ap.add_argument("--stage", default="", help="list ids with this stage/status")
+    ap.add_argument("--status", default="ok")
+    args = ap.parse_args(argv)
+
+    store = PaperStore(args.path)
+    if args.pending:
+        ids = store.pending(args.pending, after=args.after, list_date=args.date)
+    elif args.stage:
+        ids = sorted(store.ids_with_stage(args.stage, args.status, list_date=args.date))
+    else:
+        with store._lock:
+            rows = store.conn.execute("SELECT stage, status, COUNT(*) FROM stages GROUP BY stage, status ORDER BY stage, status").fetchall()
+        for stage, status, n in rows:
+            print(f"{stage:<12} {status:<10} {n}")
+        return
+    for aid in ids:
+        print(aid)
+    print(f"[STORE] count={len(ids)}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,16 @@
 from __future__ import annotations
 
 import argparse
+import json
 import os
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
-from openai import OpenAI
+from openai import NOT_GIVEN, APITimeoutError, OpenAI
 
 import sys
 
@@ -22,25 +24,17 @@ from config.config import (
     summary_input_hard_limit,
     summary_input_safety_margin,
     summary_concurrency,
+    summary_tokenizer,
+    summary_stream,
+    summary_wall_budget_sec,
+    summary_stream_idle_sec,
     system_prompt,
     DATA_ROOT,
 )
-
-
-def approx_input_tokens(text: str) -> int:
-    if not text:
-        return 0
-    return len(text.encode("utf-8", errors="ignore"))
-
-
-def crop_to_input_tokens(text: str, limit_tokens: int) -> str:
-    budget = int(limit_tokens)
-    if budget <= 0:
-        return ""
-    b = text.encode("utf-8", errors="ignore")
-    if len(b) <= budget:
-        return text
-    return b[:budget].decode("utf-8", errors="ignore")
+from Controller.paper_store import get_store, STAGE_FULL_MD, STAGE_SUMMARY
+from Controller.llm_cache import cached_completion, open_llm_cache
+from Controller.token_budget import fit_to_budget, get_tokenizer
+from Controller.md_reduce import get_reducer
 
 
 def list_md_files(root: Path) -> List[Path]:
@@ -80,33 +74,165 @@ def make_client() -> OpenAI:
     return OpenAI(api_key=key, base_url=base)
 
 
-def summarize_one(client: OpenAI, md_path: Path) -> Tuple[Path, str]:
+class SummaryTimeout(Exception):
+    """Generation cancelled after exceeding the wall-clock budget or the stream idle limit."""
+
+
+def stream_completion(
+    client: OpenAI,
+    request: dict,
+    part_path: Optional[Path],
+    deadline: Optional[float],
+    idle_sec: float,
+    metrics: dict,
+    tok,
+) -> str:
+    """Stream one chat completion, appending deltas to ``part_path`` as they arrive.
+
+    Records ``ttft_s`` / ``latency_s`` / ``output_tokens`` / ``tokens_per_s`` in
+    ``metrics`` (also for cancelled generations). Raises :class:`SummaryTimeout`
+    once ``deadline`` (``time.monotonic()``) passes or no chunk arrives within
+    ``idle_sec``; closing the stream drops the connection so the server stops
+    generating.
+    """
+    t0 = time.monotonic()
+    timeout = float(idle_sec) if idle_sec and idle_sec > 0 else None
+    if deadline is not None:
+        left = max(1.0, deadline - t0)
+        timeout = min(timeout, left) if timeout else left
+    # 既无空闲上限也无预算时沿用客户端默认超时；timeout=None 会彻底关闭超时
+    parts: List[str] = []
+    ttft = None
+    usage = None
+    finish = None
+    f = part_path.open("w", encoding="utf-8") if part_path is not None else None
+    stream = None
+    try:
+        stream = client.chat.completions.create(
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=timeout if timeout is not None else NOT_GIVEN,
+            **request,
+        )
+        for chunk in stream:
+            now = time.monotonic()
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            for choice in chunk.choices or []:
+                delta = choice.delta.content if choice.delta else None
+                if delta:
+                    if ttft is None:
+                        ttft = now - t0
+                    parts.append(delta)
+                    if f is not None:
+                        f.write(delta)
+                        f.flush()
+                if choice.finish_reason:
+                    finish = choice.finish_reason
+            if deadline is not None and now > deadline:
+                raise SummaryTimeout(f"wall budget exceeded after {now - t0:.0f}s")
+    except APITimeoutError as e:
+        raise SummaryTimeout(f"no output for {timeout:.0f}s" if timeout else "request timed out") from e
+    finally:
+        if stream is not None:
+            stream.close()
+        if f is not None:
+            f.close()
+        latency = time.monotonic() - t0
+        text = "".join(parts)
+        out_tokens = int(getattr(usage, "completion_tokens", 0) or 0) or tok.count(text)
+        gen = latency - (ttft or 0.0)
+        metrics.update(
+            ttft_s=round(ttft, 3) if ttft is not None else None,
+            latency_s=round(latency, 3),
+            output_tokens=out_tokens,
+            tokens_per_s=round(out_tokens / gen, 2) if out_tokens and gen > 0 else None,
+            finish_reason=finish,
+        )
+    return text
+
+
+def summarize_one(
+    client: OpenAI,
+    md_path: Path,
+    cache=None,
+    tokenizer=None,
+    reducer=None,
+    stream: bool = False,
+    part_path: Optional[Path] = None,
+    budget_sec: float = 0,
+    idle_sec: float = summary_stream_idle_sec,
+    metrics: Optional[dict] = None,
+) -> Tuple[Path, str]:
+    """Summarise one paper; ``metrics`` (if given) receives the per-paper timing fields.
+
+    With ``stream`` the raw output is written to ``part_path`` while it is
+    generated; the caller renames the final text into place.
+    """
+    m = metrics if metrics is not None else {}
+    m.update(mode="stream" if stream else "once", status="cached")
+    deadline = time.monotonic() + budget_sec if budget_sec and budget_sec > 0 else None
     md_text = md_path.read_text(encoding="utf-8", errors="ignore")
     if not md_text.strip():
         return md_path, ""
+    if reducer is not None:
+        md_text = reducer.reduce(md_text)
+    tok = tokenizer or get_tokenizer(summary_tokenizer)
     sys_prompt = system_prompt
-    user_content = md_text
     hard_limit = int(summary_input_hard_limit)
     safety_margin = int(summary_input_safety_margin)
     limit_total = hard_limit - safety_margin
-    sys_tokens = approx_input_tokens(sys_prompt)
+    sys_tokens = tok.count(sys_prompt)
     user_budget = max(1, limit_total - sys_tokens)
-    user_content = crop_to_input_tokens(user_content, user_budget)
+    user_content, _ = fit_to_budget(md_text, user_budget, tok)
     kwargs = {}
     if summary_temperature is not None:
         kwargs["temperature"] = float(summary_temperature)
     if summary_max_tokens is not None:
         kwargs["max_tokens"] = int(summary_max_tokens)
-    resp = client.chat.completions.create(
-        model=summary_model,
-        messages=[
+
+    request = {
+        "model": summary_model,
+        "messages": [
             {"role": "system", "content": sys_prompt},
             {"role": "user", "content": user_content},
         ],
-        stream=False,
         **kwargs,
+    }
+
+    def call() -> str:
+        m["status"] = "ok"
+        if stream:
+            return stream_completion(client, request, part_path, deadline, idle_sec, m, tok)
+        t0 = time.monotonic()
+        try:
+            # 非流式只能以单次请求超时近似墙钟预算
+            resp = client.chat.completions.create(stream=False, timeout=budget_sec or NOT_GIVEN, **request)
+        except APITimeoutError as e:
+            raise SummaryTimeout(f"no response within {budget_sec:.0f}s" if budget_sec else "request timed out") from e
+        finally:
+            m["latency_s"] = round(time.monotonic() - t0, 3)
+        text = (resp.choices[0].message.content if resp.choices else "") or ""
+        usage = getattr(resp, "usage", None)
+        out_tokens = int(getattr(usage, "completion_tokens", 0) or 0) or tok.count(text)
+        m.update(
+            ttft_s=m["latency_s"],
+            output_tokens=out_tokens,
+            tokens_per_s=round(out_tokens / m["latency_s"], 2) if out_tokens and m["latency_s"] > 0 else None,
+            finish_reason=resp.choices[0].finish_reason if resp.choices else None,
+        )
+        return text
+
+    content = cached_completion(
+        cache,
+        summary_model,
+        sys_prompt,
+        user_content,
+        kwargs.get("temperature"),
+        kwargs.get("max_tokens"),
+        call,
+        cacheable=lambda t: bool(t.strip()),
     )
-    content = resp.choices[0].message.content if resp.choices else ""
     if not content:
         return md_path, ""
     lines = content.splitlines()
@@ -119,13 +245,65 @@ def summarize_one(client: OpenAI, md_path: Path) -> Tuple[Path, str]:
     return md_path, content
 
 
-def run() -> None:
+def _percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))]
+
+
+class SummaryMetrics:
+    """Per-paper timing rows appended to ``<out-root>/metrics/<date>.jsonl``."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.rows: List[dict] = []
+        self._lock = threading.Lock()
+
+    def record(self, row: dict) -> None:
+        row = {"ts": datetime.now().isoformat(timespec="seconds"), **row}
+        line = json.dumps(row, ensure_ascii=False)
+        with self._lock:
+            self.rows.append(row)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def count(self, status: str) -> int:
+        return sum(1 for r in self.rows if r.get("status") == status)
+
+    def summary(self) -> str:
+        statuses = ("ok", "cached", "empty", "timeout", "error")
+        parts = [f"{s}={self.count(s)}" for s in statuses]
+        live = [r for r in self.rows if r.get("status") == "ok"]
+        ttft = [r["ttft_s"] for r in live if r.get("ttft_s") is not None]
+        lat = [r["latency_s"] for r in live if r.get("latency_s") is not None]
+        tps = [r["tokens_per_s"] for r in live if r.get("tokens_per_s")]
+        if ttft:
+            parts.append(f"ttft p50={_percentile(ttft, 0.5):.2f}s p95={_percentile(ttft, 0.95):.2f}s")
+        if lat:
+            parts.append(f"latency p50={_percentile(lat, 0.5):.1f}s p95={_percentile(lat, 0.95):.1f}s")
+        if tps:
+            parts.append(f"tok/s p50={_percentile(tps, 0.5):.1f}")
+        return " ".join(parts)
+
+
+def run(argv: List[str] | None = None, ids: List[str] | None = None) -> Dict[str, Any]:
+    """Summarize the full md of one date; ``ids`` (in-process pipeline) are the papers parsed upstream.
+
+    Returns ``{"date", "path", "ids"}`` with the gather file and the summarized ids.
+    """
     ap = argparse.ArgumentParser("paper_summary")
     ap.add_argument("--input-dir", default=str(Path(DATA_ROOT) / "selectedpaper_to_mineru"))
     ap.add_argument("--out-root", default=str(Path(DATA_ROOT) / "paper_summary"))
     ap.add_argument("--date", default="")
     ap.add_argument("--concurrency", type=int, default=summary_concurrency)
-    args = ap.parse_args()
+    ap.add_argument("--no-llm-cache", action="store_true", help="always call the model, bypassing the response cache")
+    ap.add_argument("--no-reduce", action="store_true", help="send the MinerU markdown without md_reduce preprocessing")
+    ap.add_argument("--tokenizer", default=summary_tokenizer, help="auto | tokenizers | tiktoken | heuristic | bytes")
+    ap.add_argument("--no-stream", action="store_true", help="wait for the whole completion instead of streaming it")
+    ap.add_argument("--budget-sec", type=float, default=summary_wall_budget_sec, help="cancel a paper after this many seconds (0 = no limit)")
+    ap.add_argument("--idle-sec", type=float, default=summary_stream_idle_sec, help="cancel a stream that produces nothing for this long")
+    args = ap.parse_args(argv)
+    stream = bool(summary_stream) and not args.no_stream
 
     in_root = Path(args.input_dir)
     if not in_root.exists():
@@ -157,10 +335,21 @@ def run() -> None:
                 in_dir = in_root
                 date_str = today
 
-    files = list_md_files(in_dir)
-    if not files:
-        raise SystemExit(f"no md files in {in_dir}")
+    store = get_store()
+    # 工作集：进程内流水线直接用上游传入的 ids；否则取自元数据库（全文 md 已完成、摘要未完成），库中没有该日期的记录时才扫描输入目录
+    if ids is not None:
+        files = [in_dir / f"{aid}.md" for aid in ids if (in_dir / f"{aid}.md").exists()]
+        source = "pipeline"
+    else:
+        files = store.pending_files(STAGE_SUMMARY, after=STAGE_FULL_MD, list_date=date_str, in_dir=in_dir, suffix=".md")
+        source = "store"
+    if files is None:
+        files = list_md_files(in_dir)
+        source = "scan"
+        if not files:
+            raise SystemExit(f"no md files in {in_dir}")
     print("============开始生成精选论文中文摘要==============", flush=True)
+    print(f"[SUMMARY] work set from {source}: {len(files)} file(s)", flush=True)
 
     out_root = Path(args.out_root)
     single_dir = out_root / "single" / date_str
@@ -171,6 +360,7 @@ def run() -> None:
     for p in files:
         out_path = single_dir / f"{p.stem}.md"
         if out_path.exists():
+            store.set_stage(p.stem, STAGE_SUMMARY, "ok", path=str(out_path), list_date=date_str)
             continue
         to_run.append(p)
 
@@ -179,22 +369,55 @@ def run() -> None:
         gather_path = write_gather(single_dir, gather_dir, date_str)
         print(f"[SUMMARY] all files already summarized, single_dir={single_dir}", flush=True)
         print(f"[SUMMARY] gather_path={gather_path}", flush=True)
-        return
+        return {"date": date_str, "path": str(gather_path), "ids": [p.stem for p in files]}
 
     client = make_client()
+    cache = open_llm_cache(disabled=args.no_llm_cache)
     workers = max(1, int(args.concurrency or 0))
-    print(f"[SUMMARY] input_dir={in_dir} total={total} concurrency={workers}", flush=True)
+    tokenizer = get_tokenizer(args.tokenizer)
+    reducer = get_reducer("summary", disabled=args.no_reduce)
+    metrics = SummaryMetrics(out_root / "metrics" / f"{date_str}.jsonl")
+    print(
+        f"[SUMMARY] input_dir={in_dir} total={total} concurrency={workers} tokenizer={tokenizer.name} "
+        f"stream={stream} budget={args.budget_sec:g}s",
+        flush=True,
+    )
 
     start = time.monotonic()
     done = 0
     empty = 0
 
     def task(md_path: Path) -> Tuple[Path, str]:
-        path, content = summarize_one(client, md_path)
+        # 流式输出先写 .part，完成后整体改名；取消 / 失败时保留 .part 便于查看，重跑时覆盖
+        part_path = single_dir / f"{md_path.stem}.md.part"
+        m = {"arxiv_id": md_path.stem}
+        try:
+            path, content = summarize_one(
+                client,
+                md_path,
+                cache,
+                tokenizer,
+                reducer,
+                stream=stream,
+                part_path=part_path,
+                budget_sec=args.budget_sec,
+                idle_sec=args.idle_sec,
+                metrics=m,
+            )
+        except Exception as e:
+            m.update(status="timeout" if isinstance(e, SummaryTimeout) else "error", error=repr(e))
+            metrics.record(m)
+            raise
         if not content.strip():
+            m["status"] = "empty"
+            part_path.unlink(missing_ok=True)
+            metrics.record(m)
             return path, ""
         out_path = single_dir / f"{path.stem}.md"
-        out_path.write_text(content, encoding="utf-8")
+        part_path.write_text(content, encoding="utf-8")
+        os.replace(part_path, out_path)
+        metrics.record(m)
+        store.set_stage(path.stem, STAGE_SUMMARY, "ok", path=str(out_path), list_date=date_str)
         return path, content
 
     with ThreadPoolExecutor(max_workers=workers) as ex:
@@ -210,13 +433,24 @@ def run() -> None:
             done += 1
             elapsed = time.monotonic() - start
             rate = done / elapsed if elapsed > 0 else 0.0
-            print(f"\r[SUMMARY] progress done={done}/{total} empty={empty} rate={rate:.2f}/s", end="", flush=True)
+            print(
+                f"\r[SUMMARY] progress done={done}/{total} empty={empty} timeout={metrics.count('timeout')} rate={rate:.2f}/s",
+                end="",
+                flush=True,
+            )
 
     print()
+    print(f"[METRICS] {metrics.summary()} path={metrics.path}", flush=True)
+    if reducer is not None:
+        print(f"[MD-REDUCE] {reducer.summary()}", flush=True)
+    if cache is not None:
+        print(f"[LLM-CACHE] {cache.summary()}", flush=True)
+        cache.close()
     gather_path = write_gather(single_dir, gather_dir, date_str)
     print(f"[SUMMARY] single_dir={single_dir}", flush=True)
     print(f"[SUMMARY] gather_path={gather_path}", flush=True)
     print("============结束生成精选论文中文摘要==============", flush=True)
+    return {"date": date_str, "path": str(gather_path), "ids": [p.stem for p in files if (single_dir / f"{p.stem}.md").exists()]}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,160 @@
+"""Single-pass multi-pattern matching helpers.
+
+``MultiPatternScanner`` counts matches for several ``\\b``-anchored regexes (as
+used in ``config.PATTERN_REGEX``) in one scan of the text. A trie-shaped
+trigger regex over the possible 3-char word prefixes finds candidate word
+starts; only the groups whose prefixes occur there are verified with the
+original compiled pattern, so counts equal ``len(pattern.findall(text))``.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+try:
+    import re._parser as _sre_parse  # py3.11+
+    from re._constants import AT, BRANCH, CATEGORY, IN, LITERAL, MAX_REPEAT, MAXREPEAT, MIN_REPEAT, SUBPATTERN
+except ImportError:  # pragma: no cover
+    import sre_parse as _sre_parse
+    from sre_constants import AT, BRANCH, CATEGORY, IN, LITERAL, MAX_REPEAT, MAXREPEAT, MIN_REPEAT, SUBPATTERN
+
+PREFIX_LEN = 3
+
+# 在 re.IGNORECASE 下与 ASCII 字母互相匹配、但 str.lower() 不会映射过去的字符
+_CASE_FOLD = str.maketrans({"İ": "i", "ı": "i", "ſ": "s", "K": "k"})
+
+
+class UnsupportedPattern(ValueError):
+    pass
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+def _expand(seq: list, prefix: str, out: Set[str], limit: int) -> None:
+    if len(prefix) >= limit:
+        out.add(prefix[:limit])
+        return
+    if not seq:
+        out.add(prefix)
+        return
+    op, av = seq[0]
+    rest = seq[1:]
+    if op is AT:
+        _expand(rest, prefix, out, limit)
+    elif op is LITERAL:
+        ch = chr(av).lower()
+        if _is_word(ch):
+            _expand(rest, prefix + ch, out, limit)
+        else:
+            out.add(prefix)
+    elif op is IN:
+        for iop, iav in av:
+            if iop is LITERAL and _is_word(chr(iav)):
+                _expand(rest, prefix + chr(iav).lower(), out, limit)
+            elif iop is LITERAL or iop is CATEGORY:
+                # 非单词字符（如 [-\s]）会结束当前单词前缀
+                out.add(prefix)
+            else:
+                raise UnsupportedPattern(f"unsupported set item: {iop}")
+    elif op is BRANCH:
+        for alt in av[1]:
+            _expand(list(alt) + rest, prefix, out, limit)
+    elif op is SUBPATTERN:
+        _expand(list(av[-1]) + rest, prefix, out, limit)
+    elif op is MAX_REPEAT or op is MIN_REPEAT:
+        lo, hi, sub = av
+        if lo == 0:
+            _expand(rest, prefix, out, limit)
+        if hi != 0:
+            more = []
+            if hi == MAXREPEAT or hi > 1:
+                more = [(op, (max(0, lo - 1), hi if hi == MAXREPEAT else hi - 1, sub))]
+            _expand(list(sub) + more + rest, prefix, out, limit)
+    else:
+        raise UnsupportedPattern(f"unsupported regex op: {op}")
+
+
+def regex_word_prefixes(pattern: str, limit: int = PREFIX_LEN) -> Set[str]:
+    """Lower-cased word prefixes (up to ``limit`` chars) any match of ``pattern`` can start with."""
+    out: Set[str] = set()
+    _expand(list(_sre_parse.parse(pattern)), "", out, limit)
+    if "" in out:
+        raise UnsupportedPattern(f"pattern can start without a word char: {pattern[:40]}")
+    return out
+
+
+def trie_regex(words: Iterable[str]) -> str:
+    """Build a prefix-factored alternation (longest match first) for literal ``words``."""
+    root: dict = {}
+    for w in words:
+        node = root
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: dict) -> str:
+        alts = []
+        optional = False
+        for ch, sub in sorted(node.items()):
+            if ch == "":
+                optional = True
+                continue
+            alts.append(re.escape(ch) + emit(sub))
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return "(?:" + body + ")?" if optional else body
+
+    return emit(root)
+
+
+def fold_case(text: str) -> Optional[str]:
+    """Lower-case ``text`` keeping offsets; ``None`` if that is impossible."""
+    folded = text.translate(_CASE_FOLD).lower() if not text.isascii() else text.lower()
+    if len(folded) != len(text):
+        return None
+    return folded
+
+
+class MultiPatternScanner:
+    def __init__(self, patterns: Dict[str, str]) -> None:
+        self.names: List[str] = list(patterns)
+        self.compiled = {k: re.compile(v) for k, v in patterns.items()}
+        prefix_map: Dict[str, List[str]] = {}
+        for k in self.names:
+            for p in regex_word_prefixes(patterns[k]):
+                prefix_map.setdefault(p, []).append(k)
+        self.prefix_map = {p: tuple(ks) for p, ks in prefix_map.items()}
+        self.prefix_lens = sorted({len(p) for p in self.prefix_map})
+        self.trigger = re.compile(r"\b(?:" + trie_regex(self.prefix_map) + ")")
+
+    def count(self, text: str, presence_only: Iterable[str] = ()) -> Dict[str, int]:
+        """Match counts per pattern; names in ``presence_only`` stop at their first hit (0/1)."""
+        counts = dict.fromkeys(self.names, 0)
+        folded = fold_case(text)
+        if folded is None:
+            for k in self.names:
+                counts[k] = len(self.compiled[k].findall(text))
+            return counts
+        once = set(presence_only)
+        last_end = dict.fromkeys(self.names, 0)
+        prefix_map = self.prefix_map
+        compiled = self.compiled
+        for m in self.trigger.finditer(folded):
+            pos = m.start()
+            word = m.group()
+            for n in self.prefix_lens:
+                if n > len(word):
+                    break
+                ks = prefix_map.get(word[:n])
+                if not ks:
+                    continue
+                for k in ks:
+                    if pos < last_end[k] or (k in once and counts[k]):
+                        continue
+                    mm = compiled[k].match(text, pos)
+                    if mm:
+                        counts[k] += 1
+                        last_end[k] = mm.end()
+        return counts
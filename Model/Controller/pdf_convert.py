@@ -0,0 +1,337 @@
+"""PDF → markdown converter backends for the preview step.
+
+Every backend implements ``convert(pdfs, on_result)`` and reports each file
+exactly once through ``on_result`` as a :class:`~Controller.mineru_client.ReadyResult`
+(``md_text`` on success, ``error`` on failure); the caller writes the md.
+``convert`` is :meth:`ConverterBackend.serve_cached` followed by
+:meth:`ConverterBackend.convert_uncached`; streaming callers use the two
+halves separately to answer cache hits at once and batch only the misses.
+
+* ``mineru`` – the remote MinerU batch service (:func:`mineru_client.run_batches`),
+  with the content-addressed MinerU cache in front of it,
+* ``local`` – pypdf text extraction in a process pool, with light layout
+  heuristics: larger-font lines become headings, front matter (title,
+  authors, affiliations) keeps its line breaks, body lines are re-joined into
+  paragraphs and end-of-line hyphenation is undone.
+
+  python Controller/pdf_convert.py data/preview_pdf/2025-01-01/2501.00001.pdf
+"""
+
+import argparse
+import os
+import re
+import statistics
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from config.config import PREVIEW_LOCAL_WORKERS  # noqa: E402
+from Controller.mineru_cache import MinerUCache, file_sha256  # noqa: E402
+from Controller.mineru_client import BatchState, MinerUClient, ReadyResult, run_batches  # noqa: E402
+
+OnResult = Callable[[ReadyResult], None]
+
+HEADING_SCALE = 1.25
+MAX_HEADING_CHARS = 200
+SHORT_LINE = 0.8
+# 同一行内相邻文字块字号比低于该值、或基线偏移超过字号的该比例时视为上/下标，块间补空格
+SUPERSCRIPT_SCALE = 0.85
+BASELINE_TOLERANCE = 0.2
+ABSTRACT_LINE_RE = re.compile(r"^\s*(abstract|摘\s*要)\b[\s.:：—–-]*", re.I)
+SENTENCE_END_RE = re.compile(r"[.!?:;。！？：；]$")
+
+
+class ConverterBackend:
+    name = "base"
+
+    def convert(self, pdfs: List[Path], on_result: OnResult) -> None:
+        missing = self.serve_cached(pdfs, on_result)
+        if missing:
+            self.convert_uncached(missing, on_result)
+
+    def serve_cached(self, pdfs: List[Path], on_result: OnResult) -> List[Path]:
+        """Report the PDFs a cache can answer; return the ones still to convert."""
+        return list(pdfs)
+
+    def convert_uncached(self, pdfs: List[Path], on_result: OnResult) -> None:
+        raise NotImplementedError
+
+    def summary(self) -> str:
+        return ""
+
+
+# ---------------- local (pypdf) ----------------
+
+
+def _page_lines(page) -> List[Tuple[str, float]]:
+    """``(text, font size)`` per text line of ``page``, in content-stream order.
+
+    Chunks of one line are separated by a space when the font size or the
+    baseline changes between them, so superscript markers do not glue onto
+    names ("Alice Smith 1", "1 Google Research").
+    """
+    lines: List[Tuple[str, float]] = []
+    cur: List[Tuple[str, float, float]] = []  # (text, effective size, baseline y)
+
+    def flush() -> None:
+        text = ""
+        prev = None
+        for part, eff, y in cur:
+            if prev is not None and part.strip() and _chunk_break(prev, (eff, y)):
+                text += " "
+            text += part
+            if part.strip():
+                prev = (eff, y)
+        lines.append((text, max((eff for part, eff, _ in cur if part.strip()), default=0.0)))
+        cur.clear()
+
+    def visit(text, cm, tm, font_dict, font_size):
+        if not text:
+            return
+        scale = abs(tm[3] * cm[3]) or abs(tm[0] * cm[0]) or 1.0
+        eff = float(font_size or 0) * scale
+        y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+        parts = text.split("\n")
+        for i, part in enumerate(parts):
+            if i:
+                flush()
+            if part:
+                cur.append((part, eff, y))
+
+    page.extract_text(visitor_text=visit)
+    if cur:
+        flush()
+    return [(" ".join(t.split()), s) for t, s in lines if t.strip()]
+
+
+def _chunk_break(prev: Tuple[float, float], nxt: Tuple[float, float]) -> bool:
+    """Whether two chunks of a line differ in size or baseline (superscript / subscript)."""
+    (s1, y1), (s2, y2) = prev, nxt
+    if s1 > 0 and s2 > 0 and min(s1, s2) < SUPERSCRIPT_SCALE * max(s1, s2):
+        return True
+    return abs(y1 - y2) > BASELINE_TOLERANCE * max(s1, s2, 1.0)
+
+
+def pdf_to_markdown(path: str, max_pages: Optional[int] = None) -> str:
+    """Markdown-ish text of ``path`` for LLM screening (not a faithful layout)."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    pages = reader.pages if max_pages is None else reader.pages[:max_pages]
+    lines: List[Tuple[str, float]] = []
+    for page in pages:
+        lines.extend(_page_lines(page))
+        lines.append(("", 0.0))  # 分页处断段
+    sized = [s for t, s in lines for _ in range(len(t)) if s > 0]
+    body = statistics.median(sized) if sized else 0.0
+
+    out: List[str] = []
+    para: List[str] = []
+    front = True
+    title_done = False
+
+    def flush() -> None:
+        if para:
+            out.append(_join(para))
+            para.clear()
+
+    for text, size in lines:
+        if not text:
+            flush()
+            continue
+        m = ABSTRACT_LINE_RE.match(text)
+        if front and m:
+            flush()
+            out.append("## Abstract")
+            front = False
+            rest = text[m.end() :].strip()
+            if rest:
+                para.append(rest)
+            continue
+        if body and size >= body * HEADING_SCALE and len(text) <= MAX_HEADING_CHARS:
+            flush()
+            out.append(("# " if not title_done else "## ") + text)
+            title_done = True
+            continue
+        if front:
+            # 摘要之前（标题 / 作者 / 机构）保持逐行，便于机构匹配
+            out.append(text)
+            continue
+        if para and SENTENCE_END_RE.search(para[-1]) and len(para[-1]) < SHORT_LINE * max(len(x) for x in para):
+            # 上一行以句末标点结束且明显短于段内其他行：视为段落结尾
+            flush()
+        para.append(text)
+    flush()
+    return "\n\n".join(out).strip() + "\n"
+
+
+def _join(lines: List[str]) -> str:
+    """Re-join wrapped lines, undoing ``exam-`` / ``ple`` hyphenation."""
+    text = ""
+    for ln in lines:
+        if text.endswith("-") and ln[:1].islower():
+            text = text[:-1] + ln
+        else:
+            text = f"{text} {ln}" if text else ln
+    return text
+
+
+def _convert_one(job: Tuple[str, Optional[int]]) -> Tuple[str, str, str]:
+    """Process-pool entry: returns ``(path, md_text, error)``."""
+    path, max_pages = job
+    try:
+        md = pdf_to_markdown(path, max_pages)
+        if not md.strip():
+            return path, "", "no extractable text (scanned PDF?)"
+        return path, md, ""
+    except Exception as e:
+        return path, "", repr(e)
+
+
+def _iter_local(jobs: List[Tuple[str, Optional[int]]], workers: int):
+    """Yield _convert_one results; ``workers`` <= 1 converts in this process."""
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield _convert_one(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        futures = [ex.submit(_convert_one, job) for job in jobs]
+        for fut in as_completed(futures):
+            yield fut.result()
+
+
+class LocalTextBackend(ConverterBackend):
+    name = "local"
+
+    def __init__(self, workers: int = PREVIEW_LOCAL_WORKERS, max_pages: Optional[int] = None) -> None:
+        self.workers = max(1, int(workers or 1))
+        self.max_pages = max_pages
+        self.ok = 0
+        self.failed = 0
+
+    def convert_uncached(self, pdfs: List[Path], on_result: OnResult) -> None:
+        by_str = {str(p): p for p in pdfs}
+        jobs = [(str(p), self.max_pages) for p in pdfs]
+        for i, (path, md, err) in enumerate(_iter_local(jobs, self.workers), 1):
+            p = by_str[path]
+            if err:
+                self.failed += 1
+                on_result(ReadyResult(p, "failed", error=err))
+            else:
+                self.ok += 1
+                on_result(ReadyResult(p, "done", md_text=md))
+            print(f"\r[local] {i}/{len(jobs)} ok={self.ok} failed={self.failed}", end="", flush=True)
+        print()
+
+    def summary(self) -> str:
+        return f"backend=local workers={self.workers} ok={self.ok} failed={self.failed}"
+
+
+# ---------------- MinerU ----------------
+
+
+class MinerUBackend(ConverterBackend):
+    name = "mineru"
+
+    def __init__(
+        self,
+        client: MinerUClient,
+        token: str,
+        state: BatchState,
+        model_version: str,
+        cache: Optional[MinerUCache] = None,
+        zip_dir: Optional[Path] = None,
+        assets_root: Optional[Path] = None,
+        **batch_opts,
+    ) -> None:
+        self.client = client
+        self.token = token
+        self.state = state
+        self.model_version = model_version
+        self.cache = cache
+        self.zip_dir = zip_dir
+        self.assets_root = assets_root
+        self.batch_opts = batch_opts
+        self._sha_by_stem: Dict[str, str] = {}
+
+    def convert(self, pdfs: List[Path], on_result: OnResult) -> None:
+        missing = self.serve_cached(pdfs, on_result)
+        if self.cache is not None:
+            print(f"[mineru] cache: {self.cache.summary()}", flush=True)
+        if not missing:
+            return
+        self.convert_uncached(missing, on_result)
+        print()
+        if self.zip_dir is not None:
+            try:
+                self.zip_dir.rmdir()
+            except OSError:
+                pass
+
+    def serve_cached(self, pdfs: List[Path], on_result: OnResult) -> List[Path]:
+        if self.cache is None:
+            return list(pdfs)
+        missing = []
+        for p in pdfs:
+            md_text = None
+            try:
+                self._sha_by_stem[p.stem] = file_sha256(p)
+                md_text = self.cache.get_md(self._sha_by_stem[p.stem])
+            except OSError:
+                pass
+            if md_text is None:
+                missing.append(p)
+            else:
+                on_result(ReadyResult(p, "cached", md_text=md_text))
+        return missing
+
+    def convert_uncached(self, pdfs: List[Path], on_result: OnResult) -> None:
+        """Run ``pdfs`` through MinerU; safe to call from several threads (one batch each)."""
+
+        def settle(res: ReadyResult) -> None:
+            sha = self._sha_by_stem.get(res.path.stem)
+            if not res.error and self.cache is not None and sha:
+                self.cache.put(sha, res.md_text, res.zip_path)
+            if res.zip_path is not None:
+                res.zip_path.unlink(missing_ok=True)
+            on_result(res)
+
+        zip_dir = None
+        if self.zip_dir is not None and self.cache is not None and self.cache.keep_zip:
+            # 仅在缓存需要保留完整 zip 时落盘，否则 md 直接从远端 / 内存中的 zip 读取
+            zip_dir = self.zip_dir
+            zip_dir.mkdir(parents=True, exist_ok=True)
+        run_batches(
+            self.client,
+            pdfs,
+            self.token,
+            zip_dir,
+            self.state,
+            self.model_version,
+            settle,
+            assets_root=self.assets_root,
+            **self.batch_opts,
+        )
+
+    def summary(self) -> str:
+        cache = f" cache[{self.cache.summary()}]" if self.cache is not None else ""
+        return f"backend=mineru model={self.model_version}{cache}"
+
+
+BACKENDS = ("local", "mineru")
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser("pdf_convert")
+    ap.add_argument("files", nargs="+", help="PDFs to convert with the local backend")
+    ap.add_argument("--pages", type=int, default=None, help="only the first N pages")
+    args = ap.parse_args(argv)
+    for path in args.files:
+        print(f"===== {os.path.basename(path)} =====")
+        print(pdf_to_markdown(path, args.pages))
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,9 @@ from typing import List, Set, Optional, Tuple
 
 import requests
 
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from Controller.rate_limit import TokenBucket  # noqa: E402
+
 
 # ------------- Logging -------------
 def setup_logging(log_file: str = "pdf_download.log") -> logging.Logger:
@@ -133,6 +136,8 @@ class DownloadResult:
     ok: bool
     reason: str
     out_path: str
+    bytes_fetched: int = 0
+    full_size: int = 0
 
 
 def build_pdf_url(arxiv_id: str) -> str:
@@ -147,6 +152,8 @@ def download_one_pdf(
     logger: logging.Logger,
     retries: int = 5,
     timeout: int = 60,
+    limiter: Optional[TokenBucket] = None,
+    warmup: str = "each",
 ) -> DownloadResult:
     urls = [
         f"https://arxiv.org/pdf/{arxiv_id}.pdf?download=1",
@@ -159,14 +166,19 @@ def download_one_pdf(
 
     for attempt in range(1, retries + 1):
         try:
-            session.get(
-                f"https://arxiv.org/abs/{arxiv_id}",
-                headers={"Accept": "text/html", "Referer": "https://arxiv.org/"},
-                timeout=timeout,
-            )
-            time.sleep(0.2)
+            if warmup == "each":
+                if limiter is not None:
+                    limiter.acquire()
+                session.get(
+                    f"https://arxiv.org/abs/{arxiv_id}",
+                    headers={"Accept": "text/html", "Referer": "https://arxiv.org/"},
+                    timeout=timeout,
+                )
+                time.sleep(0.2)
             for url in urls:
                 logger.debug("Downloading %s (attempt %d/%d): %s", arxiv_id, attempt, retries, url)
+                if limiter is not None:
+                    limiter.acquire()
                 r = session.get(
                     url,
                     headers={"Accept": "application/pdf", "Referer": "https://arxiv.org/"},
@@ -229,20 +241,47 @@ def download_one_pdf(
     return DownloadResult(arxiv_id, False, last_reason, out_path)
 
 
+def warmup_session(session: requests.Session, logger: logging.Logger, timeout: int = 60) -> None:
+    # 每个 session 只访问一次 arXiv 首页以获取 cookie，替代逐篇访问 /abs/ 页
+    try:
+        session.get("https://arxiv.org/", headers={"Accept": "text/html"}, timeout=timeout)
+    except Exception as e:
+        logger.warning("Session warm-up failed: %r", e)
+
+
 #
 import argparse
+import concurrent.futures
+import io
 import logging
 import os
 import re
 import sys
+import threading
 from datetime import datetime
 
 import requests
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from config.config import OUTPUT_DIR, FILENAME_FMT, PDF_OUTPUT_DIR, USER_AGENT  # noqa: E402
+from config.config import (  # noqa: E402
+    OUTPUT_DIR,
+    FILENAME_FMT,
+    PDF_OUTPUT_DIR,
+    USER_AGENT,
+    PDF_DOWNLOAD_WORKERS,
+    PDF_DOWNLOAD_RATE,
+    PDF_DOWNLOAD_BURST,
+    PDF_DOWNLOAD_WARMUP,
+    PDF_DOWNLOAD_MODE,
+    PDF_PREVIEW_DIR,
+    PDF_PREVIEW_BLOCK_KB,
+    PDF_PREVIEW_MAX_REQUESTS,
+)
+from Controller.http_range import HttpRangeReader, RangeNotSupported
 from Controller.http_session import build_session
+from Controller.paper_store import get_store, STAGE_DEDUP, STAGE_DOWNLOAD, STAGE_SPLIT
+from Controller.pdf_split import write_first_pages
 
 
 def setup_logging():
@@ -277,6 +316,17 @@ def parse_arxiv_ids(md_path):
     return ids
 
 
+def drop_duplicates(arxiv_ids, date_str, logger):
+    """Drop ids that paperList_remove_duplications marked duplicate / near_duplicate for ``date_str``."""
+    store = get_store()
+    rejected = store.ids_with_stage(STAGE_DEDUP, "duplicate", list_date=date_str)
+    rejected |= store.ids_with_stage(STAGE_DEDUP, "near_duplicate", list_date=date_str)
+    kept = [aid for aid in arxiv_ids if aid not in rejected]
+    if len(kept) != len(arxiv_ids):
+        logger.info("Skip %d id(s) marked duplicate / near_duplicate by dedup", len(arxiv_ids) - len(kept))
+    return kept
+
+
 def download_pdf(session, arxiv_id, out_path, logger):
     url = f"https://arxiv.org/pdf/{arxiv_id}.pdf?download=1"
     logger.info("Download %s -> %s", arxiv_id, out_path)
@@ -313,12 +363,76 @@ def download_pdf(session, arxiv_id, out_path, logger):
     return True
 
 
-def run():
+def fetch_preview_pdf(
+    session: requests.Session,
+    arxiv_id: str,
+    out_path: str,
+    logger: logging.Logger,
+    pages: int = 2,
+    limiter: Optional[TokenBucket] = None,
+    max_requests: int = PDF_PREVIEW_MAX_REQUESTS,
+    timeout: int = 60,
+) -> DownloadResult:
+    """Write the first ``pages`` pages of an arXiv PDF to ``out_path`` using HTTP Range requests.
+
+    ``ok`` is False when the server ignores Range, the layout needs more than
+    ``max_requests`` requests, or the PDF cannot be read lazily; callers then
+    fall back to :func:`download_one_pdf`.
+    """
+    url = build_pdf_url(arxiv_id)
+    reader = None
+    try:
+        reader = HttpRangeReader(
+            url,
+            session=session,
+            headers={"Accept": "application/pdf", "Referer": "https://arxiv.org/"},
+            block_size=PDF_PREVIEW_BLOCK_KB * 1024,
+            max_retries=3,
+            timeout=timeout,
+            max_requests=max_requests,
+            on_request=limiter.acquire if limiter is not None else None,
+        )
+        # strict：不做逐对象的 xref 校验（会读遍整个文件）；不规范的 PDF 直接退回整篇下载
+        write_first_pages(io.BufferedReader(reader, buffer_size=64 * 1024), out_path, pages, strict=True)
+        with open(out_path, "rb") as f:
+            if not f.read(5).startswith(b"%PDF-"):
+                raise ValueError("preview is not a PDF")
+    except Exception as e:
+        reason = f"{type(e).__name__}: {e}" if not isinstance(e, RangeNotSupported) else str(e)
+        logger.info("Range preview failed for %s (%s), falling back to full download", arxiv_id, reason)
+        try:
+            os.remove(out_path)
+        except OSError:
+            pass
+        got = reader.bytes_fetched if reader is not None else 0
+        return DownloadResult(arxiv_id, False, reason, out_path, got, reader.size if reader is not None else 0)
+    return DownloadResult(arxiv_id, True, f"range x{reader.requests}", out_path, reader.bytes_fetched, reader.size)
+
+
+def run(argv=None, ids=None):
+    """Download the PDFs of one arxiv list; returns ``{"date", "path", "ids"}`` (ids that are on disk).
+
+    ``ids`` (in-process pipeline) is the work set already decided by the dedup
+    step; otherwise the ids are parsed from the list markdown and filtered by
+    the dedup stages in the store.
+    """
     logger = setup_logging()
     ap = argparse.ArgumentParser()
     ap.add_argument("--md", default=None)
     ap.add_argument("--limit", type=int, default=None)
-    args = ap.parse_args()
+    ap.add_argument("--workers", type=int, default=PDF_DOWNLOAD_WORKERS)
+    ap.add_argument("--rate", type=float, default=PDF_DOWNLOAD_RATE, help="max HTTP requests per second to arxiv.org (0 = unlimited)")
+    ap.add_argument("--burst", type=int, default=PDF_DOWNLOAD_BURST)
+    ap.add_argument("--warmup", choices=["each", "once", "none"], default=PDF_DOWNLOAD_WARMUP)
+    ap.add_argument(
+        "--mode",
+        choices=["preview", "full"],
+        default=PDF_DOWNLOAD_MODE,
+        help="preview: fetch only the first --pages pages via HTTP Range (full download as fallback)",
+    )
+    ap.add_argument("--pages", type=int, default=2, help="pages to keep in preview mode")
+    ap.add_argument("--keep-duplicates", action="store_true", help="also download ids the dedup step marked as (near-)duplicates")
+    args = ap.parse_args(argv)
 
     if args.md:
         md_path = args.md
@@ -335,69 +449,121 @@ def run():
     date_str, _ = os.path.splitext(base)
     print("============开始下载原始 PDF 列表==============", flush=True)
 
-    arxiv_ids = parse_arxiv_ids(md_path)
+    if ids is not None:
+        arxiv_ids = list(ids)
+    else:
+        arxiv_ids = parse_arxiv_ids(md_path)
+        if not args.keep_duplicates:
+            arxiv_ids = drop_duplicates(arxiv_ids, date_str, logger)
     if args.limit is not None:
         arxiv_ids = arxiv_ids[: args.limit]
 
     total = len(arxiv_ids)
     logger.info("Total ids to download: %d", total)
 
-    session = build_session()
+    workers = max(1, int(args.workers or 1))
+    session = build_session(pool_size=workers, rate_limited=True)
+    limiter = TokenBucket(args.rate, burst=args.burst)
+    if args.warmup == "once":
+        warmup_session(session, logger)
+    logger.info("workers=%d rate=%.2f/s burst=%d warmup=%s mode=%s", workers, args.rate, args.burst, args.warmup, args.mode)
 
     downloaded = 0
+    previews = 0
     skipped = 0
     invalid = 0
-
-    results: List[DownloadResult] = []
-    for i, aid in enumerate(arxiv_ids, 1):
+    ok_ids = []
+    range_bytes = [0, 0]  # 预览模式：实际取回字节数 / 对应整篇大小
+    bytes_lock = threading.Lock()
+
+    def preview_task(aid: str) -> str:
+        preview_path = os.path.join(PDF_PREVIEW_DIR, date_str, f"{aid}.pdf")
+        for path in (preview_path, os.path.join(PDF_OUTPUT_DIR, date_str, f"{aid}.pdf")):
+            if os.path.exists(path) and is_probably_pdf(path):
+                return "skipped"
+        res = fetch_preview_pdf(session, aid, preview_path, logger, pages=args.pages, limiter=limiter)
+        with bytes_lock:
+            range_bytes[0] += res.bytes_fetched
+            range_bytes[1] += res.full_size if res.ok else res.bytes_fetched
+        if res.ok:
+            return "preview"
+        return full_task(aid)
+
+    def full_task(aid: str) -> str:
         out_path = os.path.join(PDF_OUTPUT_DIR, date_str, f"{aid}.pdf")
         if os.path.exists(out_path):
             try:
                 with open(out_path, "rb") as f:
                     head = f.read(5)
-                if head.startswith(b"%PDF-"):
-                    skipped += 1
-                else:
-                    logger.warning("Existing file is not valid PDF, will re-download: %s", out_path)
-                    res = download_one_pdf(session, aid, out_path, logger, retries=5, timeout=60)
-                    results.append(res)
-                    if res.ok:
-                        downloaded += 1
-                    else:
-                        invalid += 1
             except Exception as e:
                 logger.error("Failed to inspect existing %s: %r", out_path, e)
+                return "invalid"
+            if head.startswith(b"%PDF-"):
+                return "skipped"
+            logger.warning("Existing file is not valid PDF, will re-download: %s", out_path)
+        try:
+            res = download_one_pdf(session, aid, out_path, logger, retries=5, timeout=60, limiter=limiter, warmup=args.warmup)
+        except Exception as e:
+            logger.error("Failed to download %s: %r", aid, e)
+            return "invalid"
+        return "downloaded" if res.ok else "invalid"
+
+    task = preview_task if args.mode == "preview" else full_task
+    store = get_store()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
+        future_map = {ex.submit(task, aid): aid for aid in arxiv_ids}
+        for i, fut in enumerate(concurrent.futures.as_completed(future_map), 1):
+            aid = future_map[fut]
+            status = fut.result()
+            if status == "downloaded":
+                downloaded += 1
+            elif status == "preview":
+                previews += 1
+            elif status == "skipped":
+                skipped += 1
+            else:
                 invalid += 1
-        else:
-            try:
-                res = download_one_pdf(session, aid, out_path, logger, retries=5, timeout=60)
-                results.append(res)
-                if res.ok:
-                    downloaded += 1
-                else:
-                    invalid += 1
-            except Exception as e:
-                logger.error("Failed to download %s: %r", aid, e)
-                invalid += 1
-        msg = f"Downloading:【{i}/{total}】"
-        if sys.stdout.isatty():
-            sys.stdout.write(msg + "\r")
-            sys.stdout.flush()
-        else:
-            print(msg, flush=True)
-
-        time.sleep(0.8)
+            if status != "invalid":
+                ok_ids.append(aid)
+            if status == "preview":
+                # 预览已直接写出，pdf_split 会跳过该篇
+                preview_path = os.path.join(PDF_PREVIEW_DIR, date_str, f"{aid}.pdf")
+                store.set_stage(aid, STAGE_DOWNLOAD, "ok", path=preview_path, list_date=date_str)
+                store.set_stage(aid, STAGE_SPLIT, "ok", path=preview_path, list_date=date_str)
+            else:
+                store.set_stage(
+                    aid,
+                    STAGE_DOWNLOAD,
+                    "failed" if status == "invalid" else "ok",
+                    path=os.path.join(PDF_OUTPUT_DIR, date_str, f"{aid}.pdf"),
+                    list_date=date_str,
+                )
+            msg = f"Downloading:【{i}/{total}】"
+            if sys.stdout.isatty():
+                sys.stdout.write(msg + "\r")
+                sys.stdout.flush()
+            else:
+                print(msg, flush=True)
     if sys.stdout.isatty():
         sys.stdout.write("\n")
         sys.stdout.flush()
     logger.info(
-        "Done. downloaded=%d, skipped(valid)=%d, invalid(non-pdf)=%d, total=%d",
+        "Done. downloaded=%d, preview(range)=%d, skipped(valid)=%d, invalid(non-pdf)=%d, total=%d",
         downloaded,
+        previews,
         skipped,
         invalid,
         total,
     )
+    if args.mode == "preview" and range_bytes[1]:
+        logger.info(
+            "Range previews fetched %.1f MB of %.1f MB (%.0f%%)",
+            range_bytes[0] / 1e6,
+            range_bytes[1] / 1e6,
+            100.0 * range_bytes[0] / range_bytes[1],
+        )
     print("============结束下载原始 PDF 列表==============", flush=True)
+    return {"date": date_str, "path": md_path, "ids": ok_ids}
 
 
 if __name__ == "__main__":
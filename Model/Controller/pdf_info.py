@@ -4,13 +4,13 @@ import json
 import os
 import re
 import sys
+import threading
 import time
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Tuple
 
-import requests
-
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from config.config import qwen_api_key as CFG_QWEN_KEY  # noqa: E402
 from config.config import org_base_url as CFG_BASE_URL  # noqa: E402
@@ -18,8 +18,24 @@ from config.config import org_model as CFG_MODEL  # noqa: E402
 from config.config import org_temperature as CFG_TEMPERATURE  # noqa: E402
 from config.config import org_max_tokens as CFG_MAX_TOKENS  # noqa: E402
 from config.config import pdf_info_system_prompt as CFG_INFO_PROMPT  # noqa: E402
+from config.config import pdf_info_batch_system_prompt as CFG_BATCH_PROMPT  # noqa: E402
+from config.config import pdf_info_abstract_system_prompt as CFG_ABSTRACT_PROMPT  # noqa: E402
+from config.config import pdf_info_abstract_batch_system_prompt as CFG_ABSTRACT_BATCH_PROMPT  # noqa: E402
 from config.config import DATA_ROOT  # noqa: E402
 from config.config import pdf_info_concurrency  # noqa: E402
+from config.config import pdf_info_max_concurrency, pdf_info_min_concurrency, pdf_info_retries  # noqa: E402
+from config.config import pdf_info_batch_size, pdf_info_batch_input_tokens, pdf_info_batch_output_tokens  # noqa: E402
+from config.config import AFFILIATION_SHORTCUT  # noqa: E402
+from Controller.paper_store import get_store, STAGE_INFO  # noqa: E402
+from Controller.llm_cache import cached_completion, make_key, open_llm_cache  # noqa: E402
+from Controller.llm_client import AIMDLimiter, LLMClient  # noqa: E402
+from Controller.affiliation import abstract_paragraph, get_matcher  # noqa: E402
+from Controller.md_reduce import get_reducer  # noqa: E402
+from Controller.token_budget import get_tokenizer  # noqa: E402
+
+ITEM_FIELDS = ("instution", "is_large", "abstract")
+# 名录已判定 is_large 的论文只向模型要这两个字段
+ABSTRACT_FIELDS = ("instution", "abstract")
 
 
 def ensure_dir(p: Path) -> Path:
@@ -52,8 +68,10 @@ def list_md_files(in_dir: Path) -> List[Path]:
     return sorted([p for p in in_dir.glob("*.md") if p.is_file()])
 
 
-def read_text_clip(path: Path, max_chars: int = 120000) -> str:
+def read_text_clip(path: Path, max_chars: int = 120000, reducer=None) -> str:
     t = path.read_text(encoding="utf-8", errors="ignore")
+    if reducer is not None:
+        t = reducer.reduce(t)
     if len(t) > max_chars:
         return t[:max_chars]
     return t
@@ -91,34 +109,17 @@ def parse_arxiv_list(md_path: Path) -> Dict[str, Dict[str, str]]:
     return meta
 
 
-def call_qwen(api_key: str, base_url: str, model: str, system_prompt: str, user_content: str, temperature: float, max_tokens: int) -> str:
-    url = base_url.rstrip("/") + "/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-    }
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_content},
-        ],
-        "temperature": float(temperature) if temperature is not None else 1.0,
-        "max_tokens": int(max_tokens) if max_tokens is not None else 1024,
-        "stream": False,
-    }
-    r = requests.post(url, headers=headers, json=payload, timeout=(20, 120))
-    r.raise_for_status()
-    data = r.json()
-    if not isinstance(data, dict):
-        return "{}"
-    choices = data.get("choices") or []
-    if not choices:
-        return "{}"
-    msg = choices[0].get("message") or {}
-    content = msg.get("content") or ""
-    return content or "{}"
+def meta_from_store(store, arxiv_ids: List[str]) -> Dict[str, Dict[str, str]]:
+    meta: Dict[str, Dict[str, str]] = {}
+    for aid, row in store.get_papers(arxiv_ids).items():
+        if not row.get("title"):
+            continue
+        meta[aid] = {
+            "title": row.get("title") or "",
+            "published": row.get("published") or "",
+            "source": f"arxiv, {aid}",
+        }
+    return meta
 
 
 def parse_json_or_fallback(text: str) -> Dict[str, Any]:
@@ -135,20 +136,143 @@ def parse_json_or_fallback(text: str) -> Dict[str, Any]:
     }
 
 
-def run(args: argparse.Namespace) -> None:
+def item_arxiv_id(item: Dict[str, Any]) -> str:
+    m = re.search(r"arxiv,\s*([0-9]+\.[0-9]+)", str(item.get("source") or ""))
+    return m.group(1) if m else ""
+
+
+def load_checkpoint(out_path: Path, log_path: Path) -> Dict[str, Dict[str, Any]]:
+    """Items already done for the day: the compacted JSON plus any checkpoint log lines after it."""
+    done: Dict[str, Dict[str, Any]] = {}
+    if out_path.exists():
+        try:
+            obj = json.loads(out_path.read_text(encoding="utf-8", errors="ignore"))
+        except Exception:
+            obj = []
+        if isinstance(obj, list):
+            for it in obj:
+                if isinstance(it, dict) and item_arxiv_id(it):
+                    done[item_arxiv_id(it)] = it
+    if log_path.exists():
+        with log_path.open("r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                try:
+                    it = json.loads(line)
+                except ValueError:
+                    continue  # 崩溃时写了一半的最后一行
+                if isinstance(it, dict) and item_arxiv_id(it):
+                    done[item_arxiv_id(it)] = it
+    return done
+
+
+def append_checkpoint(log_f, item: Dict[str, Any]) -> None:
+    log_f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    log_f.flush()
+    os.fsync(log_f.fileno())
+
+
+def compact_checkpoint(out_path: Path, log_path: Path, done: Dict[str, Dict[str, Any]]) -> None:
+    """Write all items to ``out_path`` once (atomically) and drop the checkpoint log."""
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    tmp.write_text(json.dumps(list(done.values()), ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, out_path)
+    try:
+        log_path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def single_user_content(p: Path, content: str) -> str:
+    return f"文件名：{p.name}\n文本：\n{content}"
+
+
+def abstract_user_content(institution: str, abstract: str) -> str:
+    return f"机构：{institution}\n摘要：{abstract}"
+
+
+def batch_user_content(entries: List[Dict[str, Any]]) -> str:
+    parts = [f"以下共 {len(entries)} 篇论文。"]
+    for e in entries:
+        parts.append(f"=== arxiv_id: {e['arxiv_id']} ===\n{e['content']}")
+    return "\n\n".join(parts)
+
+
+def _norm_id(value: Any) -> str:
+    m = re.search(r"\d{4}\.\d{4,5}", str(value or ""))
+    return m.group(0) if m else ""
+
+
+def parse_batch_reply(text: str, ids: List[str], fields: Tuple[str, ...] = ITEM_FIELDS) -> Dict[str, Dict[str, Any]]:
+    """Per-arxiv_id result objects from a batched reply.
+
+    A JSON array (also inside a code fence or an object) is used as is;
+    otherwise every ``{...}`` that decodes is salvaged, e.g. from a truncated
+    array. Elements with an unknown arxiv_id or missing fields are dropped so
+    that those papers fall back to single requests.
+    """
+    wanted = {_norm_id(i): i for i in ids}
+    t = (text or "").strip()
+    try:
+        obj = json.loads(t[t.find("[") : t.rfind("]") + 1]) if "[" in t else json.loads(t)
+    except Exception:
+        obj = None
+    if isinstance(obj, dict):
+        obj = next((v for v in obj.values() if isinstance(v, list)), [obj])
+    if isinstance(obj, list):
+        objs = obj
+    else:
+        objs = []
+        dec = json.JSONDecoder()
+        i = t.find("{")
+        while i != -1:
+            try:
+                o, end = dec.raw_decode(t, i)
+            except ValueError:
+                i = t.find("{", i + 1)
+                continue
+            objs.append(o)
+            i = t.find("{", end)
+    out: Dict[str, Dict[str, Any]] = {}
+    for o in objs:
+        if not isinstance(o, dict):
+            continue
+        aid = wanted.get(_norm_id(o.get("arxiv_id")))
+        if aid and aid not in out and all(k in o for k in fields):
+            out[aid] = {k: o[k] for k in fields}
+    return out
+
+
+def is_json_object(text: str) -> bool:
+    try:
+        obj = json.loads(text)
+    except Exception:
+        return False
+    return isinstance(obj, dict) and bool(obj)
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
     list_root = Path(args.arxiv_list_root)
-    _, date_dir = find_latest_date_dir(list_root)
+    date_dir = args.date or find_latest_date_dir(list_root)[1]
     list_file = list_root / f"{date_dir}.md"
-    if not list_file.exists():
-        raise SystemExit(f"missing arxiv list file: {list_file}")
-    meta_map = parse_arxiv_list(list_file)
     preview_dir = Path(args.in_md_root) / date_dir
     out_root = ensure_dir(Path(args.outdir))
     md_files = list_md_files(preview_dir)
+    ids = getattr(args, "ids", None)
+    if ids is not None:
+        wanted = set(ids)
+        md_files = [p for p in md_files if p.stem in wanted]
+    store = get_store()
+    meta_map = meta_from_store(store, [p.stem for p in md_files])
+    if len(meta_map) < len(md_files):
+        if not list_file.exists():
+            raise SystemExit(f"missing arxiv list file: {list_file}")
+        for aid, meta in parse_arxiv_list(list_file).items():
+            meta_map.setdefault(aid, meta)
+    out_path = out_root / f"{date_dir}.json"
     if not md_files:
         print(f"no md files in {preview_dir}, skip pdf_info", flush=True)
         print("[process] 0/0")
-        return
+        return {"date": date_dir, "path": str(out_path), "ids": []}
     print("============开始调用大模型做机构识别==============", flush=True)
     system_prompt = (CFG_INFO_PROMPT or "").strip()
     api_key = (CFG_QWEN_KEY or "").strip()
@@ -156,32 +280,12 @@ def run(args: argparse.Namespace) -> None:
     model = (CFG_MODEL or "qwen-plus").strip()
     temperature = CFG_TEMPERATURE if CFG_TEMPERATURE is not None else 1.0
     max_tokens = CFG_MAX_TOKENS if CFG_MAX_TOKENS is not None else 1024
-    out_path = out_root / f"{date_dir}.json"
-    agg: List[Dict[str, Any]] = []
-    if out_path.exists():
-        try:
-            agg_text = out_path.read_text(encoding="utf-8", errors="ignore")
-            obj = json.loads(agg_text)
-            if isinstance(obj, list):
-                agg = obj
-        except Exception:
-            agg = []
-    existing_ids: set[str] = set()
-    if agg:
-        for it in agg:
-            src = str(it.get("source") or "")
-            m = re.search(r"arxiv,\s*([0-9]+\.[0-9]+)", src)
-            if m:
-                existing_ids.add(m.group(1))
-    if agg:
-        dedup: Dict[str, Dict[str, Any]] = {}
-        for it in agg:
-            src = str(it.get("source") or "")
-            m = re.search(r"arxiv,\s*([0-9]+\.[0-9]+)", src)
-            if m:
-                dedup[m.group(1)] = it
-        agg = list(dedup.values())
-        out_path.write_text(json.dumps(agg, ensure_ascii=False, indent=2), encoding="utf-8")
+    log_path = out_root / f"{date_dir}.jsonl"
+    done_map = load_checkpoint(out_path, log_path)
+    if log_path.exists():
+        # 上次运行中断：先把检查点日志合并进 <date>.json
+        compact_checkpoint(out_path, log_path, done_map)
+    existing_ids = set(done_map)
     remaining_files = [p for p in md_files if p.stem not in existing_ids]
     if args.limit and args.limit > 0:
         remaining_files = remaining_files[: args.limit]
@@ -190,68 +294,248 @@ def run(args: argparse.Namespace) -> None:
     errors = 0
     if total == 0:
         print(f"[process] 0/0")
-        return
+        return {"date": date_dir, "path": str(out_path), "ids": [p.stem for p in md_files if p.stem in done_map]}
 
-    workers = max(1, int(getattr(args, "concurrency", 1) or 1))
-    print(f"[process] total={total} concurrency={workers}", flush=True)
-    start = time.monotonic()
+    initial = max(1, int(getattr(args, "concurrency", 1) or 1))
+    max_conc = max(initial, int(getattr(args, "max_concurrency", initial) or initial))
+    limiter = AIMDLimiter(initial, min_limit=pdf_info_min_concurrency, max_limit=max_conc)
+    client = LLMClient(base_url, api_key, limiter, retries=pdf_info_retries)
+    # 线程数取并发上限，实际在途请求数由 limiter 控制
+    workers = max_conc
+    cache = open_llm_cache(disabled=getattr(args, "no_llm_cache", False))
+    reducer = get_reducer("pdf_info", disabled=getattr(args, "no_reduce", False))
+    print(f"[process] total={total} concurrency={initial}..{max_conc}", flush=True)
+    batch_max = max(1, int(getattr(args, "batch_size", 1) or 1))
+    tok = get_tokenizer("auto") if batch_max > 1 else None
+    batch_prompt = (CFG_BATCH_PROMPT or "").strip()
+    # kind -> (逐篇提示词, 批量提示词, 批量回复必需字段)
+    prompts = {
+        "full": (system_prompt, batch_prompt, ITEM_FIELDS),
+        "abstract": ((CFG_ABSTRACT_PROMPT or "").strip(), (CFG_ABSTRACT_BATCH_PROMPT or "").strip(), ABSTRACT_FIELDS),
+    }
+    matcher = get_matcher(disabled=getattr(args, "no_gazetteer", False))
+    stats = {"requests": 0, "batched": 0, "fallback": 0, "cached": 0, "large": 0, "small": 0, "ambiguous": 0}
+    stats_lock = threading.Lock()
+
+    def bump(key: str, n: int = 1) -> None:
+        with stats_lock:
+            stats[key] += n
+
+    def make_item(arxiv_id: str, obj_small: Dict[str, Any]) -> Dict[str, Any]:
+        meta = meta_map.get(arxiv_id, {"title": "", "source": f"arxiv, {arxiv_id}", "published": ""})
+        return {
+            "title": meta.get("title", ""),
+            "source": meta.get("source", ""),
+            "published": meta.get("published", ""),
+            "instution": obj_small.get("instution", ""),
+            "is_large": bool(obj_small.get("is_large", False)),
+            "abstract": obj_small.get("abstract", ""),
+        }
+
+    def finish(entry: Dict[str, Any], obj: Dict[str, Any]) -> Dict[str, Any]:
+        item = make_item(entry["arxiv_id"], obj)
+        decision = entry.get("decision")
+        if decision is not None:
+            # is_large 以名录为准；instution / abstract 取模型输出（中文机构名、一句话摘要）
+            item["is_large"] = decision.verdict == "large"
+            item["instution"] = item["instution"] or decision.institution
+            item["decided_by"] = "gazetteer"
+        return item
 
-    def task(p: Path) -> Tuple[str, Dict[str, Any] | None, str]:
-        arxiv_id = p.stem
+    def single(entry: Dict[str, Any]) -> Tuple[str, Dict[str, Any] | None, str]:
+        arxiv_id = entry["arxiv_id"]
+        prompt = prompts[entry["kind"]][0]
         try:
-            content = read_text_clip(p, max_chars=args.max_chars)
-            user_content = f"文件名：{p.name}\n文本：\n{content}"
-            out_text = call_qwen(api_key, base_url, model, system_prompt, user_content, temperature, max_tokens)
-            obj_small = parse_json_or_fallback(out_text)
-            meta = meta_map.get(arxiv_id, {"title": "", "source": f"arxiv, {arxiv_id}", "published": ""})
-            item = {
-                "title": meta.get("title", ""),
-                "source": meta.get("source", ""),
-                "published": meta.get("published", ""),
-                "instution": obj_small.get("instution", ""),
-                "is_large": bool(obj_small.get("is_large", False)),
-                "abstract": obj_small.get("abstract", ""),
-            }
-            return arxiv_id, item, ""
+            user_content = entry["user_content"]
+
+            def call() -> str:
+                bump("requests")
+                return client.chat(model, prompt, user_content, temperature, max_tokens)
+
+            out_text = cached_completion(
+                cache,
+                model,
+                prompt,
+                user_content,
+                temperature,
+                max_tokens,
+                call,
+                cacheable=is_json_object,
+            )
+            return arxiv_id, finish(entry, parse_json_or_fallback(out_text)), ""
         except Exception as e:
             return arxiv_id, None, repr(e)
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
-        futures = [ex.submit(task, p) for p in remaining_files]
-        for fut in concurrent.futures.as_completed(futures):
-            try:
-                arxiv_id, item, err = fut.result()
-            except Exception as e:
+    def batched(
+        group: List[Dict[str, Any]],
+    ) -> Tuple[List[Tuple[str, Dict[str, Any] | None, str]], bool, List[Dict[str, Any]]]:
+        """Results for ``group``, whether the batched reply covered every paper, and the entries to retry alone."""
+        if len(group) == 1:
+            return [single(group[0])], True, []
+        ids = [e["arxiv_id"] for e in group]
+        prompt, group_prompt, fields = prompts[group[0]["kind"]]
+        batch_tokens = max(int(max_tokens), len(group) * int(pdf_info_batch_output_tokens))
+        try:
+            bump("requests")
+            reply = client.chat(model, group_prompt, batch_user_content(group), temperature, batch_tokens)
+            parsed = parse_batch_reply(reply, ids, fields)
+        except Exception:
+            parsed = {}
+        results = []
+        retry = []
+        for e in group:
+            obj = parsed.get(e["arxiv_id"])
+            if obj is None:
+                # 批量回复中缺失或格式不对的论文放回队列逐篇重试，经由线程池与并发限制器，而不是在本线程里串行调用
+                bump("fallback")
+                retry.append({**e, "solo": True})
+                continue
+            bump("batched")
+            if cache is not None:
+                # 按逐篇请求的 key 写缓存，之后逐篇 / 批量重跑都能命中
+                cache.put(make_key(model, prompt, e["user_content"], temperature, max_tokens), model, json.dumps(obj, ensure_ascii=False))
+            results.append((e["arxiv_id"], finish(e, obj), ""))
+        return results, len(parsed) == len(group), retry
+
+    entries: List[Dict[str, Any]] = []
+    cached_results: List[Tuple[str, Dict[str, Any] | None, str]] = []
+    for p in remaining_files:
+        try:
+            content = read_text_clip(p, max_chars=args.max_chars, reducer=reducer)
+        except Exception as e:
+            cached_results.append((p.stem, None, repr(e)))
+            continue
+        entry = {"arxiv_id": p.stem, "kind": "full", "content": content, "user_content": single_user_content(p, content)}
+        if matcher is not None:
+            # 名录能明确判定的论文只发送机构名 + 摘要段落；找不到摘要段落时仍按原文交给模型
+            decision = matcher.classify(content)
+            bump(decision.verdict)
+            abstract = abstract_paragraph(content) if decision.verdict in AFFILIATION_SHORTCUT else ""
+            if abstract:
+                entry.update(kind="abstract", content=abstract, decision=decision)
+                entry["user_content"] = abstract_user_content(decision.institution, abstract)
+        if cache is not None and batch_max > 1:
+            hit = cache.get(make_key(model, prompts[entry["kind"]][0], entry["user_content"], temperature, max_tokens))
+            if hit is not None:
+                bump("cached")
+                cached_results.append((p.stem, finish(entry, parse_json_or_fallback(hit)), ""))
+                continue
+        if tok is not None:
+            entry["tokens"] = tok.count(entry["content"])
+        entries.append(entry)
+
+    # 两种提示词不能混在同一批请求里：按 kind 排队，next_group 遇到 kind 变化即截断
+    pending = deque(sorted(entries, key=lambda e: e["kind"] != "full"))
+    k = batch_max
+
+    def next_group() -> List[Dict[str, Any]]:
+        group = [pending.popleft()]
+        if group[0].get("solo"):
+            return group
+        used = group[0].get("tokens", 0)
+        while (
+            pending
+            and len(group) < k
+            and not pending[0].get("solo")
+            and pending[0]["kind"] == group[0]["kind"]
+            and used + pending[0].get("tokens", 0) <= pdf_info_batch_input_tokens
+        ):
+            used += pending[0].get("tokens", 0)
+            group.append(pending.popleft())
+        return group
+
+    start = time.monotonic()
+    log_f = log_path.open("a", encoding="utf-8")
+    with log_f, concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
+        in_flight: Dict[concurrent.futures.Future, List[Dict[str, Any]]] = {}
+        ready = list(cached_results)
+        while ready or pending or in_flight:
+            while pending and len(in_flight) < workers:
+                group = next_group()
+                in_flight[ex.submit(batched, group)] = group
+            for arxiv_id, item, err in ready:
                 processed += 1
-                errors += 1
+                if item is None:
+                    errors += 1
+                    store.set_stage(arxiv_id, STAGE_INFO, "failed", list_date=date_dir)
+                else:
+                    append_checkpoint(log_f, item)
+                    done_map[arxiv_id] = item
+                    store.upsert_papers(
+                        [
+                            {
+                                "arxiv_id": arxiv_id,
+                                "instution": item["instution"],
+                                "is_large": item["is_large"],
+                                "info_abstract": item["abstract"],
+                            }
+                        ]
+                    )
+                    store.set_stage(arxiv_id, STAGE_INFO, "ok", path=str(out_path), list_date=date_dir)
                 elapsed = time.monotonic() - start
                 rate = processed / elapsed if elapsed > 0 else 0.0
-                print(f"\r[process] {processed}/{total} err={errors} rate={rate:.2f}/s", end="", flush=True)
+                print(
+                    f"\r[process] {processed}/{total} err={errors} rate={rate:.2f}/s conc={int(limiter.limit)} k={k}",
+                    end="",
+                    flush=True,
+                )
+            ready = []
+            if not in_flight:
                 continue
-
-            processed += 1
-            if item is None:
-                errors += 1
-            else:
-                agg.append(item)
-                out_path.write_text(json.dumps(agg, ensure_ascii=False, indent=2), encoding="utf-8")
-            elapsed = time.monotonic() - start
-            rate = processed / elapsed if elapsed > 0 else 0.0
-            print(f"\r[process] {processed}/{total} err={errors} rate={rate:.2f}/s", end="", flush=True)
+            finished, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for fut in finished:
+                group = in_flight.pop(fut)
+                try:
+                    results, complete, retry = fut.result()
+                except Exception as e:
+                    results, complete, retry = [(e_["arxiv_id"], None, repr(e)) for e_ in group], False, []
+                if len(group) > 1:
+                    # 批大小自适应：回复完整则 +1，缺失 / 格式错误则减半
+                    k = min(batch_max, k + 1) if complete else max(1, k // 2)
+                ready.extend(results)
+                pending.extendleft(reversed(retry))
     print()
+    compact_checkpoint(out_path, log_path, done_map)
+    print(f"[LLM] {limiter.summary()} retried={client.retried}", flush=True)
+    if batch_max > 1:
+        print(
+            f"[BATCH] requests={stats['requests']} batched={stats['batched']} fallback={stats['fallback']} "
+            f"cached={stats['cached']} k={k}/{batch_max}",
+            flush=True,
+        )
+    if matcher is not None:
+        print(
+            f"[GAZETTEER] large={stats['large']} small={stats['small']} ambiguous={stats['ambiguous']} "
+            f"local={','.join(AFFILIATION_SHORTCUT)}",
+            flush=True,
+        )
+    if reducer is not None:
+        print(f"[MD-REDUCE] {reducer.summary()}", flush=True)
+    if cache is not None:
+        print(f"[LLM-CACHE] {cache.summary()}", flush=True)
+        cache.close()
     print("============结束机构识别与信息写入==============", flush=True)
+    return {"date": date_dir, "path": str(out_path), "ids": [p.stem for p in md_files if p.stem in done_map]}
 
 
-def main() -> None:
+def main(argv: List[str] | None = None, ids: List[str] | None = None) -> Dict[str, Any]:
+    """CLI entry; ``ids`` (in-process pipeline) limits the run to these previews."""
     ap = argparse.ArgumentParser("pdf_info")
     ap.add_argument("--in-md-root", default=str(Path(DATA_ROOT) / "preview_pdf_to_mineru"))
     ap.add_argument("--outdir", default=str(Path(DATA_ROOT) / "pdf_info"))
     ap.add_argument("--arxiv-list-root", default=str(Path(DATA_ROOT) / "arxivList"))
+    ap.add_argument("--date", default="", help="list date (default: latest in --arxiv-list-root)")
     ap.add_argument("--limit", type=int, default=None)
-    ap.add_argument("--concurrency", type=int, default=pdf_info_concurrency)
+    ap.add_argument("--concurrency", type=int, default=pdf_info_concurrency, help="initial in-flight requests")
+    ap.add_argument("--max-concurrency", type=int, default=pdf_info_max_concurrency)
     ap.add_argument("--max-chars", type=int, default=120000)
-    args = ap.parse_args()
-    run(args)
+    ap.add_argument("--no-llm-cache", action="store_true", help="always call the model, bypassing the response cache")
+    ap.add_argument("--batch-size", type=int, default=pdf_info_batch_size, help="max papers per request (1 = one request per paper)")
+    ap.add_argument("--no-gazetteer", action="store_true", help="send every paper to the model, skipping the local institution list")
+    ap.add_argument("--no-reduce", action="store_true", help="send the MinerU markdown without md_reduce preprocessing")
+    args = ap.parse_args(argv)
+    args.ids = ids
+    return run(args)
 
 
 if __name__ == "__main__":
@@ -1,14 +1,18 @@
 import argparse
 import logging
+import mmap
 import os
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-from pypdf import PdfReader, PdfWriter
+from pypdf import PageObject, PdfReader, PdfWriter
+from pypdf.generic import NameObject
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from config.config import OUTPUT_DIR, FILENAME_FMT, PDF_OUTPUT_DIR, PDF_PREVIEW_DIR, USER_AGENT  # noqa: E402
+from config.config import OUTPUT_DIR, FILENAME_FMT, PDF_OUTPUT_DIR, PDF_PREVIEW_DIR, PDF_SPLIT_WORKERS, USER_AGENT  # noqa: E402
+from Controller.paper_store import get_store, STAGE_DOWNLOAD, STAGE_SPLIT  # noqa: E402
 
 
 def setup_logging():
@@ -43,12 +47,92 @@ def parse_arxiv_ids(md_path):
     return ids
 
 
-def split_pdf(in_path, out_path, pages, logger):
+# 页面树上可继承到叶子页面的属性（PDF 1.7, 7.7.3.4）
+INHERITABLE_PAGE_KEYS = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+
+def first_page_refs(reader, n, max_depth=64):
+    """(indirect ref, inherited attrs) of the first ``n`` leaf pages, walking /Kids lazily."""
+    out = []
+
+    def walk(ref, inherited, depth):
+        if depth > max_depth:
+            raise ValueError("page tree too deep")
+        node = ref.get_object()
+        inh = dict(inherited)
+        for k in INHERITABLE_PAGE_KEYS:
+            if k in node:
+                inh[k] = node.raw_get(k)
+        if node.get("/Type") == "/Page" or "/Kids" not in node:
+            out.append((ref, inh))
+            return
+        for kid in node["/Kids"]:
+            if len(out) >= n:
+                return
+            kid_obj = kid.get_object()
+            if "/Kids" in kid_obj and int(kid_obj.get("/Count", 1)) <= 0:
+                continue
+            walk(kid, inh, depth + 1)
+
+    pages_ref = reader.trailer["/Root"].get_object().raw_get("/Pages")
+    walk(pages_ref, {}, 0)
+    return out[:n]
+
+
+def write_first_pages(stream, out_path, pages, strict=False):
+    """Write the first ``pages`` pages of the PDF in ``stream`` to ``out_path``.
+
+    Only objects reachable from the selected page dicts are resolved, so a
+    memory-mapped file or an :class:`~Controller.http_range.HttpRangeReader`
+    is read only where those objects live. Annotations are not copied (links
+    would pull in the pages they point to). ``strict`` skips pypdf's repair
+    pass, which visits every object in the xref table.
+    """
+    reader = PdfReader(stream, strict=strict)
+    if reader.is_encrypted:
+        raise ValueError("encrypted PDF")
+    writer = PdfWriter()
+    for ref, inherited in first_page_refs(reader, pages):
+        page = PageObject(reader, ref)
+        page.update(ref.get_object())
+        for k, v in inherited.items():
+            if k not in page:
+                page[NameObject(k)] = v
+        page[NameObject("/Type")] = NameObject("/Page")
+        writer.add_page(page, excluded_keys=("/Annots", "/B"))
+    if len(writer.pages) == 0:
+        raise ValueError("no pages found")
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    tmp = out_path + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            writer.write(f)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    os.replace(tmp, out_path)
+
+
+def extract_first_pages(in_path, out_path, pages):
+    """Copy the first ``pages`` pages without reading the whole file or flattening the page tree.
+
+    The source is memory-mapped. Raises on anything unexpected; callers fall
+    back to :func:`split_pdf`'s full-reader path.
+    """
+    with open(in_path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        write_first_pages(mm, out_path, pages)
+
+
+def split_pdf(in_path, out_path, pages, logger, lazy=True):
+    if os.path.exists(out_path):
+        # 已存在（含 pdf_download --mode preview 直接取回的预览）
+        return False
     if not os.path.exists(in_path):
         logger.warning("Source PDF not found, skip: %s", in_path)
         return False
-    if os.path.exists(out_path):
-        return False
     try:
         with open(in_path, "rb") as f:
             head = f.read(5)
@@ -58,6 +142,12 @@ def split_pdf(in_path, out_path, pages, logger):
     except Exception as e:
         logger.error("Failed to inspect %s: %r", in_path, e)
         return False
+    if lazy:
+        try:
+            extract_first_pages(in_path, out_path, pages)
+            return True
+        except Exception as e:
+            logger.info("Lazy preview failed for %s (%r), using full reader", os.path.basename(in_path), e)
     reader = PdfReader(in_path)
     writer = PdfWriter()
     count = min(pages, len(reader.pages))
@@ -69,13 +159,43 @@ def split_pdf(in_path, out_path, pages, logger):
     return True
 
 
-def run():
+def split_one(job):
+    """Process-pool entry: ``job`` is (aid, src, dst, pages, lazy); returns (aid, dst, created, error)."""
+    aid, src, dst, pages, lazy = job
+    logger = logging.getLogger("pdf_split")
+    if not logger.handlers:
+        setup_logging()
+    try:
+        return aid, dst, split_pdf(src, dst, pages, logger, lazy=lazy), ""
+    except Exception as e:
+        return aid, dst, False, repr(e)
+
+
+def iter_split_results(jobs, workers):
+    """Yield split_one results; ``workers`` <= 1 splits in this process."""
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield split_one(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        futures = [ex.submit(split_one, job) for job in jobs]
+        for fut in as_completed(futures):
+            yield fut.result()
+
+
+def run(argv=None, ids=None):
+    """Cut the downloaded PDFs to preview PDFs; returns ``{"date", "path", "ids"}`` (ids with a preview).
+
+    ``ids`` (in-process pipeline) are the papers pdf_download just finished.
+    """
     logger = setup_logging()
     ap = argparse.ArgumentParser()
     ap.add_argument("--md", default=None)
     ap.add_argument("--limit", type=int, default=None)
     ap.add_argument("--pages", type=int, default=2)
-    args = ap.parse_args()
+    ap.add_argument("--workers", type=int, default=PDF_SPLIT_WORKERS, help="split processes; 1 = in-process")
+    ap.add_argument("--no-lazy", action="store_true", help="always load the whole PDF with PdfReader")
+    args = ap.parse_args(argv)
 
     if args.md:
         md_path = args.md
@@ -94,7 +214,16 @@ def run():
     date_str, _ = os.path.splitext(base)
     print("============开始切分预览 PDF==============", flush=True)
 
-    arxiv_ids = parse_arxiv_ids(md_path)
+    store = get_store()
+    # 未显式指定 --md 时，工作集取自元数据库（已下载、未切分）；库中没有该日期的下载记录时才解析列表 md
+    pending = None if args.md or ids is not None else store.pending_paths(STAGE_SPLIT, after=STAGE_DOWNLOAD, list_date=date_str)
+    if ids is not None:
+        arxiv_ids = list(ids)
+    elif pending is not None:
+        arxiv_ids = [aid for aid, _ in pending]
+        logger.info("Work set from store: %d id(s) downloaded but not split", len(arxiv_ids))
+    else:
+        arxiv_ids = parse_arxiv_ids(md_path)
     if args.limit is not None:
         arxiv_ids = arxiv_ids[: args.limit]
 
@@ -103,18 +232,26 @@ def run():
 
     processed = 0
     skipped = 0
+    ok_ids = []
 
-    for i, aid in enumerate(arxiv_ids, 1):
-        src = os.path.join(PDF_OUTPUT_DIR, date_str, f"{aid}.pdf")
-        dst = os.path.join(PDF_PREVIEW_DIR, date_str, f"{aid}.pdf")
-        try:
-            created = split_pdf(src, dst, args.pages, logger)
+    jobs = [
+        (aid, os.path.join(PDF_OUTPUT_DIR, date_str, f"{aid}.pdf"), os.path.join(PDF_PREVIEW_DIR, date_str, f"{aid}.pdf"), args.pages, not args.no_lazy)
+        for aid in arxiv_ids
+    ]
+    workers = max(1, int(args.workers or 1))
+    logger.info("Split workers: %d", workers)
+    for i, (aid, dst, created, err) in enumerate(iter_split_results(jobs, workers), 1):
+        if err:
+            logger.error("Failed to split %s: %s", aid, err)
+            store.set_stage(aid, STAGE_SPLIT, "failed", list_date=date_str)
+        else:
             if created:
                 processed += 1
             else:
                 skipped += 1
-        except Exception as e:
-            logger.error("Failed to split %s: %r", aid, e)
+            if os.path.exists(dst):
+                ok_ids.append(aid)
+            store.set_stage(aid, STAGE_SPLIT, "ok" if os.path.exists(dst) else "failed", path=dst, list_date=date_str)
         msg = f"Splitting:【{i}/{total}】"
         if sys.stdout.isatty():
             sys.stdout.write(msg + "\r")
@@ -127,6 +264,7 @@ def run():
         sys.stdout.flush()
     logger.info("Done. created=%d, skipped=%d, total=%d", processed, skipped, total)
     print("============结束切分预览 PDF==============", flush=True)
+    return {"date": date_str, "path": os.path.join(PDF_PREVIEW_DIR, date_str), "ids": ok_ids}
 
 
 if __name__ == "__main__":
@@ -1,17 +1,25 @@
 import argparse
-import json
 import logging
 import os
 import sys
-import time
-import zipfile
 from pathlib import Path
-from typing import List
-
-import requests
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-from config.config import PDF_PREVIEW_DIR, minerU_Token  # noqa: E402
+from config.config import (  # noqa: E402
+    MINERU_BATCH_SIZE,
+    MINERU_DOWNLOAD_WORKERS,
+    MINERU_KEEP_ASSETS,
+    MINERU_MAX_INFLIGHT,
+    MINERU_UPLOAD_WORKERS,
+    PDF_PREVIEW_DIR,
+    PREVIEW_CONVERT_BACKEND,
+    PREVIEW_LOCAL_WORKERS,
+    minerU_Token,
+)
+from Controller.paper_store import get_store, STAGE_PREVIEW_MD, STAGE_SPLIT  # noqa: E402
+from Controller.mineru_cache import MinerUCache  # noqa: E402
+from Controller.mineru_client import BatchState, MinerUClient, ReadyResult  # noqa: E402
+from Controller.pdf_convert import BACKENDS, ConverterBackend, LocalTextBackend, MinerUBackend  # noqa: E402
 
 
 def setup_logging():
@@ -34,140 +42,39 @@ def ensure_dir(p: Path) -> Path:
     return p
 
 
-def pick_first_md(zip_path: Path) -> str:
-    with zipfile.ZipFile(zip_path, "r") as zf:
-        names = [n for n in zf.namelist() if n.lower().endswith(".md")]
-        if not names:
-            raise RuntimeError(f"no .md in zip: {zip_path}")
-        names.sort(key=lambda s: (s.count("/"), len(s)))
-        name = names[0]
-        raw = zf.read(name)
-    return raw.decode("utf-8", errors="replace")
-
-
-def pick_preferred_json(zip_path: Path):
-    with zipfile.ZipFile(zip_path, "r") as zf:
-        names = [n for n in zf.namelist() if n.lower().endswith(".json")]
-        if not names:
-            raise RuntimeError(f"no .json in zip: {zip_path}")
-        prefer = [n for n in names if n.lower().endswith("content_list.json")] or [n for n in names if n.lower().endswith("model.json")]
-        cand = prefer or names
-        cand.sort(key=lambda s: (s.count("/"), len(s)))
-        name = cand[0]
-        text = zf.read(name).decode("utf-8", errors="replace")
-    try:
-        return json.loads(text)
-    except Exception:
-        return text
-
-
-class MinerUClient:
-    def __init__(self, base_url: str, token: str) -> None:
-        self.base_url = base_url.rstrip("/")
-        self.session = requests.Session()
-        self.session.headers.update({"Authorization": f"Bearer {token}", "Content-Type": "application/json", "Accept": "*/*"})
-
-    def _post(self, path: str, payload: dict) -> dict:
-        url = f"{self.base_url}{path}"
-        r = self.session.post(url, json=payload, timeout=(20, 120))
-        r.raise_for_status()
-        data = r.json()
-        if data.get("code") != 0:
-            raise RuntimeError(f"MinerU API error: {data}")
-        return data
-
-    def _get(self, path: str) -> dict:
-        url = f"{self.base_url}{path}"
-        r = self.session.get(url, timeout=(20, 120))
-        r.raise_for_status()
-        data = r.json()
-        if data.get("code") != 0:
-            raise RuntimeError(f"MinerU API error: {data}")
-        return data
-
-    def apply_upload_urls(self, files: List[dict], model_version: str, extra: dict) -> dict:
-        payload = {"files": files, "model_version": model_version}
-        payload.update(extra or {})
-        return self._post("/api/v4/file-urls/batch", payload)
-
-    def get_batch_results(self, batch_id: str) -> dict:
-        return self._get(f"/api/v4/extract-results/batch/{batch_id}")
-
-
-def backoff_sleep(attempt: int, base: float = 1.0, cap: float = 10.0) -> None:
-    time.sleep(min(cap, base * (2 ** (attempt - 1))))
-
-
-def upload_to_presigned_url(file_path: Path, put_url: str, max_retries: int = 6) -> None:
-    last: Exception | None = None
-    for attempt in range(1, max_retries + 1):
-        try:
-            with file_path.open("rb") as f:
-                r = requests.put(put_url, data=f, timeout=(30, 900))
-            r.raise_for_status()
-            return
-        except Exception as e:
-            last = e
-            backoff_sleep(attempt)
-    raise RuntimeError(f"upload failed: {file_path.name}. last={last!r}")
-
-
-def wait_batch_done(client: MinerUClient, batch_id: str, expected_total: int, timeout_sec: int = 900, poll_sec: int = 3) -> List[dict]:
-    deadline = time.time() + timeout_sec
-    while time.time() < deadline:
-        last = client.get_batch_results(batch_id)
-        data = last.get("data") or {}
-        items = data.get("extract_result") or []
-        if not isinstance(items, list):
-            items = []
-        states: dict[str, int] = {}
-        done_or_failed = 0
-        for it in items:
-            st = str(it.get("state") or "unknown").lower()
-            states[st] = states.get(st, 0) + 1
-            if st in ("done", "failed"):
-                done_or_failed += 1
-        print(f"\r[parse] {done_or_failed}/{expected_total} {states}", end="", flush=True)
-        if expected_total > 0 and done_or_failed >= expected_total:
-            print()
-            return [it for it in items if isinstance(it, dict)]
-        time.sleep(poll_sec)
-    raise TimeoutError("batch not finished in time")
+def run(argv=None, ids=None):
+    """Convert the preview PDFs of one date to md; returns ``{"date", "path", "ids"}`` (ids with an md).
 
-
-def download_zip(zip_url: str, token: str, dest: Path, max_retries: int = 6) -> None:
-    last: Exception | None = None
-    headers = {"Authorization": f"Bearer {token}"}
-    for attempt in range(1, max_retries + 1):
-        try:
-            with requests.get(zip_url, headers=headers, stream=True, timeout=(30, 900)) as r:
-                r.raise_for_status()
-                with dest.open("wb") as f:
-                    for chunk in r.iter_content(chunk_size=1024 * 128):
-                        if chunk:
-                            f.write(chunk)
-            return
-        except Exception as e:
-            last = e
-            backoff_sleep(attempt)
-    raise RuntimeError(f"download zip failed. last={last!r}")
-
-
-def run():
+    ``ids`` (in-process pipeline) are the previews pdf_split just produced.
+    """
     logger = setup_logging()
     ap = argparse.ArgumentParser()
+    ap.add_argument("--backend", choices=BACKENDS, default=PREVIEW_CONVERT_BACKEND, help="local: pypdf text; mineru: remote MinerU")
+    ap.add_argument("--local-workers", type=int, default=PREVIEW_LOCAL_WORKERS, help="processes for the local backend")
     ap.add_argument("--limit", type=int, default=None)
     ap.add_argument("--date", default="")
     ap.add_argument("--outdir", default=os.path.join("data", "preview_pdf_to_mineru"))
     ap.add_argument("--base-url", default=os.environ.get("MINERU_BASE_URL", "https://mineru.net"))
     ap.add_argument("--model-version", default=os.environ.get("MINERU_MODEL_VERSION", "vlm"))
-    ap.add_argument("--timeout-sec", type=int, default=900)
+    ap.add_argument("--timeout-sec", type=int, default=900, help="deadline per MinerU batch")
     ap.add_argument("--poll-sec", type=int, default=3)
     ap.add_argument("--upload-retries", type=int, default=6)
-    args = ap.parse_args()
+    ap.add_argument("--upload-workers", type=int, default=MINERU_UPLOAD_WORKERS, help="parallel presigned PUT uploads")
+    ap.add_argument("--download-workers", type=int, default=MINERU_DOWNLOAD_WORKERS, help="parallel result zip downloads")
+    ap.add_argument("--batch-size", type=int, default=MINERU_BATCH_SIZE, help="files per MinerU batch")
+    ap.add_argument("--max-inflight", type=int, default=MINERU_MAX_INFLIGHT, help="MinerU batches processed concurrently")
+    ap.add_argument("--fresh", action="store_true", help="forget recorded batches and upload everything again")
+    ap.add_argument("--no-cache", action="store_true", help="bypass the content-addressed MinerU cache")
+    ap.add_argument(
+        "--keep-assets",
+        action="store_true",
+        default=MINERU_KEEP_ASSETS,
+        help="also save images/ and content_list.json to <outdir>/<date>/<arxiv_id>/",
+    )
+    args = ap.parse_args(argv)
 
     token = (minerU_Token or "").strip()
-    if not token:
+    if args.backend == "mineru" and not token:
         raise SystemExit("MinerU token missing in config.config.minerU_Token")
 
     root = Path(PDF_PREVIEW_DIR)
@@ -192,71 +99,80 @@ def run():
             in_dir = root
             date_str = today_str()
 
-    pdfs = sorted(in_dir.glob("*.pdf"))
+    store = get_store()
+    # 工作集：进程内流水线直接用上游传入的 ids；否则取自元数据库（已切分、未转 md），库中没有该日期的切分记录时才扫描预览目录
+    if ids is not None:
+        pdfs = [in_dir / f"{aid}.pdf" for aid in ids if (in_dir / f"{aid}.pdf").exists()]
+    else:
+        pdfs = store.pending_files(STAGE_PREVIEW_MD, after=STAGE_SPLIT, list_date=date_str, in_dir=in_dir, suffix=".pdf")
+    if pdfs is None:
+        pdfs = sorted(in_dir.glob("*.pdf"))
+        if not pdfs:
+            raise SystemExit(f"No preview PDFs found in {in_dir}")
+    elif ids is None:
+        logger.info("Work set from store: %d preview(s) split but not converted", len(pdfs))
     if args.limit is not None:
         pdfs = pdfs[: args.limit]
-    if not pdfs:
-        raise SystemExit(f"No preview PDFs found in {in_dir}")
 
-    print("============开始预览 PDF 的 MinerU 解析==============", flush=True)
+    print(f"============开始预览 PDF 的 md 转换（{args.backend}）==============", flush=True)
     out_root = ensure_dir(Path(args.outdir) / date_str)
-    tmp_zip_dir = ensure_dir(out_root / "_tmp_zip")
 
-    pdfs_to_upload = [p for p in pdfs if not (out_root / f"{p.stem}.md").exists()]
-    if not pdfs_to_upload:
-        logger.info("All previews already converted, skip upload and parse")
+    converted = [p for p in pdfs if (out_root / f"{p.stem}.md").exists()]
+    store.set_stages(
+        [p.stem for p in converted],
+        STAGE_PREVIEW_MD,
+        "ok",
+        paths={p.stem: str(out_root / f"{p.stem}.md") for p in converted},
+        list_date=date_str,
+    )
+    pdfs_to_convert = [p for p in pdfs if not (out_root / f"{p.stem}.md").exists()]
+    if not pdfs_to_convert:
+        logger.info("All previews already converted, skip")
         logger.info("Out dir: %s", str(out_root))
-        return
-
-    client = MinerUClient(args.base_url, token)
-    files_payload = [{"name": p.name, "data_id": p.stem} for p in pdfs_to_upload]
-    applied = client.apply_upload_urls(files_payload, model_version=args.model_version, extra={}).get("data") or {}
-    urls = applied.get("file_urls") or []
-    batch_id = applied.get("batch_id") or ""
-    if not batch_id or not urls or len(urls) != len(pdfs_to_upload):
-        raise SystemExit("Failed to apply upload URLs")
-
-    total = len(pdfs_to_upload)
-    done = 0
-    for i, p in enumerate(pdfs_to_upload):
-        upload_to_presigned_url(p, urls[i], max_retries=args.upload_retries)
-        done += 1
-        print(f"\r[upload] {done}/{total}", end="", flush=True)
-    print()
-    print("============上传完成，开始等待 MinerU 解析==============", flush=True)
-
-    results = wait_batch_done(client, batch_id, expected_total=total, timeout_sec=args.timeout_sec, poll_sec=args.poll_sec)
-    by_name = {str(it.get("file_name") or ""): it for it in results}
-    by_dataid = {str(it.get("data_id") or ""): it for it in results}
+        return {"date": date_str, "path": str(out_root), "ids": [p.stem for p in converted]}
 
+    backend: ConverterBackend
+    if args.backend == "local":
+        backend = LocalTextBackend(workers=args.local_workers)
+    else:
+        state = BatchState(out_root / "_mineru_batches.json")
+        if args.fresh:
+            state.clear()
+        backend = MinerUBackend(
+            MinerUClient(args.base_url, token),
+            token,
+            state,
+            args.model_version,
+            cache=None if args.no_cache else MinerUCache(args.model_version),
+            zip_dir=out_root / "_tmp_zip",
+            assets_root=out_root if args.keep_assets else None,
+            batch_size=args.batch_size,
+            max_inflight=args.max_inflight,
+            timeout_sec=args.timeout_sec,
+            poll_sec=args.poll_sec,
+            upload_workers=args.upload_workers,
+            download_workers=args.download_workers,
+            upload_retries=args.upload_retries,
+        )
+    total = len(pdfs_to_convert)
     wrote = 0
-    for p in pdfs_to_upload:
-        it = by_dataid.get(p.stem) or by_name.get(p.name)
-        if not it:
-            print(f"[skip] no result item for {p.name}")
-            continue
-        state = str(it.get("state") or "").lower()
-        if state != "done":
-            print(f"[skip] {p.name} state={state}")
-            continue
-        zip_url = it.get("full_zip_url")
-        if not zip_url:
-            print(f"[skip] {p.name} has no full_zip_url")
-            continue
-        zip_path = tmp_zip_dir / f"{p.stem}.zip"
-        download_zip(zip_url, token, zip_path)
-        md_text = pick_first_md(zip_path)
-        (out_root / f"{p.stem}.md").write_text(md_text, encoding="utf-8")
+
+    def on_result(res: ReadyResult) -> None:
+        nonlocal wrote
+        p = res.path
+        if res.error:
+            print(f"\n[skip] {p.name} state={res.state}: {res.error}")
+            store.set_stage(p.stem, STAGE_PREVIEW_MD, "failed", list_date=date_str)
+            return
+        (out_root / f"{p.stem}.md").write_text(res.md_text, encoding="utf-8")
+        store.set_stage(p.stem, STAGE_PREVIEW_MD, "ok", path=str(out_root / f"{p.stem}.md"), list_date=date_str)
         wrote += 1
-        print(f"\r[write] {wrote}/{total}", end="", flush=True)
-    print()
-    try:
-        tmp_zip_dir.rmdir()
-    except Exception:
-        pass
-    logger.info("Done. wrote=%d, total=%d", wrote, total)
+
+    backend.convert(pdfs_to_convert, on_result)
+    logger.info("Done. wrote=%d, total=%d %s", wrote, total, backend.summary())
     logger.info("Out dir: %s", str(out_root))
-    print("============结束预览 PDF 的 MinerU 解析==============", flush=True)
+    print(f"============结束预览 PDF 的 md 转换（{args.backend}）==============", flush=True)
+    return {"date": date_str, "path": str(out_root), "ids": [p.stem for p in pdfs if (out_root / f"{p.stem}.md").exists()]}
 
 
 if __name__ == "__main__":
@@ -3,15 +3,22 @@ import logging
 import os
 import re
 import sys
-import time
-import zipfile
 from pathlib import Path
 from typing import List
 
-import requests
-
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-from config.config import minerU_Token  # noqa: E402
+from config.config import (  # noqa: E402
+    MINERU_BATCH_SIZE,
+    MINERU_DOWNLOAD_WORKERS,
+    MINERU_KEEP_ASSETS,
+    MINERU_MAX_INFLIGHT,
+    MINERU_UPLOAD_WORKERS,
+    minerU_Token,
+)
+from Controller.paper_store import get_store, STAGE_FULL_MD, STAGE_SELECT  # noqa: E402
+from Controller.mineru_cache import MinerUCache  # noqa: E402
+from Controller.mineru_client import BatchState, MinerUClient, ReadyResult  # noqa: E402
+from Controller.pdf_convert import MinerUBackend  # noqa: E402
 
 
 def setup_logging():
@@ -29,109 +36,6 @@ def ensure_dir(p: Path) -> Path:
     return p
 
 
-def pick_first_md(zip_path: Path) -> str:
-    with zipfile.ZipFile(zip_path, "r") as zf:
-        names = [n for n in zf.namelist() if n.lower().endswith(".md")]
-        if not names:
-            raise RuntimeError(f"no .md in zip: {zip_path}")
-        names.sort(key=lambda s: (s.count("/"), len(s)))
-        name = names[0]
-        raw = zf.read(name)
-    return raw.decode("utf-8", errors="replace")
-
-
-class MinerUClient:
-    def __init__(self, base_url: str, token: str) -> None:
-        self.base_url = base_url.rstrip("/")
-        self.session = requests.Session()
-        self.session.headers.update({"Authorization": f"Bearer {token}", "Content-Type": "application/json", "Accept": "*/*"})
-
-    def _post(self, path: str, payload: dict) -> dict:
-        url = f"{self.base_url}{path}"
-        r = self.session.post(url, json=payload, timeout=(20, 120))
-        r.raise_for_status()
-        data = r.json()
-        if data.get("code") != 0:
-            raise RuntimeError(f"MinerU API error: {data}")
-        return data
-
-    def _get(self, path: str) -> dict:
-        url = f"{self.base_url}{path}"
-        r = self.session.get(url, timeout=(20, 120))
-        r.raise_for_status()
-        data = r.json()
-        if data.get("code") != 0:
-            raise RuntimeError(f"MinerU API error: {data}")
-        return data
-
-    def apply_upload_urls(self, files: List[dict], model_version: str, extra: dict) -> dict:
-        payload = {"files": files, "model_version": model_version}
-        payload.update(extra or {})
-        return self._post("/api/v4/file-urls/batch", payload)
-
-    def get_batch_results(self, batch_id: str) -> dict:
-        return self._get(f"/api/v4/extract-results/batch/{batch_id}")
-
-
-def backoff_sleep(attempt: int, base: float = 1.0, cap: float = 10.0) -> None:
-    time.sleep(min(cap, base * (2 ** (attempt - 1))))
-
-
-def upload_to_presigned_url(file_path: Path, put_url: str, max_retries: int = 6) -> None:
-    last: Exception | None = None
-    for attempt in range(1, max_retries + 1):
-        try:
-            with file_path.open("rb") as f:
-                r = requests.put(put_url, data=f, timeout=(30, 900))
-            r.raise_for_status()
-            return
-        except Exception as e:
-            last = e
-            backoff_sleep(attempt)
-    raise RuntimeError(f"upload failed: {file_path.name}. last={last!r}")
-
-
-def wait_batch_done(client: MinerUClient, batch_id: str, expected_total: int, timeout_sec: int = 900, poll_sec: int = 3) -> List[dict]:
-    deadline = time.time() + timeout_sec
-    while time.time() < deadline:
-        last = client.get_batch_results(batch_id)
-        data = last.get("data") or {}
-        items = data.get("extract_result") or []
-        if not isinstance(items, list):
-            items = []
-        states: dict[str, int] = {}
-        done_or_failed = 0
-        for it in items:
-            st = str(it.get("state") or "unknown").lower()
-            states[st] = states.get(st, 0) + 1
-            if st in ("done", "failed"):
-                done_or_failed += 1
-        print(f"\r[parse] {done_or_failed}/{expected_total} {states}", end="", flush=True)
-        if expected_total > 0 and done_or_failed >= expected_total:
-            print()
-            return [it for it in items if isinstance(it, dict)]
-        time.sleep(poll_sec)
-    raise TimeoutError("batch not finished in time")
-
-
-def download_zip(zip_url: str, token: str, dest: Path, max_retries: int = 6) -> None:
-    last: Exception | None = None
-    headers = {"Authorization": f"Bearer {token}"}
-    for attempt in range(1, max_retries + 1):
-        try:
-            with requests.get(zip_url, headers=headers, stream=True, timeout=(30, 900)) as r:
-                r.raise_for_status()
-                with dest.open("wb") as f:
-                    for chunk in r.iter_content(chunk_size=1024 * 128):
-                        if chunk:
-                            f.write(chunk)
-            return
-        except Exception as e:
-            last = e
-            backoff_sleep(attempt)
-    raise RuntimeError(f"download zip failed. last={last!r}")
-
-
 def find_latest_selected_dir(root: Path) -> tuple[Path, str]:
     if not root.exists():
         raise SystemExit(f"input root not found: {root}")
@@ -148,7 +52,11 @@ def find_latest_selected_dir(root: Path) -> tuple[Path, str]:
     return root / name, name
 
 
-def run():
+def run(argv=None, ids=None):
+    """Full MinerU parse of the selected PDFs; returns ``{"date", "path", "ids"}`` (ids with a full md).
+
+    ``ids`` (in-process pipeline) are the papers selectpaper just placed.
+    """
     logger = setup_logging()
     ap = argparse.ArgumentParser("selectedpaper_to_mineru")
     ap.add_argument("--in-root", default=os.path.join("data", "selectedpaper"))
@@ -157,10 +65,22 @@ def run():
     ap.add_argument("--outdir", default=os.path.join("data", "selectedpaper_to_mineru"))
     ap.add_argument("--base-url", default=os.environ.get("MINERU_BASE_URL", "https://mineru.net"))
     ap.add_argument("--model-version", default=os.environ.get("MINERU_MODEL_VERSION", "vlm"))
-    ap.add_argument("--timeout-sec", type=int, default=900)
+    ap.add_argument("--timeout-sec", type=int, default=900, help="deadline per MinerU batch")
     ap.add_argument("--poll-sec", type=int, default=3)
     ap.add_argument("--upload-retries", type=int, default=6)
-    args = ap.parse_args()
+    ap.add_argument("--upload-workers", type=int, default=MINERU_UPLOAD_WORKERS, help="parallel presigned PUT uploads")
+    ap.add_argument("--download-workers", type=int, default=MINERU_DOWNLOAD_WORKERS, help="parallel result zip downloads")
+    ap.add_argument("--batch-size", type=int, default=MINERU_BATCH_SIZE, help="files per MinerU batch")
+    ap.add_argument("--max-inflight", type=int, default=MINERU_MAX_INFLIGHT, help="MinerU batches processed concurrently")
+    ap.add_argument("--fresh", action="store_true", help="forget recorded batches and upload everything again")
+    ap.add_argument("--no-cache", action="store_true", help="bypass the content-addressed MinerU cache")
+    ap.add_argument(
+        "--keep-assets",
+        action="store_true",
+        default=MINERU_KEEP_ASSETS,
+        help="also save images/ and content_list.json to <outdir>/<date>/<arxiv_id>/",
+    )
+    args = ap.parse_args(argv)
 
     token = (minerU_Token or "").strip()
     if not token:
@@ -175,70 +95,76 @@ def run():
     else:
         in_dir, date_str = find_latest_selected_dir(in_root)
 
-    pdfs = sorted(in_dir.glob("*.pdf"))
+    store = get_store()
+    # 工作集：进程内流水线直接用上游传入的 ids；否则取自元数据库（已入选、未做全文解析），库中没有该日期的入选记录时才扫描精选目录
+    if ids is not None:
+        pdfs = [in_dir / f"{aid}.pdf" for aid in ids if (in_dir / f"{aid}.pdf").exists()]
+    else:
+        pdfs = store.pending_files(STAGE_FULL_MD, after=STAGE_SELECT, list_date=date_str, in_dir=in_dir, suffix=".pdf")
+    if pdfs is None:
+        pdfs = sorted(in_dir.glob("*.pdf"))
+        if not pdfs:
+            raise SystemExit(f"No selected PDFs found in {in_dir}")
+    elif ids is None:
+        logger.info("Work set from store: %d selected PDF(s) without full md", len(pdfs))
     if args.limit is not None:
         pdfs = pdfs[: args.limit]
-    if not pdfs:
-        raise SystemExit(f"No selected PDFs found in {in_dir}")
     print("============开始对精选 PDF 做 MinerU 解析==============", flush=True)
 
     out_root = ensure_dir(Path(args.outdir) / date_str)
-    tmp_zip_dir = ensure_dir(out_root / "_tmp_zip")
 
+    converted = [p for p in pdfs if (out_root / f"{p.stem}.md").exists()]
+    store.set_stages(
+        [p.stem for p in converted],
+        STAGE_FULL_MD,
+        "ok",
+        paths={p.stem: str(out_root / f"{p.stem}.md") for p in converted},
+        list_date=date_str,
+    )
     pdfs_to_upload = [p for p in pdfs if not (out_root / f"{p.stem}.md").exists()]
     if not pdfs_to_upload:
         logger.info("All selected PDFs already converted, skip upload and parse")
         logger.info("Out dir: %s", str(out_root))
-        return
-
-    client = MinerUClient(args.base_url, token)
-    files_payload = [{"name": p.name, "data_id": p.stem} for p in pdfs_to_upload]
-    applied = client.apply_upload_urls(files_payload, model_version=args.model_version, extra={}).get("data") or {}
-    urls = applied.get("file_urls") or []
-    batch_id = applied.get("batch_id") or ""
-    if not batch_id or not urls or len(urls) != len(pdfs_to_upload):
-        raise SystemExit("Failed to apply upload URLs")
-
+        return {"date": date_str, "path": str(out_root), "ids": [p.stem for p in converted]}
+
+    state = BatchState(out_root / "_mineru_batches.json")
+    if args.fresh:
+        state.clear()
+    backend = MinerUBackend(
+        MinerUClient(args.base_url, token),
+        token,
+        state,
+        args.model_version,
+        cache=None if args.no_cache else MinerUCache(args.model_version),
+        zip_dir=out_root / "_tmp_zip",
+        assets_root=out_root if args.keep_assets else None,
+        batch_size=args.batch_size,
+        max_inflight=args.max_inflight,
+        timeout_sec=args.timeout_sec,
+        poll_sec=args.poll_sec,
+        upload_workers=args.upload_workers,
+        download_workers=args.download_workers,
+        upload_retries=args.upload_retries,
+    )
     total = len(pdfs_to_upload)
-    done = 0
-    for i, p in enumerate(pdfs_to_upload):
-        upload_to_presigned_url(p, urls[i], max_retries=args.upload_retries)
-        done += 1
-        print(f"\r[upload] {done}/{total}", end="", flush=True)
-    print()
-
-    results = wait_batch_done(client, batch_id, expected_total=total, timeout_sec=args.timeout_sec, poll_sec=args.poll_sec)
-    by_name = {str(it.get("file_name") or ""): it for it in results}
-    by_dataid = {str(it.get("data_id") or ""): it for it in results}
-
     wrote = 0
-    for p in pdfs_to_upload:
-        it = by_dataid.get(p.stem) or by_name.get(p.name)
-        if not it:
-            print(f"[skip] no result item for {p.name}")
-            continue
-        state = str(it.get("state") or "").lower()
-        if state != "done":
-            print(f"[skip] {p.name} state={state}")
-            continue
-        zip_url = it.get("full_zip_url")
-        if not zip_url:
-            print(f"[skip] {p.name} has no full_zip_url")
-            continue
-        zip_path = tmp_zip_dir / f"{p.stem}.zip"
-        download_zip(zip_url, token, zip_path)
-        md_text = pick_first_md(zip_path)
-        (out_root / f"{p.stem}.md").write_text(md_text, encoding="utf-8")
+
+    def on_result(res: ReadyResult) -> None:
+        nonlocal wrote
+        p = res.path
+        if res.error:
+            print(f"\n[skip] {p.name} state={res.state}: {res.error}")
+            store.set_stage(p.stem, STAGE_FULL_MD, "failed", list_date=date_str)
+            return
+        (out_root / f"{p.stem}.md").write_text(res.md_text, encoding="utf-8")
+        store.set_stage(p.stem, STAGE_FULL_MD, "ok", path=str(out_root / f"{p.stem}.md"), list_date=date_str)
         wrote += 1
-        print(f"\r[write] {wrote}/{total}", end="", flush=True)
-    print()
-    try:
-        tmp_zip_dir.rmdir()
-    except Exception:
-        pass
-    logger.info("Done. wrote=%d, total=%d", wrote, total)
+
+    backend.convert(pdfs_to_upload, on_result)
+    logger.info("Done. wrote=%d, total=%d %s", wrote, total, backend.summary())
     logger.info("Out dir: %s", str(out_root))
     print("============结束精选 PDF 的 MinerU 解析==============", flush=True)
+    return {"date": date_str, "path": str(out_root), "ids": [p.stem for p in pdfs if (out_root / f"{p.stem}.md").exists()]}
 
 
 if __name__ == "__main__":
@@ -1,5 +1,7 @@
 import argparse
+import concurrent.futures
 import json
+import logging
 import os
 import re
 import shutil
@@ -9,6 +11,11 @@ from typing import List, Dict, Any, Tuple
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from config.config import DATA_ROOT  # noqa: E402
+from config.config import PDF_DOWNLOAD_BURST, PDF_DOWNLOAD_RATE, PDF_DOWNLOAD_WARMUP, PDF_DOWNLOAD_WORKERS  # noqa: E402
+from Controller.http_session import build_session  # noqa: E402
+from Controller.paper_store import get_store, STAGE_FILTER, STAGE_SELECT  # noqa: E402
+from Controller.pdf_download import download_one_pdf, warmup_session  # noqa: E402
+from Controller.rate_limit import TokenBucket  # noqa: E402
 
 
 def find_latest_json(root: Path) -> Tuple[Path, str]:
@@ -49,7 +56,34 @@ def extract_arxiv_id(item: Dict[str, Any]) -> str:
     return ""
 
 
-def run(args: argparse.Namespace) -> None:
+def download_missing(aids: List[str], out_dir: Path, workers: int) -> List[str]:
+    """Download full PDFs for ``aids`` straight into ``out_dir``; returns the ids that succeeded."""
+    logger = logging.getLogger("selectpaper")
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler(sys.stdout))
+        logger.setLevel(logging.INFO)
+    workers = max(1, min(workers, len(aids)))
+    session = build_session(pool_size=workers, rate_limited=True)
+    limiter = TokenBucket(PDF_DOWNLOAD_RATE, burst=PDF_DOWNLOAD_BURST)
+    if PDF_DOWNLOAD_WARMUP == "once":
+        warmup_session(session, logger)
+
+    def one(aid: str):
+        return download_one_pdf(session, aid, str(out_dir / f"{aid}.pdf"), logger, limiter=limiter, warmup=PDF_DOWNLOAD_WARMUP)
+
+    ok: List[str] = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
+        for i, res in enumerate(ex.map(one, aids), 1):
+            if res.ok:
+                ok.append(res.arxiv_id)
+            else:
+                logger.warning("Download failed %s: %s", res.arxiv_id, res.reason)
+            print(f"\r[download] {i}/{len(aids)} ok={len(ok)}", end="", flush=True)
+    print()
+    return ok
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
     filter_root = Path(args.filter_root)
     raw_root = Path(args.raw_root)
     out_root = Path(args.out_root)
@@ -61,21 +95,37 @@ def run(args: argparse.Namespace) -> None:
         date_str = m.group(1) if m else in_path.stem
     else:
         in_path, date_str = find_latest_json(filter_root)
-    items = load_items(in_path)
-    if not items:
-        print("no items in filter json")
-        return
+    store = get_store()
+    # 未显式指定 --input 时，工作集取自元数据库（通过机构筛选、尚未入选）；库中没有该日期的筛选记录时才读筛选 json
+    ids = getattr(args, "ids", None)
+    pending = None if args.input or ids is not None else store.pending_paths(STAGE_SELECT, after=STAGE_FILTER, list_date=date_str)
+    if ids is not None:
+        aids = list(ids)
+    elif pending is not None:
+        aids = [aid for aid, _ in pending]
+        print(f"[select] work set from store: {len(aids)} paper(s)", flush=True)
+    else:
+        items = load_items(in_path)
+        if not items:
+            print("no items in filter json")
+            return {"date": date_str, "path": str(out_root / date_str), "ids": []}
+        aids = [extract_arxiv_id(it) for it in items]
     print("============开始拷贝精选论文 PDF==============", flush=True)
     out_dir = out_root / date_str
     out_dir.mkdir(parents=True, exist_ok=True)
-    total = len(items)
+    total = len(aids)
     moved = 0
     skipped = 0
-    for idx, it in enumerate(items, 1):
-        aid = extract_arxiv_id(it)
+    missing: List[str] = []
+    for idx, aid in enumerate(aids, 1):
         if not aid:
             skipped += 1
             continue
+        dst = out_dir / f"{aid}.pdf"
+        if dst.exists():
+            skipped += 1
+            store.set_stage(aid, STAGE_SELECT, "ok", path=str(dst), list_date=date_str)
+            continue
         src = None
         candidates = []
         if date_str:
@@ -86,27 +136,41 @@ def run(args: argparse.Namespace) -> None:
                 src = cand
                 break
         if src is None:
-            skipped += 1
-            continue
-        dst = out_dir / f"{aid}.pdf"
-        if dst.exists():
-            skipped += 1
+            # pdf_download --mode preview 只取了前几页，完整 PDF 在入选后才下载
+            missing.append(aid)
             continue
         shutil.move(str(src), str(dst))
         moved += 1
+        store.set_stage(aid, STAGE_SELECT, "ok", path=str(dst), list_date=date_str)
         print(f"\r[move] {idx}/{total} moved={moved} skipped={skipped}", end="", flush=True)
     print()
+    if missing and args.no_download:
+        skipped += len(missing)
+        print(f"[download] {len(missing)} selected paper(s) have no raw PDF, skipped (--no-download)", flush=True)
+    elif missing:
+        fetched = download_missing(missing, out_dir, args.download_workers)
+        for aid in fetched:
+            store.set_stage(aid, STAGE_SELECT, "ok", path=str(out_dir / f"{aid}.pdf"), list_date=date_str)
+        for aid in set(missing) - set(fetched):
+            store.set_stage(aid, STAGE_SELECT, "failed", list_date=date_str)
+        skipped += len(missing) - len(fetched)
+        print(f"[select] moved={moved} downloaded={len(fetched)} skipped={skipped}", flush=True)
     print("============结束拷贝精选论文 PDF==============", flush=True)
+    return {"date": date_str, "path": str(out_dir), "ids": [aid for aid in aids if aid and (out_dir / f"{aid}.pdf").exists()]}
 
 
-def main() -> None:
+def main(argv: List[str] | None = None, ids: List[str] | None = None) -> Dict[str, Any]:
+    """CLI entry; ``ids`` (in-process pipeline) are the papers instutions_filter kept."""
     ap = argparse.ArgumentParser("selectpaper")
     ap.add_argument("--filter-root", default=str(Path(DATA_ROOT) / "instutions_filter"))
     ap.add_argument("--raw-root", default=str(Path(DATA_ROOT) / "raw_pdf"))
     ap.add_argument("--out-root", default=str(Path(DATA_ROOT) / "selectedpaper"))
     ap.add_argument("--input", default="")
-    args = ap.parse_args()
-    run(args)
+    ap.add_argument("--download-workers", type=int, default=PDF_DOWNLOAD_WORKERS, help="parallel downloads of selected papers missing from raw_pdf")
+    ap.add_argument("--no-download", action="store_true", help="skip selected papers without a raw PDF instead of downloading them")
+    args = ap.parse_args(argv)
+    args.ids = ids
+    return run(args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,404 @@
+import argparse
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from config.config import (  # noqa: E402
+    OUTPUT_DIR,
+    FILENAME_FMT,
+    PDF_OUTPUT_DIR,
+    PDF_PREVIEW_DIR,
+    DATA_ROOT,
+    minerU_Token,
+    STREAM_QUEUE_SIZE,
+    STREAM_DOWNLOAD_WORKERS,
+    STREAM_SPLIT_WORKERS,
+    STREAM_MINERU_BATCH,
+    STREAM_MINERU_FLUSH_SEC,
+    PDF_DOWNLOAD_RATE,
+    PDF_DOWNLOAD_BURST,
+    PDF_DOWNLOAD_WARMUP,
+    PDF_DOWNLOAD_MODE,
+    MINERU_UPLOAD_WORKERS,
+    MINERU_DOWNLOAD_WORKERS,
+    MINERU_MAX_INFLIGHT,
+    PREVIEW_CONVERT_BACKEND,
+    PREVIEW_LOCAL_WORKERS,
+)
+from Controller.http_session import build_session  # noqa: E402
+from Controller.pdf_download import download_one_pdf, drop_duplicates, fetch_preview_pdf, parse_arxiv_ids, detect_latest_md, warmup_session  # noqa: E402
+from Controller.rate_limit import TokenBucket  # noqa: E402
+from Controller.paper_store import get_store, STAGE_DOWNLOAD, STAGE_SPLIT, STAGE_PREVIEW_MD  # noqa: E402
+from Controller.pdf_split import split_pdf  # noqa: E402
+from Controller.mineru_cache import MinerUCache  # noqa: E402
+from Controller.mineru_client import BatchState, MinerUClient, ReadyResult  # noqa: E402
+from Controller.pdf_convert import BACKENDS, ConverterBackend, LocalTextBackend, MinerUBackend  # noqa: E402
+
+_DONE = object()
+
+
+def setup_logging():
+    logger = logging.getLogger("stream_preview")
+    logger.setLevel(logging.INFO)
+    fmt = logging.Formatter("[%(levelname)s] %(message)s")
+    sh = logging.StreamHandler(stream=sys.stdout)
+    sh.setFormatter(fmt)
+    logger.addHandler(sh)
+    return logger
+
+
+class StageCounters:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.values = {
+            "downloaded": 0,
+            "previewed": 0,
+            "download_skipped": 0,
+            "download_failed": 0,
+            "split": 0,
+            "split_skipped": 0,
+            "split_failed": 0,
+            "md_written": 0,
+            "md_skipped": 0,
+            "md_cached": 0,
+            "md_failed": 0,
+        }
+
+    def inc(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.values[key] += n
+
+    def line(self) -> str:
+        with self._lock:
+            v = dict(self.values)
+        return (
+            f"[stream] dl={v['downloaded']}+{v['download_skipped']} range={v['previewed']} err={v['download_failed']} "
+            f"split={v['split']}+{v['split_skipped']} err={v['split_failed']} "
+            f"md={v['md_written']}+{v['md_skipped']} cache={v['md_cached']} err={v['md_failed']}"
+        )
+
+
+def has_valid_pdf(path: str) -> bool:
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path, "rb") as f:
+            return f.read(5).startswith(b"%PDF-")
+    except OSError:
+        return False
+
+
+def download_worker(session, limiter, warmup, in_q, out_q, date_str, counters, logger, mode="full", pages=2, stop=None):
+    while True:
+        aid = in_q.get()
+        if aid is _DONE:
+            in_q.task_done()
+            return
+        out_path = os.path.join(PDF_OUTPUT_DIR, date_str, f"{aid}.pdf")
+        preview_path = os.path.join(PDF_PREVIEW_DIR, date_str, f"{aid}.pdf")
+        try:
+            if stop is not None and stop.is_set():
+                continue
+            if mode == "preview" and not has_valid_pdf(out_path) and not os.path.exists(preview_path):
+                res = fetch_preview_pdf(session, aid, preview_path, logger, pages=pages, limiter=limiter)
+                if res.ok:
+                    # 切分阶段看到预览已存在会直接放行
+                    counters.inc("previewed")
+                    get_store().set_stage(aid, STAGE_DOWNLOAD, "ok", path=preview_path, list_date=date_str)
+                    out_q.put(aid)
+                    continue
+            if has_valid_pdf(out_path) or os.path.exists(preview_path):
+                counters.inc("download_skipped")
+                get_store().set_stage(aid, STAGE_DOWNLOAD, "ok", path=out_path, list_date=date_str)
+                out_q.put(aid)
+            else:
+                res = download_one_pdf(session, aid, out_path, logger, retries=5, timeout=60, limiter=limiter, warmup=warmup)
+                get_store().set_stage(aid, STAGE_DOWNLOAD, "ok" if res.ok else "failed", path=out_path, list_date=date_str)
+                if res.ok:
+                    counters.inc("downloaded")
+                    out_q.put(aid)
+                else:
+                    counters.inc("download_failed")
+                    logger.warning("Download failed %s: %s", aid, res.reason)
+        except Exception as e:
+            counters.inc("download_failed")
+            get_store().set_stage(aid, STAGE_DOWNLOAD, "failed", list_date=date_str)
+            logger.error("Failed to download %s: %r", aid, e)
+        finally:
+            in_q.task_done()
+
+
+def split_worker(in_q, out_q, date_str, pages, counters, logger, stop=None):
+    while True:
+        aid = in_q.get()
+        if aid is _DONE:
+            in_q.task_done()
+            return
+        src = os.path.join(PDF_OUTPUT_DIR, date_str, f"{aid}.pdf")
+        dst = os.path.join(PDF_PREVIEW_DIR, date_str, f"{aid}.pdf")
+        try:
+            if stop is not None and stop.is_set():
+                continue
+            if os.path.exists(dst):
+                counters.inc("split_skipped")
+                get_store().set_stage(aid, STAGE_SPLIT, "ok", path=dst, list_date=date_str)
+                out_q.put(Path(dst))
+            elif split_pdf(src, dst, pages, logger):
+                counters.inc("split")
+                get_store().set_stage(aid, STAGE_SPLIT, "ok", path=dst, list_date=date_str)
+                out_q.put(Path(dst))
+            else:
+                counters.inc("split_failed")
+                get_store().set_stage(aid, STAGE_SPLIT, "failed", list_date=date_str)
+        except Exception as e:
+            counters.inc("split_failed")
+            get_store().set_stage(aid, STAGE_SPLIT, "failed", list_date=date_str)
+            logger.error("Failed to split %s: %r", aid, e)
+        finally:
+            in_q.task_done()
+
+
+def make_backend(args, out_root: Path) -> ConverterBackend:
+    if args.backend == "local":
+        return LocalTextBackend(workers=args.local_workers)
+    token = (minerU_Token or "").strip()
+    # 批次由本阶段攒批并限制在途数，run_batches 内每次只处理这一批
+    return MinerUBackend(
+        MinerUClient(args.base_url, token),
+        token,
+        BatchState(out_root / "_mineru_batches.json"),
+        args.model_version,
+        cache=None if args.no_cache else MinerUCache(args.model_version),
+        zip_dir=out_root / "_tmp_zip",
+        batch_size=max(1, args.mineru_batch),
+        max_inflight=1,
+        timeout_sec=args.timeout_sec,
+        poll_sec=args.poll_sec,
+        upload_workers=args.upload_workers,
+        download_workers=args.zip_workers,
+        upload_retries=args.upload_retries,
+    )
+
+
+def convert_stage(in_q, out_root: Path, args, counters, logger, stop: threading.Event) -> None:
+    """Batch previews from ``in_q`` into the converter backend, at most ``args.max_inflight`` batches at a time.
+
+    Cache hits are answered as soon as a preview arrives; the rest are
+    collected into batches. When the in-flight limit is reached ``flush``
+    blocks, ``in_q`` stops draining and the bounded queues push back on
+    split / download. If the stage itself fails it sets ``stop`` and keeps
+    draining ``in_q`` until the end marker, so upstream workers never block on
+    a full queue.
+    """
+    backend = make_backend(args, out_root)
+    slots = threading.BoundedSemaphore(max(1, args.max_inflight))
+    inflight: List[threading.Thread] = []
+    pending: List[Path] = []
+    last_put = time.monotonic()
+
+    def on_result(res: ReadyResult) -> None:
+        p = res.path
+        md_path = out_root / f"{p.stem}.md"
+        if res.error:
+            counters.inc("md_failed")
+            get_store().set_stage(p.stem, STAGE_PREVIEW_MD, "failed", list_date=out_root.name)
+            logger.warning("No md for %s (state=%s): %s", p.name, res.state, res.error)
+            return
+        try:
+            md_path.write_text(res.md_text, encoding="utf-8")
+        except Exception as e:
+            counters.inc("md_failed")
+            get_store().set_stage(p.stem, STAGE_PREVIEW_MD, "failed", list_date=out_root.name)
+            logger.error("Failed to write md for %s: %r", p.name, e)
+            return
+        get_store().set_stage(p.stem, STAGE_PREVIEW_MD, "ok", path=str(md_path), list_date=out_root.name)
+        counters.inc("md_cached" if res.state == "cached" else "md_written")
+
+    def run_batch(batch: List[Path]) -> None:
+        try:
+            backend.convert_uncached(batch, on_result)
+        except Exception as e:
+            counters.inc("md_failed", len(batch))
+            get_store().set_stages([p.stem for p in batch], STAGE_PREVIEW_MD, "failed", list_date=out_root.name)
+            logger.error("Conversion batch of %d failed: %r", len(batch), e)
+        finally:
+            slots.release()
+
+    def flush() -> None:
+        nonlocal pending
+        if not pending:
+            return
+        batch, pending = pending, []
+        slots.acquire()
+        t = threading.Thread(target=run_batch, args=(batch,), daemon=True)
+        t.start()
+        inflight.append(t)
+
+    finished = False
+    try:
+        while not finished:
+            try:
+                item = in_q.get(timeout=1.0)
+            except queue.Empty:
+                if pending and time.monotonic() - last_put >= args.flush_sec:
+                    flush()
+                continue
+            try:
+                if item is _DONE:
+                    finished = True
+                    continue
+                if (out_root / f"{item.stem}.md").exists():
+                    counters.inc("md_skipped")
+                    get_store().set_stage(item.stem, STAGE_PREVIEW_MD, "ok", path=str(out_root / f"{item.stem}.md"), list_date=out_root.name)
+                    continue
+                if not backend.serve_cached([item], on_result):
+                    continue
+                pending.append(item)
+                last_put = time.monotonic()
+                if len(pending) >= args.mineru_batch:
+                    flush()
+            finally:
+                in_q.task_done()
+        flush()
+    except Exception as e:
+        stop.set()
+        logger.error("Conversion stage failed, stopping the stream: %r", e)
+        while not finished:
+            item = in_q.get()
+            in_q.task_done()
+            finished = item is _DONE
+    finally:
+        for t in inflight:
+            t.join()
+        try:
+            (out_root / "_tmp_zip").rmdir()
+        except Exception:
+            pass
+        logger.info("Backend: %s", backend.summary())
+
+
+def run(argv=None, ids=None):
+    """Download, split and convert one arxiv list as a pipeline; returns ``{"date", "path", "ids"}``.
+
+    ``ids`` (in-process pipeline) is the work set already decided by the dedup step.
+    """
+    logger = setup_logging()
+    ap = argparse.ArgumentParser("stream_preview")
+    ap.add_argument("--md", default=None)
+    ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--pages", type=int, default=2)
+    ap.add_argument("--outdir", default=os.path.join(DATA_ROOT, "preview_pdf_to_mineru"))
+    ap.add_argument("--queue-size", type=int, default=STREAM_QUEUE_SIZE)
+    ap.add_argument("--download-workers", type=int, default=STREAM_DOWNLOAD_WORKERS)
+    ap.add_argument("--split-workers", type=int, default=STREAM_SPLIT_WORKERS)
+    ap.add_argument("--rate", type=float, default=PDF_DOWNLOAD_RATE)
+    ap.add_argument("--burst", type=int, default=PDF_DOWNLOAD_BURST)
+    ap.add_argument("--warmup", choices=["each", "once", "none"], default=PDF_DOWNLOAD_WARMUP)
+    ap.add_argument("--mode", choices=["preview", "full"], default=PDF_DOWNLOAD_MODE, help="preview: fetch only the first pages via HTTP Range")
+    ap.add_argument("--backend", choices=BACKENDS, default=PREVIEW_CONVERT_BACKEND, help="local: pypdf text; mineru: remote MinerU")
+    ap.add_argument("--local-workers", type=int, default=PREVIEW_LOCAL_WORKERS, help="processes for the local backend")
+    ap.add_argument("--mineru-batch", type=int, default=STREAM_MINERU_BATCH, help="previews per conversion batch")
+    ap.add_argument("--flush-sec", type=float, default=STREAM_MINERU_FLUSH_SEC)
+    ap.add_argument("--max-inflight", type=int, default=MINERU_MAX_INFLIGHT, help="conversion batches processed at the same time")
+    ap.add_argument("--base-url", default=os.environ.get("MINERU_BASE_URL", "https://mineru.net"))
+    ap.add_argument("--model-version", default=os.environ.get("MINERU_MODEL_VERSION", "vlm"))
+    ap.add_argument("--timeout-sec", type=int, default=900)
+    ap.add_argument("--poll-sec", type=int, default=3)
+    ap.add_argument("--upload-retries", type=int, default=6)
+    ap.add_argument("--upload-workers", type=int, default=MINERU_UPLOAD_WORKERS, help="parallel presigned PUT uploads")
+    ap.add_argument("--zip-workers", type=int, default=MINERU_DOWNLOAD_WORKERS, help="parallel result zip downloads per batch")
+    ap.add_argument("--no-cache", action="store_true", help="bypass the content-addressed MinerU cache")
+    ap.add_argument("--keep-duplicates", action="store_true", help="also process ids the dedup step marked as (near-)duplicates")
+    args = ap.parse_args(argv)
+
+    if args.backend == "mineru" and not (minerU_Token or "").strip():
+        raise SystemExit("MinerU token missing in config.config.minerU_Token")
+
+    if args.md:
+        md_path = args.md
+    else:
+        today = datetime.now().strftime(FILENAME_FMT)
+        candidate = os.path.join(OUTPUT_DIR, today)
+        md_path = candidate if os.path.isfile(candidate) else detect_latest_md()
+    logger.info("Use markdown list: %s", md_path)
+    date_str, _ = os.path.splitext(os.path.basename(md_path))
+
+    if ids is not None:
+        arxiv_ids = list(ids)
+    else:
+        arxiv_ids = parse_arxiv_ids(md_path)
+        if not args.keep_duplicates:
+            arxiv_ids = drop_duplicates(arxiv_ids, date_str, logger)
+    if args.limit is not None:
+        arxiv_ids = arxiv_ids[: args.limit]
+    out_root = Path(args.outdir) / date_str
+    total = len(arxiv_ids)
+    if total == 0:
+        logger.info("No ids in %s, skip streaming preview", md_path)
+        return {"date": date_str, "path": str(out_root), "ids": []}
+    print(f"============开始流水线下载/切分/预览转 md（{args.backend}）==============", flush=True)
+
+    out_root.mkdir(parents=True, exist_ok=True)
+    qsize = max(1, args.queue_size)
+    id_q: queue.Queue = queue.Queue()
+    split_q: queue.Queue = queue.Queue(maxsize=qsize)
+    convert_q: queue.Queue = queue.Queue(maxsize=qsize)
+    counters = StageCounters()
+    stop = threading.Event()
+
+    n_dl = max(1, args.download_workers)
+    n_split = max(1, args.split_workers)
+    session = build_session(pool_size=n_dl, rate_limited=True)
+    limiter = TokenBucket(args.rate, burst=args.burst)
+    if args.warmup == "once":
+        warmup_session(session, logger)
+    dl_threads = [
+        threading.Thread(target=download_worker, args=(session, limiter, args.warmup, id_q, split_q, date_str, counters, logger, args.mode, args.pages, stop), daemon=True)
+        for _ in range(n_dl)
+    ]
+    split_threads = [
+        threading.Thread(target=split_worker, args=(split_q, convert_q, date_str, args.pages, counters, logger, stop), daemon=True)
+        for _ in range(n_split)
+    ]
+    convert_thread = threading.Thread(target=convert_stage, args=(convert_q, out_root, args, counters, logger, stop), daemon=True)
+    for t in dl_threads + split_threads + [convert_thread]:
+        t.start()
+
+    start = time.monotonic()
+    for aid in arxiv_ids:
+        id_q.put(aid)
+    for _ in dl_threads:
+        id_q.put(_DONE)
+
+    # 逐级关闭：上游全部结束后再向下游发送结束标记
+    stages = [(dl_threads, split_q, n_split), (split_threads, convert_q, 1)]
+    for threads, next_q, n_next in stages:
+        while any(t.is_alive() for t in threads):
+            for t in threads:
+                t.join(timeout=1.0)
+            if sys.stdout.isatty():
+                sys.stdout.write(counters.line() + "\r")
+                sys.stdout.flush()
+        for _ in range(n_next):
+            next_q.put(_DONE)
+    convert_thread.join()
+
+    if sys.stdout.isatty():
+        sys.stdout.write("\n")
+    logger.info("%s total=%d elapsed=%.1fs", counters.line(), total, time.monotonic() - start)
+    logger.info("Out dir: %s", str(out_root))
+    if stop.is_set():
+        raise SystemExit("stream_preview: conversion stage failed, remaining papers were skipped (see log)")
+    print(f"============结束流水线下载/切分/预览转 md（{args.backend}）==============", flush=True)
+    return {"date": date_str, "path": str(out_root), "ids": [aid for aid in arxiv_ids if (out_root / f"{aid}.md").exists()]}
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,342 @@
+"""Token counting and section-aware cropping of LLM inputs.
+
+:func:`get_tokenizer` returns one of
+
+* ``tokenizers`` – HuggingFace ``tokenizers`` with a local ``tokenizer.json``
+  (``TOKENIZER_JSON_PATH``; exact for the model family it was exported from),
+* ``tiktoken`` – a tiktoken encoding (``TIKTOKEN_ENCODING``), if its BPE file
+  is already in the local tiktoken cache,
+* ``heuristic`` – a regex estimator for BPE vocabularies (an English word
+  costs one token per ~4 letters, a digit or CJK character one token each),
+  multiplied by the worst-case ratio measured with ``--calibrate``
+  (``TOKENIZER_CALIBRATION_PATH``),
+* ``bytes`` – one token per UTF-8 byte; a byte-level BPE token always covers
+  at least one byte, so this never undercounts (but is ~4x high for English).
+
+``auto`` takes the first of these that loads, skipping the heuristic while it
+has no calibration: an unmeasured estimate could undercount and overrun the
+context window. Counts are cached per paragraph, so re-counting a document
+while cropping it is cheap.
+
+:func:`fit_to_budget` drops references, acknowledgements and appendix
+sections first, and only then trims the body from the end.
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import statistics
+import sys
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from config.config import TIKTOKEN_ENCODING, TOKENIZER_CALIBRATION_PATH, TOKENIZER_JSON_PATH  # noqa: E402
+
+PARA_SEP = "\n\n"
+
+_PIECE_RE = re.compile(
+    r"[A-Za-z]+|\d|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]|[^\sA-Za-z\d]|\s+"
+)
+
+
+class Tokenizer:
+    name = "base"
+
+    def __init__(self, cache_size: int = 16384) -> None:
+        self._para = lru_cache(maxsize=cache_size)(self._count)
+
+    def _count(self, text: str) -> int:
+        raise NotImplementedError
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        paras = text.split(PARA_SEP)
+        return sum(self._para(p) for p in paras) + len(paras) - 1
+
+
+class HFTokenizer(Tokenizer):
+    name = "tokenizers"
+
+    def __init__(self, path: str = TOKENIZER_JSON_PATH) -> None:
+        from tokenizers import Tokenizer as _HF
+
+        self._tok = _HF.from_file(path)
+        super().__init__()
+
+    def _count(self, text: str) -> int:
+        return len(self._tok.encode(text, add_special_tokens=False).ids)
+
+
+class TiktokenTokenizer(Tokenizer):
+    name = "tiktoken"
+
+    def __init__(self, encoding: str = TIKTOKEN_ENCODING) -> None:
+        import tiktoken
+
+        self._enc = tiktoken.get_encoding(encoding)
+        super().__init__()
+
+    def _count(self, text: str) -> int:
+        return len(self._enc.encode(text, disallowed_special=()))
+
+
+class HeuristicTokenizer(Tokenizer):
+    name = "heuristic"
+
+    def __init__(self, scale: Optional[float] = None) -> None:
+        if scale is None:
+            cal = load_calibration()
+            scale = float(cal["scale"]) if cal else 1.0
+        self.scale = max(1.0, scale)
+        if self.scale > 1.0:
+            self.name = f"heuristic*{self.scale:g}"
+        super().__init__()
+
+    def _count(self, text: str) -> int:
+        return math.ceil(self._raw(text) * self.scale)
+
+    @staticmethod
+    def _raw(text: str) -> int:
+        n = 0
+        for piece in _PIECE_RE.findall(text):
+            c = piece[0]
+            if c.isascii() and c.isalpha():
+                n += math.ceil(len(piece) / 4)
+            elif c.isspace():
+                # 单个空格通常并入后一个词的 token
+                n += 0 if piece == " " else 1
+            else:
+                n += 1
+        return n
+
+
+class ByteTokenizer(Tokenizer):
+    name = "bytes"
+
+    def _count(self, text: str) -> int:
+        return len(text.encode("utf-8", errors="ignore"))
+
+
+_BACKENDS = {
+    "tokenizers": HFTokenizer,
+    "tiktoken": TiktokenTokenizer,
+    "heuristic": HeuristicTokenizer,
+    "bytes": ByteTokenizer,
+}
+_INSTANCES: Dict[str, Tokenizer] = {}
+
+
+def load_calibration(path: str = TOKENIZER_CALIBRATION_PATH) -> Optional[Dict[str, Any]]:
+    """The ``--calibrate`` result for the heuristic, or None if it has not been measured."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            cal = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return cal if isinstance(cal, dict) and float(cal.get("scale") or 0) >= 1.0 else None
+
+
+def get_tokenizer(kind: str = "auto") -> Tokenizer:
+    """Shared tokenizer instance for ``kind`` (``auto`` ends with ``bytes`` when the heuristic is uncalibrated)."""
+    kind = (kind or "auto").lower()
+    if kind in _INSTANCES:
+        return _INSTANCES[kind]
+    if kind == "auto":
+        order = ["tokenizers", "tiktoken", "heuristic", "bytes"]
+    elif kind in _BACKENDS:
+        order = [kind]
+    else:
+        raise ValueError(f"unknown tokenizer: {kind}")
+    last: Optional[Exception] = None
+    for name in order:
+        if name == "tokenizers" and not os.path.exists(TOKENIZER_JSON_PATH):
+            continue
+        if kind == "auto" and name == "heuristic" and load_calibration() is None:
+            continue
+        try:
+            tok = _BACKENDS[name]()
+        except Exception as e:  # 可选依赖未安装 / 离线无 BPE 文件
+            last = e
+            continue
+        _INSTANCES[kind] = tok
+        return tok
+    raise RuntimeError(f"tokenizer {kind!r} unavailable: {last!r}")
+
+
+# ---------------- section-aware cropping ----------------
+
+HEADING_RE = re.compile(r"^#{1,6}\s+(.+?)\s*#*\s*$")
+_NUM_PREFIX = r"^(?:[0-9IVX]+(?:\.[0-9]+)*\.?\s+)?"
+SECTION_PATTERNS = (
+    ("references", re.compile(_NUM_PREFIX + r"(?:references?|bibliography|参考文献)\b", re.I)),
+    ("acknowledgements", re.compile(_NUM_PREFIX + r"(?:acknowledge?ments?|致谢)", re.I)),
+    ("appendix", re.compile(_NUM_PREFIX + r"(?:appendix|appendices|supplementary|附录)", re.I)),
+)
+DROP_ORDER = ("references", "acknowledgements", "appendix")
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """Split markdown at heading lines into ``(kind, text)``; kind is ``body`` or one of DROP_ORDER.
+
+    Unrecognised sections after the references (``A. Proofs`` ...) count as appendix.
+    """
+    sections: List[Tuple[str, List[str]]] = [("body", [])]
+    after_refs = False
+    for line in text.splitlines(keepends=True):
+        m = HEADING_RE.match(line.strip())
+        if m:
+            title = m.group(1).strip()
+            kind = next((k for k, rx in SECTION_PATTERNS if rx.match(title)), None)
+            if kind is None:
+                kind = "appendix" if after_refs else "body"
+            if kind == "references":
+                after_refs = True
+            sections.append((kind, [line]))
+        else:
+            sections[-1][1].append(line)
+    return [(kind, "".join(lines)) for kind, lines in sections if lines]
+
+
+def crop_tail(text: str, budget: int, tok: Tokenizer) -> str:
+    """Longest prefix of ``text`` within ``budget`` tokens, cut at a paragraph boundary when possible."""
+    if budget <= 0:
+        return ""
+    if tok.count(text) <= budget:
+        return text
+    paras = text.split(PARA_SEP)
+    kept: List[str] = []
+    used = 0
+    for p in paras:
+        cost = tok.count(p) + (1 if kept else 0)
+        if used + cost > budget:
+            # 单段超出剩余预算：按字符二分截取该段前缀（不经段落缓存，避免缓存大量前缀）
+            room = budget - used - (1 if kept else 0)
+            lo, hi = 0, len(p)
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if tok._count(p[:mid]) <= room:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            if lo > 0:
+                kept.append(p[:lo])
+            break
+        kept.append(p)
+        used += cost
+    return PARA_SEP.join(kept)
+
+
+def fit_to_budget(text: str, budget: int, tok: Tokenizer) -> Tuple[str, dict]:
+    """Crop ``text`` to at most ``budget`` tokens.
+
+    Returns ``(text, info)`` where ``info`` has the original and final token
+    counts, the section kinds that were dropped and whether the body itself
+    had to be trimmed.
+    """
+    total = tok.count(text)
+    info = {"tokens_in": total, "tokens_out": total, "dropped": [], "trimmed": False}
+    if total <= budget:
+        return text, info
+    sections = split_sections(text)
+    for kind in DROP_ORDER:
+        if total <= budget:
+            break
+        if not any(k == kind for k, _ in sections):
+            continue
+        sections = [(k, s) for k, s in sections if k != kind]
+        info["dropped"].append(kind)
+        text = "".join(s for _, s in sections)
+        total = tok.count(text)
+    if total > budget:
+        text = crop_tail(text, budget, tok)
+        info["trimmed"] = True
+        total = tok.count(text)
+    info["tokens_out"] = total
+    return text, info
+
+
+# ---------------- heuristic calibration ----------------
+
+
+def md_files(paths: List[str]) -> List[Path]:
+    """Markdown files named in ``paths``; directories are searched recursively."""
+    out: List[Path] = []
+    for p in map(Path, paths):
+        out.extend(sorted(p.rglob("*.md")) if p.is_dir() else [p])
+    return out
+
+
+def calibrate(paths: List[Path], reference: Tokenizer) -> Dict[str, Any]:
+    """Per-document ratio of ``reference`` to the raw heuristic count.
+
+    ``scale`` is the largest ratio rounded up to two decimals, so the scaled
+    heuristic does not undercount any of the measured documents.
+    """
+    heuristic = HeuristicTokenizer(scale=1.0)
+    ratios: List[float] = []
+    for path in paths:
+        text = path.read_text(encoding="utf-8", errors="ignore")
+        est = heuristic.count(text)
+        if est:
+            ratios.append(reference.count(text) / est)
+    if not ratios:
+        raise SystemExit("no non-empty markdown to calibrate on")
+    ratios.sort()
+    worst = ratios[-1]
+    return {
+        "reference": reference.name,
+        "files": len(ratios),
+        "median_ratio": round(statistics.median(ratios), 4),
+        "p95_ratio": round(ratios[min(len(ratios) - 1, int(0.95 * len(ratios)))], 4),
+        "max_ratio": round(worst, 4),
+        "scale": max(1.0, math.ceil(worst * 100) / 100),
+        "measured_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser("token_budget")
+    ap.add_argument("files", nargs="+", help="markdown files (or directories, with --calibrate) to count / crop")
+    ap.add_argument("--budget", type=int, default=None, help="also show what fit_to_budget would keep")
+    ap.add_argument("--tokenizer", default="auto", help="auto | tokenizers | tiktoken | heuristic | bytes")
+    ap.add_argument("--calibrate", action="store_true", help="measure the heuristic against --reference and save the scale")
+    ap.add_argument("--reference", default="tokenizers", help="real tokenizer for --calibrate: tokenizers | tiktoken")
+    ap.add_argument("--out", default=TOKENIZER_CALIBRATION_PATH, help="where --calibrate writes its result")
+    args = ap.parse_args(argv)
+
+    if args.calibrate:
+        if args.reference not in ("tokenizers", "tiktoken"):
+            raise SystemExit("--reference must be a real tokenizer: tokenizers | tiktoken")
+        if args.reference == "tokenizers" and not os.path.exists(TOKENIZER_JSON_PATH):
+            raise SystemExit(f"tokenizer.json not found: {TOKENIZER_JSON_PATH}")
+        try:
+            reference = get_tokenizer(args.reference)
+        except RuntimeError as e:
+            raise SystemExit(f"--calibrate needs a real tokenizer: {e}")
+        cal = calibrate(md_files(args.files), reference)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(cal, f, ensure_ascii=False, indent=2)
+        print(json.dumps(cal, ensure_ascii=False))
+        print(f"saved to {args.out}")
+        return
+
+    tok = get_tokenizer(args.tokenizer)
+    print(f"tokenizer={tok.name}")
+    for path in args.files:
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            text = f.read()
+        line = f"{os.path.basename(path)}: chars={len(text)} bytes={len(text.encode('utf-8'))} tokens={tok.count(text)}"
+        if args.budget is not None:
+            _, info = fit_to_budget(text, args.budget, tok)
+            line += f" -> {info['tokens_out']} dropped={','.join(info['dropped']) or '-'} trimmed={info['trimmed']}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,7 @@ import requests
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from config.config import DATA_ROOT
+from Controller.paper_store import get_store, STAGE_ZOTERO
 
 
 def read_text(p: Path) -> str:
@@ -358,6 +359,7 @@ def run_mode_a(args: argparse.Namespace) -> int:
     session_id = f"arxiv_daily_{uuid.uuid4().hex}"
     items_payload: List[Dict[str, Any]] = []
     attachments_plan: Dict[str, List[LocalAttachment]] = {}
+    stem_by_item: Dict[str, str] = {}
     for stem in stems:
         pdf_path = (pdf_dir / f"{stem}.pdf").resolve()
         title, abstract, src = resolve_title_and_abstract(
@@ -398,6 +400,7 @@ def run_mode_a(args: argparse.Namespace) -> int:
             sum_mime = args.summary_mime or "application/octet-stream"
             att_list.append(LocalAttachment(title="Summary", mime=sum_mime, path=sum_path, fake_url=fake_sum_url))
         attachments_plan[item_id] = att_list
+        stem_by_item[item_id] = stem
         if args.debug:
             print(f"[A][debug] stem={stem} title_source={src} title={title}")
     r = http_post_json(
@@ -416,6 +419,7 @@ def run_mode_a(args: argparse.Namespace) -> int:
         print("[A] saveItems failed; no attachments uploaded.")
         return 3
     saveatt_url = f"{connector_base}/connector/saveAttachment"
+    store = get_store()
     ok_items = 0
     ok_atts = 0
     fail_atts = 0
@@ -460,6 +464,7 @@ def run_mode_a(args: argparse.Namespace) -> int:
                     )
         if all_ok_for_item:
             ok_items += 1
+        store.set_stage(stem_by_item[item_id], STAGE_ZOTERO, "ok" if all_ok_for_item else "partial", list_date=date_str)
         processed_items += 1
         progress_msg = (
             f"[A] importing items {processed_items}/{total_items} "
@@ -693,7 +698,7 @@ def run_mode_b(args: argparse.Namespace) -> int:
     return 0
 
 
-def main() -> None:
+def main(argv: List[str] | None = None) -> None:
     pa = argparse.ArgumentParser("zotero_push")
 
     pa.add_argument("--mode", choices=["A", "B"], default="A")
@@ -726,7 +731,7 @@ def main() -> None:
     pa.add_argument("--collection", default="论文_导入未处理")
     pa.add_argument("--b-attachment-mode", choices=["imported", "linked"], default="imported")
 
-    args = pa.parse_args()
+    args = pa.parse_args(argv)
 
     print("============开始导入精选论文到 Zotero==============", flush=True)
     if args.mode == "A":
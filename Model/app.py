@@ -1,8 +1,13 @@
+import importlib
+import json
 import os
 import sys
 import subprocess
+import time
 
 ROOT = os.path.dirname(__file__)
+sys.path.insert(0, os.path.abspath(ROOT))
+from config.config import PIPELINE_RUNNER_DEFAULT, PIPELINE_TIMINGS_PATH  # noqa: E402
 
 STEPS = {
     "arxiv_search": [sys.executable, "-u", os.path.join(ROOT, "Controller", "arxiv_search.py")],
@@ -16,8 +21,59 @@ STEPS = {
     "selectedpaper_to_mineru": [sys.executable, "-u", os.path.join(ROOT, "Controller", "selectedpaper_to_mineru.py")],
     "paper_summary": [sys.executable, "-u", os.path.join(ROOT, "Controller", "paper_summary.py")],
     "zotero_push": [sys.executable, "-u", os.path.join(ROOT, "Controller", "zotero_push.py")],
+    "stream_preview": [sys.executable, "-u", os.path.join(ROOT, "Controller", "stream_preview.py")],
 }
 
+# 进程内模式下每个步骤的入口函数（均接受 argv 列表，返回 {"date", "path", "ids"}）
+STEP_ENTRY = {
+    "arxiv_search": "run",
+    "paperList_remove_duplications": "run",
+    "pdf_download": "run",
+    "pdf_split": "run",
+    "pdfsplite_to_minerU": "run",
+    "pdf_info": "main",
+    "instutions_filter": "main",
+    "selectpaper": "main",
+    "selectedpaper_to_mineru": "run",
+    "paper_summary": "run",
+    "zotero_push": "main",
+    "stream_preview": "run",
+}
+
+# 步骤依赖（DAG）：按依赖拓扑排序后顺序执行，步骤只有在其依赖全部完成后才会执行
+STEP_DEPS = {
+    "arxiv_search": [],
+    "paperList_remove_duplications": ["arxiv_search"],
+    "pdf_download": ["arxiv_search", "paperList_remove_duplications"],
+    "pdf_split": ["pdf_download"],
+    "pdfsplite_to_minerU": ["pdf_split"],
+    "pdf_info": ["pdfsplite_to_minerU"],
+    "instutions_filter": ["pdf_info"],
+    "selectpaper": ["instutions_filter"],
+    "selectedpaper_to_mineru": ["selectpaper"],
+    "paper_summary": ["selectedpaper_to_mineru"],
+    "zotero_push": ["paper_summary"],
+    "stream_preview": ["arxiv_search", "paperList_remove_duplications"],
+}
+
+# 进程内模式下的步骤交接：(上游候选步骤, 由上游返回值生成的参数, 是否以 ids= 直接传入上游的论文列表)。
+# 下游不再按"最新日期"重新查找上游输出，也不再重新解析列表 md / 查询元数据库来确定工作集
+STEP_HANDOFF = {
+    "paperList_remove_duplications": (["arxiv_search"], lambda r: ["--md", r["path"]], False),
+    "pdf_download": (["paperList_remove_duplications"], lambda r: ["--md", r["path"]], True),
+    "pdf_split": (["pdf_download"], lambda r: ["--md", r["path"]], True),
+    "pdfsplite_to_minerU": (["pdf_split"], lambda r: ["--date", r["date"]], True),
+    "pdf_info": (["pdfsplite_to_minerU", "stream_preview"], lambda r: ["--date", r["date"]], True),
+    "instutions_filter": (["pdf_info"], lambda r: ["--input", r["path"]], False),
+    "selectpaper": (["instutions_filter"], lambda r: ["--input", r["path"]], True),
+    "selectedpaper_to_mineru": (["selectpaper"], lambda r: ["--date", r["date"]], True),
+    "paper_summary": (["selectedpaper_to_mineru"], lambda r: ["--date", r["date"]], True),
+    "zotero_push": (["paper_summary"], lambda r: ["--date", r["date"]], False),
+    "stream_preview": (["paperList_remove_duplications"], lambda r: ["--md", r["path"]], True),
+}
+
+RUNNERS = ("inproc", "subprocess")
+
 
 PIPELINES = {
     "default": [
@@ -46,6 +102,18 @@ PIPELINES = {
         "paper_summary",
         "zotero_push",
     ],
+    # 下载/切分/预览解析三步合并为逐篇流转的流水线
+    "stream": [
+        "arxiv_search",
+        "paperList_remove_duplications",
+        "stream_preview",
+        "pdf_info",
+        "instutions_filter",
+        "selectpaper",
+        "selectedpaper_to_mineru",
+        "paper_summary",
+        "zotero_push",
+    ],
 }
 
 
@@ -57,6 +125,137 @@ def run_step(name, extra_args=None):
     return r.returncode
 
 
+_loaded_steps = {}
+# 进程内模式下各步骤模块的首次导入耗时（子进程模式下每步都要重新付出这部分 + 解释器启动）
+import_times = {}
+
+
+def load_step(name):
+    if name not in STEP_ENTRY:
+        raise SystemExit(f"Unknown step: {name}")
+    fn = _loaded_steps.get(name)
+    if fn is None:
+        t0 = time.perf_counter()
+        module = importlib.import_module(f"Controller.{name}")
+        import_times[name] = time.perf_counter() - t0
+        fn = getattr(module, STEP_ENTRY[name])
+        _loaded_steps[name] = fn
+    return fn
+
+
+def run_step_inproc(name, extra_args=None, ids=None):
+    """Call the step's entry function; returns its ``{"date", "path", "ids"}`` result (None if it exited early)."""
+    fn = load_step(name)
+    try:
+        if ids is None:
+            return fn(list(extra_args or []))
+        return fn(list(extra_args or []), ids=list(ids))
+    except SystemExit as e:
+        # 与子进程模式保持一致：exit code 0/None 视为成功，其余向上抛出
+        if e.code in (0, None):
+            return None
+        raise
+
+
+def handoff(step, results):
+    """(argv, ids) for ``step`` from the results of the steps that already ran in this process."""
+    spec = STEP_HANDOFF.get(step)
+    if spec is None:
+        return [], None
+    upstream, make_args, pass_ids = spec
+    for name in upstream:
+        r = results.get(name)
+        if isinstance(r, dict):
+            return make_args(r), (r.get("ids") or []) if pass_ids else None
+    # 上游未在本次运行（或提前退出）：步骤照常自行查找最新日期的输入
+    return [], None
+
+
+def order_steps(steps):
+    done = set()
+    ordered = []
+    pending = list(steps)
+    while pending:
+        progressed = False
+        for step in list(pending):
+            deps = [d for d in STEP_DEPS.get(step, []) if d in steps]
+            if all(d in done for d in deps):
+                ordered.append(step)
+                done.add(step)
+                pending.remove(step)
+                progressed = True
+        if not progressed:
+            raise SystemExit(f"Cyclic step dependencies: {pending}")
+    return ordered
+
+
+def load_timings():
+    try:
+        with open(PIPELINE_TIMINGS_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_timings(runner, timings):
+    # 记录每种 runner 下各步骤最近一次的实测耗时，供另一种 runner 的报告对照
+    data = load_timings()
+    per_runner = data.setdefault(runner, {})
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+    for step, elapsed in timings:
+        per_runner[step] = {"elapsed": round(elapsed, 3), "at": stamp}
+    os.makedirs(os.path.dirname(PIPELINE_TIMINGS_PATH) or ".", exist_ok=True)
+    tmp = PIPELINE_TIMINGS_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, PIPELINE_TIMINGS_PATH)
+
+
+def print_timing_report(timings, runner, compare):
+    other = "subprocess" if runner == "inproc" else "inproc"
+    previous = load_timings().get(other, {}) if compare else {}
+    print("[PIPELINE] step timings:", flush=True)
+    total = 0.0
+    import_total = 0.0
+    for step, elapsed in timings:
+        total += elapsed
+        line = f"  {step:<32} {elapsed:8.2f}s"
+        if runner == "inproc" and step in import_times:
+            import_total += import_times[step]
+            line += f"  import={import_times[step]:.2f}s"
+        if step in previous:
+            line += f"  last {other}={previous[step]['elapsed']:.2f}s ({previous[step]['at']})"
+        print(line, flush=True)
+    print(f"  {'total':<32} {total:8.2f}s", flush=True)
+    if runner == "inproc":
+        print(f"[PIPELINE] step module imports in this process: {import_total:.2f}s", flush=True)
+    if compare and not previous:
+        print(f"[PIPELINE] no recorded {other} run to compare; run the same pipeline with --runner {other} first", flush=True)
+
+
+def parse_runner_args(argv):
+    runner = PIPELINE_RUNNER_DEFAULT
+    compare = False
+    rest = []
+    i = 0
+    while i < len(argv):
+        a = argv[i]
+        if a == "--runner" and i + 1 < len(argv):
+            runner = argv[i + 1]
+            i += 2
+            continue
+        if a.startswith("--runner="):
+            runner = a.split("=", 1)[1]
+        elif a == "--compare-startup":
+            compare = True
+        else:
+            rest.append(a)
+        i += 1
+    if runner not in RUNNERS:
+        raise SystemExit(f"Unknown runner: {runner} (choose from {', '.join(RUNNERS)})")
+    return runner, compare, rest
+
+
 def detect_selected_count():
     data_root = os.path.join(ROOT, "data", "arxivList")
     if not os.path.isdir(data_root):
@@ -90,22 +289,45 @@ def main(argv=None):
     if argv:
         pipeline = argv[0]
         extra = argv[1:]
+    runner, compare, extra = parse_runner_args(extra)
     steps = PIPELINES.get(pipeline)
     if not steps:
         raise SystemExit(f"Unknown pipeline: {pipeline}")
-    print(f"START pipeline '{pipeline}' with {len(steps)} step(s)", flush=True)
-    for i, step in enumerate(steps):
-        if i == 0:
-            step_args = extra
-        else:
-            step_args = []
-        print(f"RUN step: {step}", flush=True)
-        run_step(step, step_args)
-        if step == "arxiv_search":
-            selected = detect_selected_count()
-            if selected == 0:
-                print("[PIPELINE] No papers selected in current window; stop after arxiv_search.", flush=True)
+    steps = order_steps(steps)
+    print(f"START pipeline '{pipeline}' with {len(steps)} step(s), runner={runner}", flush=True)
+    timings = []
+    results = {}
+    try:
+        for i, step in enumerate(steps):
+            ids = None
+            if i == 0:
+                step_args = extra
+            elif runner == "inproc":
+                step_args, ids = handoff(step, results)
+            else:
+                step_args = []
+            print(f"RUN step: {step}", flush=True)
+            if i > 0 and step_args:
+                print(f"[PIPELINE] handoff: {' '.join(step_args)}" + (f" ids={len(ids)}" if ids is not None else ""), flush=True)
+            t0 = time.perf_counter()
+            if runner == "inproc":
+                results[step] = run_step_inproc(step, step_args, ids)
+            else:
+                run_step(step, step_args)
+            timings.append((step, time.perf_counter() - t0))
+            if step == "arxiv_search" and runner == "subprocess":
+                if detect_selected_count() == 0:
+                    print("[PIPELINE] No papers selected in current window; stop after arxiv_search.", flush=True)
+                    return
+            r = results.get(step)
+            if isinstance(r, dict) and not r.get("ids") and i < len(steps) - 1:
+                # 进程内模式：任一步骤没有产出论文时，下游步骤无事可做，提前结束
+                print(f"[PIPELINE] No papers left after {step}; stop.", flush=True)
                 return
+    finally:
+        if timings:
+            save_timings(runner, timings)
+        print_timing_report(timings, runner, compare)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+"""Compare the single-pass scorer with the per-group findall scorer.
+
+Corpus: a text file (one abstract per line) or JSON/JSONL records with
+``title``/``abstract``/``summary`` fields. Without ``--corpus`` the latest
+``--fetch`` entries are pulled from the arXiv API.
+
+  python benchmarks/bench_bucket_and_score.py --corpus abstracts.jsonl --repeat 5
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Controller.arxiv_search import (  # noqa: E402
+    PATTERNS,
+    bucket_and_score_legacy,
+    build_arxiv_query,
+    fetch_page_with_retry,
+    match_text,
+    normalize_text,
+    setup_logging,
+)
+from Controller.http_session import build_session  # noqa: E402
+
+
+def load_corpus(path: Path) -> List[str]:
+    texts: List[str] = []
+    raw = path.read_text(encoding="utf-8", errors="ignore")
+    records = None
+    if path.suffix.lower() == ".json":
+        records = json.loads(raw)
+    elif path.suffix.lower() == ".jsonl":
+        records = [json.loads(ln) for ln in raw.splitlines() if ln.strip()]
+    if records is None:
+        return [normalize_text(ln) for ln in raw.splitlines() if ln.strip()]
+    for rec in records:
+        if not isinstance(rec, dict):
+            continue
+        title = normalize_text(str(rec.get("title") or ""))
+        abstract = normalize_text(str(rec.get("abstract") or rec.get("summary") or ""))
+        if title or abstract:
+            texts.append(f"{title}\n{abstract}")
+    return texts
+
+
+def fetch_corpus(n: int) -> List[str]:
+    logger = setup_logging()
+    session = build_session()
+    texts: List[str] = []
+    start = 0
+    while len(texts) < n:
+        params = {
+            "search_query": build_arxiv_query(),
+            "start": start,
+            "max_results": min(200, n - len(texts)),
+            "sortBy": "submittedDate",
+            "sortOrder": "descending",
+        }
+        feed = fetch_page_with_retry(session, params, logger)
+        if not feed.entries:
+            break
+        for e in feed.entries:
+            texts.append(f"{normalize_text(getattr(e, 'title', ''))}\n{normalize_text(getattr(e, 'summary', ''))}")
+        start += len(feed.entries)
+        time.sleep(3.1)
+    return texts
+
+
+def legacy(text: str):
+    return bool(PATTERNS["CORE"].search(text)), *bucket_and_score_legacy(text)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser("bench_bucket_and_score")
+    ap.add_argument("--corpus", default="")
+    ap.add_argument("--fetch", type=int, default=1000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    texts = load_corpus(Path(args.corpus)) if args.corpus else fetch_corpus(args.fetch)
+    if not texts:
+        raise SystemExit("empty corpus")
+
+    mismatched = [t for t in texts if legacy(t) != match_text(t)]
+    print(f"corpus={len(texts)} avg_chars={sum(map(len, texts)) / len(texts):.0f} mismatched={len(mismatched)}")
+    if mismatched:
+        print("first mismatch:", mismatched[0][:200])
+
+    timings = {}
+    for name, fn in (("legacy findall", legacy), ("single pass", match_text)):
+        best = None
+        for _ in range(max(1, args.repeat)):
+            t0 = time.perf_counter()
+            for t in texts:
+                fn(t)
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+        print(f"{name:<16} {best * 1000:9.1f} ms  {len(texts) / best:10.0f} docs/s")
+    print(f"speedup x{timings['legacy findall'] / timings['single pass']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Query latency of the MinHash/LSH near-duplicate index at a given history size.
+
+The index is filled with ``--size`` random signatures (plus ``--docs`` real
+signatures built from synthetic abstracts), then every doc is queried with a
+lightly edited copy of itself and with an unrelated text.
+
+  python benchmarks/bench_near_dup.py --size 300000 --docs 200
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import NEAR_DUP_THRESHOLD  # noqa: E402
+from Controller.near_dup import NearDupIndex  # noqa: E402
+
+VOCAB = [f"w{i}" for i in range(5000)]
+
+
+def fake_abstract(rnd: random.Random, n: int = 150) -> str:
+    return " ".join(rnd.choice(VOCAB) for _ in range(n))
+
+
+def edit(rnd: random.Random, text: str, ratio: float = 0.02) -> str:
+    words = text.split()
+    for _ in range(max(1, int(len(words) * ratio))):
+        words[rnd.randrange(len(words))] = rnd.choice(VOCAB)
+    return " ".join(words)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser("bench_near_dup")
+    ap.add_argument("--size", type=int, default=300000)
+    ap.add_argument("--docs", type=int, default=200)
+    ap.add_argument("--threshold", type=float, default=NEAR_DUP_THRESHOLD)
+    args = ap.parse_args()
+
+    rnd = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = NearDupIndex(os.path.join(tmp, "bench.sqlite3"))
+        t0 = time.perf_counter()
+        with index.conn:
+            for start in range(0, args.size, 10000):
+                sigs, bands = [], []
+                for i in range(start, min(args.size, start + 10000)):
+                    sig = array("I", (rnd.getrandbits(32) for _ in range(index.num_perm)))
+                    aid = f"r{i}"
+                    sigs.append((aid, "", sig.tobytes()))
+                    bands.extend((b, h, aid) for b, h in enumerate(index.band_hashes(sig)))
+                index.conn.executemany("INSERT INTO near_dup_sigs (arxiv_id, title, sig) VALUES (?, ?, ?)", sigs)
+                index.conn.executemany("INSERT OR IGNORE INTO near_dup_bands (band, hash, arxiv_id) VALUES (?, ?, ?)", bands)
+        docs = [fake_abstract(rnd) for _ in range(args.docs)]
+        for i, text in enumerate(docs):
+            index.add(f"d{i}", f"doc {i}", index.signature(text))
+        print(f"index={index.count()} build={time.perf_counter() - t0:.1f}s")
+
+        queries = [(index.signature(edit(rnd, t)), True) for t in docs]
+        queries += [(index.signature(fake_abstract(rnd)), False) for _ in docs]
+        hits = misses = false_hits = 0
+        lat = []
+        for sig, expect in queries:
+            t = time.perf_counter()
+            m = index.query(sig, args.threshold)
+            lat.append(time.perf_counter() - t)
+            if expect:
+                hits += m is not None
+                misses += m is None
+            else:
+                false_hits += m is not None
+        lat.sort()
+        print(f"queries={len(queries)} recall={hits}/{hits + misses} false_hits={false_hits}")
+        print(f"latency p50={lat[len(lat) // 2] * 1e6:.0f}us p99={lat[int(len(lat) * 0.99)] * 1e6:.0f}us max={lat[-1] * 1e6:.0f}us")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Time and Python heap peak of the lazy first-N-pages extractor vs the full PdfReader path.
+
+Memory is measured with ``tracemalloc`` (the memory-mapped source file is not
+on the Python heap, the ``BytesIO`` copy made by ``PdfReader(path)`` is).
+
+  python benchmarks/bench_pdf_preview.py --src-dir data/raw_pdf/2025-01-01 --pages 2
+  python benchmarks/bench_pdf_preview.py --synthetic 600 --synthetic 2000   # 生成的纯文本 PDF
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Controller.pdf_split import extract_first_pages, split_pdf  # noqa: E402
+from synthetic_pdf import synthetic_pdfs  # noqa: E402
+
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    ok = True
+    try:
+        fn()
+    except Exception:
+        ok = False
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, ok
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser("bench_pdf_preview")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--src-dir")
+    src.add_argument("--synthetic", type=int, action="append", metavar="PAGES", help="benchmark a generated PDF of PAGES pages (repeatable)")
+    ap.add_argument("--pages", type=int, default=2)
+    ap.add_argument("--limit", type=int, default=None)
+    args = ap.parse_args()
+
+    logger = logging.getLogger("bench_pdf_preview")
+    tot = {"full_t": 0.0, "lazy_t": 0.0, "full_m": 0, "lazy_m": 0}
+    fallbacks = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.synthetic:
+            pdfs = synthetic_pdfs(tmp, args.synthetic)
+        else:
+            pdfs = sorted(Path(args.src_dir).glob("*.pdf"))[: args.limit]
+        if not pdfs:
+            raise SystemExit(f"no pdf in {args.src_dir}")
+        print(f"{'file':<28} {'MB':>6} {'full ms':>9} {'lazy ms':>9} {'full MB':>8} {'lazy MB':>8}")
+        for p in pdfs:
+            full_out = os.path.join(tmp, f"full_{p.name}")
+            lazy_out = os.path.join(tmp, f"lazy_{p.name}")
+            ft, fm, _ = measure(lambda: split_pdf(str(p), full_out, args.pages, logger, lazy=False))
+            lt, lm, ok = measure(lambda: extract_first_pages(str(p), lazy_out, args.pages))
+            fallbacks += not ok
+            tot["full_t"] += ft
+            tot["lazy_t"] += lt
+            tot["full_m"] = max(tot["full_m"], fm)
+            tot["lazy_m"] = max(tot["lazy_m"], lm)
+            print(
+                f"{p.name[:28]:<28} {p.stat().st_size / 1e6:6.1f} {ft * 1000:9.1f} {lt * 1000:9.1f} "
+                f"{fm / 1e6:8.1f} {lm / 1e6:8.1f}{'' if ok else '  (lazy failed -> fallback)'}"
+            )
+    print(
+        f"total: full {tot['full_t']:.2f}s lazy {tot['lazy_t']:.2f}s (x{tot['full_t'] / max(tot['lazy_t'], 1e-9):.2f}); "
+        f"peak heap full {tot['full_m'] / 1e6:.1f}MB lazy {tot['lazy_m'] / 1e6:.1f}MB; fallbacks={fallbacks}"
+    )
+
+
+if __name__ == "__main__":
+    main()
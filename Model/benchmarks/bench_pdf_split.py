@@ -0,0 +1,65 @@
+"""Preview-split throughput of pdf_split for 1..N worker processes.
+
+Every PDF in ``--src-dir`` is split into a fresh temporary directory for each
+worker count, so the skip-if-exists check never short-circuits a run.
+
+  python benchmarks/bench_pdf_split.py --src-dir data/raw_pdf/2025-01-01 --max-workers 8
+  python benchmarks/bench_pdf_split.py --synthetic 30 --count 100 --max-workers 8   # 100 篇生成的 30 页 PDF
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Controller.pdf_split import iter_split_results  # noqa: E402
+from synthetic_pdf import synthetic_pdfs  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser("bench_pdf_split")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--src-dir")
+    src.add_argument("--synthetic", type=int, metavar="PAGES", help="benchmark generated PDFs of PAGES pages instead")
+    ap.add_argument("--count", type=int, default=50, help="number of generated PDFs for --synthetic")
+    ap.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--pages", type=int, default=2)
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--no-lazy", action="store_true", help="benchmark the full PdfReader path")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as src_tmp:
+        if args.synthetic:
+            pdfs = synthetic_pdfs(src_tmp, [args.synthetic], copies=args.count)
+        else:
+            pdfs = sorted(Path(args.src_dir).glob("*.pdf"))
+        if not pdfs:
+            raise SystemExit(f"no pdf in {args.src_dir}")
+        bench(pdfs, args)
+
+
+def bench(pdfs, args) -> None:
+    size_mb = sum(p.stat().st_size for p in pdfs) / 1024 / 1024
+    print(f"pdfs={len(pdfs)} size={size_mb:.1f}MB pages={args.pages} cpus={os.cpu_count()}")
+
+    base = None
+    for workers in range(1, max(1, args.max_workers) + 1):
+        best = None
+        for _ in range(max(1, args.repeat)):
+            with tempfile.TemporaryDirectory() as tmp:
+                jobs = [(p.stem, str(p), os.path.join(tmp, p.name), args.pages, not args.no_lazy) for p in pdfs]
+                t0 = time.perf_counter()
+                results = list(iter_split_results(jobs, workers))
+                elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        created = sum(1 for r in results if r[2])
+        failed = sum(1 for r in results if r[3])
+        base = base or best
+        print(f"workers={workers:<3} {best:7.2f}s  {len(pdfs) / best:7.1f} splits/s  speedup x{base / best:.2f}  created={created} failed={failed}")
+
+
+if __name__ == "__main__":
+    main()
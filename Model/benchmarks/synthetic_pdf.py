@@ -0,0 +1,66 @@
+"""Synthetic text PDFs for the pdf_split benchmarks (no real papers needed).
+
+Every page carries its own content stream with a few lines of Helvetica text
+and shares one font object, like a typical LaTeX paper.
+
+  python benchmarks/synthetic_pdf.py out.pdf --pages 600
+"""
+
+import argparse
+import os
+from pathlib import Path
+from typing import List
+
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+LINES_PER_PAGE = 40
+
+
+def write_synthetic_pdf(path: str, pages: int, lines: int = LINES_PER_PAGE) -> None:
+    w = PdfWriter()
+    font = w._add_object(
+        DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Helvetica"),
+            }
+        )
+    )
+    resources = DictionaryObject({NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})})
+    for i in range(max(1, pages)):
+        page = w.add_blank_page(612, 792)
+        page[NameObject("/Resources")] = resources
+        ops = [f"BT /F1 10 Tf 72 {740 - j * 16} Td (Page {i + 1} line {j + 1}: synthetic body text for the benchmark.) Tj ET" for j in range(lines)]
+        stream = DecodedStreamObject()
+        stream.set_data("\n".join(ops).encode("latin-1"))
+        page[NameObject("/Contents")] = w._add_object(stream)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        w.write(f)
+    os.replace(tmp, path)
+
+
+def synthetic_pdfs(out_dir: str, page_counts: List[int], copies: int = 1) -> List[Path]:
+    """Write ``copies`` PDFs per entry of ``page_counts`` into ``out_dir``; return their paths."""
+    paths: List[Path] = []
+    for pages in page_counts:
+        for k in range(max(1, copies)):
+            p = Path(out_dir) / f"synthetic_{pages}p_{k}.pdf"
+            write_synthetic_pdf(str(p), pages)
+            paths.append(p)
+    return paths
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser("synthetic_pdf")
+    ap.add_argument("out")
+    ap.add_argument("--pages", type=int, default=600)
+    args = ap.parse_args()
+    write_synthetic_pdf(args.out, args.pages)
+    print(f"{args.out}: {args.pages} pages, {os.path.getsize(args.out) / 1e6:.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
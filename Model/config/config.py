@@ -64,11 +64,23 @@ OUTPUT_DIR = os.path.join(DATA_ROOT, "arxivList")
 FILENAME_FMT = "%Y-%m-%d.md"
 PDF_OUTPUT_DIR = os.path.join(DATA_ROOT, "raw_pdf")
 PDF_PREVIEW_DIR = os.path.join(DATA_ROOT, "preview_pdf")
+# 论文元数据库（SQLite，WAL 模式）：按 arxiv_id 记录标题/摘要/分桶/机构及各步骤状态
+PAPER_STORE_PATH = os.path.join(DATA_ROOT, "papers.sqlite3")
+# 近似去重（Controller/near_dup.py，MinHash/LSH，标题+摘要的 3 词 shingle）：估计 Jaccard 相似度达到阈值即视为重复
+# 签名长度须为分带数的整数倍；每带行数 = NUM_PERM / BANDS，行数越少召回越高、候选越多
+NEAR_DUP_ENABLED = True
+NEAR_DUP_THRESHOLD = 0.8
+NEAR_DUP_NUM_PERM = 64
+NEAR_DUP_BANDS = 16
 # 分页与筛选参数的默认值；命令行参数可覆盖
 PAGE_SIZE_DEFAULT = 200
 MAX_PAPERS_DEFAULT = 500
 SLEEP_DEFAULT = 3.1
 MIN_SCORE_DEFAULT = 1
+# 翻页方式：serial 为单查询串行翻页；async 为分片并发翻页（共享 SLEEP_DEFAULT 对应的全局限速，结果按 arxiv_id 合并去重）
+# auto 表示 --window-days > 1 时使用 async；分片方式：none / category（按分类）/ day（按 submittedDate 天）/ category_day
+ARXIV_FETCH_MODE = "auto"
+ARXIV_SHARD_DEFAULT = "day"
 # 是否继承系统环境代理（HTTP(S)_PROXY 等）；默认关闭以避免兼容问题
 USE_PROXY_DEFAULT = False
 # 请求失败重试次数（指数退避：1s、2s、4s…）
@@ -81,6 +93,51 @@ RETRY_BACKOFF = 1.5
 REQUESTS_UA = USER_AGENT
 PROXIES = None
 RESPECT_ENV_PROXIES = False
+# PDF 下载（Controller/pdf_download.py）：并发线程数；对 arxiv.org 的全局请求速率（次/秒，令牌桶）与突发上限
+# 预热方式：each 为每篇先访问 /abs/ 页（旧行为），once 为每个 session 只访问一次首页，none 为不预热
+PDF_DOWNLOAD_WORKERS = 4
+PDF_DOWNLOAD_RATE = 2.0
+PDF_DOWNLOAD_BURST = 4
+PDF_DOWNLOAD_WARMUP = "once"
+# 下载模式：preview 用 HTTP Range 只取前几页所需的字节直接写出预览 PDF（data/preview_pdf），
+# 服务端不支持 Range 或文件布局需要超过 PDF_PREVIEW_MAX_REQUESTS 次请求时退回整篇下载；完整 PDF 由 selectpaper 只为入选论文下载
+# full 为整篇下载到 data/raw_pdf（旧行为）；PDF_PREVIEW_BLOCK_KB 为每次 Range 请求的预读块大小
+PDF_DOWNLOAD_MODE = "preview"
+PDF_PREVIEW_BLOCK_KB = 128
+PDF_PREVIEW_MAX_REQUESTS = 24
+# 预览 PDF 切分（Controller/pdf_split.py）的进程数；pypdf 为纯 Python 实现，多进程可利用多核；1 表示在当前进程内逐篇切分
+PDF_SPLIT_WORKERS = max(1, min(4, os.cpu_count() or 1))
+# 预览 PDF 转 md 的后端（Controller/pdf_convert.py，Step4 --backend）：local 为本地 pypdf 文本抽取（多进程，秒级，不消耗 MinerU 额度），
+# mineru 为远程 MinerU 解析（版式更准确，排队可能数分钟）；PREVIEW_LOCAL_WORKERS 为 local 后端的进程数
+# 默认仍为 mineru；local 需先用 affiliation.py --report 与 pdf_info 结果对照确认机构识别一致后再切换
+PREVIEW_CONVERT_BACKEND = "mineru"
+PREVIEW_LOCAL_WORKERS = max(1, min(4, os.cpu_count() or 1))
+# app.py 的步骤执行方式：inproc 为进程内导入各步骤模块并调用入口函数；subprocess 为每步单独启动解释器（隔离性更好）
+PIPELINE_RUNNER_DEFAULT = "inproc"
+# 每种 runner 最近一次各步骤的实测耗时，app.py --compare-startup 用另一种 runner 的记录做对照
+PIPELINE_TIMINGS_PATH = os.path.join(DATA_ROOT, "pipeline_timings.json")
+# 流水线模式（Controller/stream_preview.py）：下载 → 切分 → 转 md 逐篇流转（转换后端同 PREVIEW_CONVERT_BACKEND）
+# 各阶段之间的有界队列长度；下载/切分的工作线程数；攒够多少篇预览提交一个转换批次；空闲多少秒后提交未满批次
+STREAM_QUEUE_SIZE = 32
+STREAM_DOWNLOAD_WORKERS = 4
+STREAM_SPLIT_WORKERS = 2
+STREAM_MINERU_BATCH = 20
+STREAM_MINERU_FLUSH_SEC = 15.0
+# MinerU 解析缓存（Controller/mineru_cache.py）：按 PDF 内容 sha256 + model_version 存放解析出的 md，
+# 任意日期目录 / --outdir / 重复出现的论文命中缓存时不再上传；KEEP_ZIP 为 True 时同时保留完整结果 zip
+MINERU_CACHE_DIR = os.path.join(DATA_ROOT, "mineru_cache")
+MINERU_CACHE_KEEP_ZIP = False
+# MinerU 预签名上传（Controller/mineru_client.py）：并行上传的线程数（共用一个连接池，文件按块流式发送）
+MINERU_UPLOAD_WORKERS = 8
+# MinerU 结果下载：批次中某篇状态变为 done 即开始下载 zip 并提取 md（与其余论文的解析重叠），此为并行下载线程数
+MINERU_DOWNLOAD_WORKERS = 4
+# MinerU 分批提交（Step4 / Step8）：每批文件数、同时在途的批次数；已提交批次记录在 <输出目录>/_mineru_batches.json，
+# 中断或超时后重跑会直接挂接仍在解析的批次而不重复上传
+MINERU_BATCH_SIZE = 50
+MINERU_MAX_INFLIGHT = 2
+# MinerU 结果提取：默认只通过 HTTP Range 读取 zip 中的 md，只写出 .md；
+# 为 True 时整包读入内存，额外保存 images/ 与 content_list.json 到 <输出目录>/<arxiv_id>/
+MINERU_KEEP_ASSETS = False
 
 
 """
@@ -112,7 +169,26 @@ org_base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"
 org_model = "qwen-plus"
 org_max_tokens = 2048
 org_temperature = 1.0
+# pdf_info 并发为自适应（AIMD）：从 pdf_info_concurrency 起步，延迟稳定时逐步增加，遇到 429/5xx 减半；
+# 上下限为 pdf_info_min/max_concurrency；单次请求失败按带抖动的指数退避重试 pdf_info_retries 次
 pdf_info_concurrency = 8
+pdf_info_min_concurrency = 1
+pdf_info_max_concurrency = 32
+pdf_info_retries = 5
+# pdf_info 批量模式：一次请求打包最多 pdf_info_batch_size 篇（1 为逐篇请求），打包的输入 token 不超过 pdf_info_batch_input_tokens；
+# 回复为按 arxiv_id 对应的 JSON 数组，缺失 / 格式错误的论文放回队列逐篇重试；回复完整时批大小 +1，出错时减半
+# 批量请求 max_tokens = max(org_max_tokens, 篇数 × pdf_info_batch_output_tokens)
+# 默认逐篇（1）：批量模式需 --batch-size 显式开启，待与历史 data/pdf_info 逐篇结果对照一致后再调大默认值
+pdf_info_batch_size = 1
+pdf_info_batch_input_tokens = 24000
+pdf_info_batch_output_tokens = 400
+# 本地大机构名录（Controller/affiliation.py）：在预览 md 的作者机构区域（摘要前的非标题行 + 邮箱 / 通讯作者等脚注行）匹配名录中的机构别名
+# 第一个机构即名录机构 → large；有机构线索但名录机构均未出现 → small；其余（无摘要、名录机构排在其他机构之后、仅实习脚注等）交给大模型
+# AFFILIATION_SHORTCUT 为本地直接采信的判定，() 表示全部交给大模型；命令行 --no-gazetteer 可临时关闭
+# 采信的论文仍调用大模型生成 instution（中文名）与 abstract，但只发送机构名 + 摘要段落（pdf_info_abstract_*_prompt），is_large 以名录为准
+AFFILIATION_GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "large_institutions.json")
+# small 判定默认不采信：待 python Controller/affiliation.py --report 在历史数据上显示 small precision 接近 100% 后再加入
+AFFILIATION_SHORTCUT = ("large",)
 
 # 摘要生成模型
 # 摘要生成模型参数 pdfSummary.py
@@ -122,11 +198,59 @@ summary_max_tokens = 2048
 summary_temperature = 1.0
 # 摘要输入长度控制（模型上下文窗口硬上限与安全边距）
 # 总输入预算 = summary_input_hard_limit - summary_input_safety_margin
-# 用户内容裁剪预算 = 总输入预算 - 系统提示词近似长度（按 UTF-8 字节近似 token）
-# 最终传入 ≈ 系统提示词 + 裁剪后的用户内容 ≤ 总输入预算
+# 用户内容裁剪预算 = 总输入预算 - 系统提示词 token 数（按 summary_tokenizer 计数）
+# 超出预算时先整节删除参考文献 / 致谢 / 附录，仍超出再从正文末尾按段落裁剪
 summary_input_hard_limit = 129024
 summary_input_safety_margin = 4096
 summary_concurrency = 16
+# 流式生成（Controller/paper_summary.py）：边生成边写入 <arxiv_id>.md.part，完成后原子改名为 .md；--no-stream 回退为一次性返回
+# 每篇记录首 token 延迟 / 生成速度 / 总耗时到 data/paper_summary/metrics/<日期>.jsonl
+summary_stream = True
+# 单篇墙钟预算（秒）：超时即取消生成并释放并发槽位，0 表示不限
+summary_wall_budget_sec = 300
+# 流式模式下两次输出之间的最长等待（秒），服务端卡住时据此提前断开
+summary_stream_idle_sec = 60
+# token 计数方式（Controller/token_budget.py）：auto | tokenizers | tiktoken | heuristic | bytes
+# auto 依次尝试：tokenizers + 本地 tokenizer.json（把所用模型的 tokenizer.json 放到 TOKENIZER_JSON_PATH 即为精确计数）
+# → tiktoken（需本地已缓存 BPE 文件）→ 已校准的启发式估算 → bytes（UTF-8 字节数）
+# 仓库不附带 tokenizer.json；启发式（英文约 4 字母 1 token，数字 / 中日韩字符各 1 token）没有校准时误差没有上界、可能低估，
+# auto 此时不采用它，而回退到 bytes：字节级 BPE（Qwen 系列）每个 token 至少 1 字节，字节数不会低估（但英文约高估 4 倍）
+summary_tokenizer = "auto"
+TOKENIZER_JSON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tokenizer.json")
+# 启发式校准结果：python Controller/token_budget.py --calibrate <MinerU md 目录> --reference tokenizers|tiktoken 生成，
+# 记录参考分词器 / 启发式的逐篇比值，启发式计数乘以最大比值（scale）后用于预算
+TOKENIZER_CALIBRATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tokenizer_calibration.json")
+TIKTOKEN_ENCODING = "cl100k_base"
+# MinerU md 预处理（Controller/md_reduce.py）：调用大模型前按任务策略删除 / 压缩低价值内容，结果按内容哈希缓存
+# drop_sections：整节删除（references / acknowledgements / appendix）；images：drop 删除图片链接；
+# tables：compress 把超过 max_table_chars 的表格压缩为一行概要，drop 直接删除；max_math_chars：更长的行间公式替换为 [equation]
+MD_REDUCE_ENABLED = True
+MD_REDUCE_CACHE_DIR = os.path.join(DATA_ROOT, "md_reduce_cache")
+MD_REDUCE_POLICIES = {
+    # 机构识别只需标题、作者、机构与摘要
+    "pdf_info": {
+        "drop_sections": ["references", "acknowledgements", "appendix"],
+        "images": "drop",
+        "tables": "drop",
+        "max_table_chars": 0,
+        "max_math_chars": 200,
+    },
+    # 摘要保留正文与小表格，大表格只留行数与表头
+    "summary": {
+        "drop_sections": ["references", "acknowledgements", "appendix"],
+        "images": "drop",
+        "tables": "compress",
+        "max_table_chars": 1500,
+        "max_math_chars": 600,
+    },
+}
+
+# 大模型响应缓存（Controller/llm_cache.py，pdf_info 与 paper_summary 共用）
+# 键为 (模型, 系统提示词哈希, 用户内容哈希, temperature, max_tokens)；超过容量上限（MB）时按最近最少使用淘汰
+# 命令行 --no-llm-cache 可临时跳过缓存
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = os.path.join(DATA_ROOT, "llm_cache.sqlite3")
+LLM_CACHE_MAX_MB = 512
 
 
 
@@ -162,6 +286,7 @@ system_prompt = "你是一个论文总结助手。参考示例的风格与结构
 system_prompt = system_prompt + "\n示例：\n" + summary_example
 
 # 机构判断系统提示词
+# is_large 规则点名的机构须与 config/large_institutions.json 保持一致（本地名录判定以此为准）
 pdf_info_system_prompt = """
 仅基于给定论文前两页的 Markdown 文本，输出一个 JSON 对象，字段严格为：instution、is_large、abstract。
 instution 优先第一作者机构，其次通讯作者；若能识别通讯作者（例如 *、† 或脚注“Corresponding author”），优先通讯作者机构。
@@ -171,6 +296,35 @@ abstract 用一句话描述：用什么方法，使得什么，提升或减少
 只返回上述 JSON，不要输出额外文本或代码块。
 """
 
+# pdf_info 批量模式的系统提示词（字段规则与 pdf_info_system_prompt 相同）
+pdf_info_batch_system_prompt = """
+输入包含多篇论文前两页的 Markdown 文本，每篇以一行“=== arxiv_id: <编号> ===”开头。
+对每篇论文分别判断，输出一个 JSON 数组，每篇论文对应一个元素、顺序与输入一致；元素为 JSON 对象，字段严格为：arxiv_id、instution、is_large、abstract。
+arxiv_id 原样复制该篇开头的编号；不同论文之间的信息不要混用。
+instution 优先第一作者机构，其次通讯作者；若能识别通讯作者（例如 *、† 或脚注“Corresponding author”），优先通讯作者机构。
+机构名请尽量使用中文；若为全球广为人知的品牌或研究机构（如 Google、Meta、OpenAI、Microsoft Research、MIT、Stanford、CMU 等），则保留英文原文。
+is_large 为布尔值，“大机构”判断规则：如果机构包含 OpenAI、DeepMind、Google、Meta、Microsoft Research、MIT、Stanford、CMU 等则视为 true；其余为 false。
+abstract 用一句话描述：用什么方法，使得什么，提升或减少了多少。
+只返回上述 JSON 数组，不要输出额外文本或代码块。
+"""
+
+# 名录已判定 is_large 的论文只发送机构名 + 摘要段落，由模型给出中文机构名与一句话摘要（字段规则同上）
+pdf_info_abstract_system_prompt = """
+输入为一篇论文的第一作者机构（英文原文）与摘要。输出一个 JSON 对象，字段严格为：instution、abstract。
+instution 为该机构名：请尽量使用中文；若为全球广为人知的品牌或研究机构（如 Google、Meta、OpenAI、Microsoft Research、MIT、Stanford、CMU 等），则保留英文原文。
+abstract 用一句话描述：用什么方法，使得什么，提升或减少了多少。
+只返回上述 JSON，不要输出额外文本或代码块。
+"""
+
+pdf_info_abstract_batch_system_prompt = """
+输入包含多篇论文的第一作者机构（英文原文）与摘要，每篇以一行“=== arxiv_id: <编号> ===”开头。
+对每篇论文分别处理，输出一个 JSON 数组，每篇论文对应一个元素、顺序与输入一致；元素为 JSON 对象，字段严格为：arxiv_id、instution、abstract。
+arxiv_id 原样复制该篇开头的编号；不同论文之间的信息不要混用。
+instution 为该机构名：请尽量使用中文；若为全球广为人知的品牌或研究机构（如 Google、Meta、OpenAI、Microsoft Research、MIT、Stanford、CMU 等），则保留英文原文。
+abstract 用一句话描述：用什么方法，使得什么，提升或减少了多少。
+只返回上述 JSON 数组，不要输出额外文本或代码块。
+"""
+
 
 
 
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Controller.affiliation import AffiliationMatcher  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return AffiliationMatcher()
+
+
+def preview(*affiliations: str) -> str:
+    return "\n\n".join(["# A Title", "Alice Smith1, Bob Lee2", *affiliations, "## Abstract", "We do things."])
+
+
+@pytest.mark.parametrize(
+    "line, institution",
+    [
+        ("1Google Research, Mountain View", "Google"),
+        ("1Stanford University, CA", "Stanford"),
+        ("1Massachusetts Institute of Technology", "MIT"),
+        ("1Carnegie Mellon University", "CMU"),
+        ("aGoogle DeepMind, London", "DeepMind"),
+        ("*Google Research", "Google"),
+    ],
+)
+def test_glued_footnote_marker_still_matches(matcher, line, institution):
+    d = matcher.classify(preview(line, "2University of Toronto"))
+    assert d.verdict == "large"
+    assert d.institution == institution
+
+
+def test_glued_marker_on_second_affiliation_is_not_small(matcher):
+    d = matcher.classify(preview("1Zhejiang University", "2Stanford University, CA"))
+    assert d.verdict == "ambiguous"
+
+
+def test_dictionary_word_in_title_is_ignored(matcher):
+    text = "Meta Learning for Robust Control\n\nAlice\n\nZhejiang University\n\n## Abstract\n\nWe do x."
+    d = matcher.classify(text)
+    assert d.verdict == "small"
+    assert d.institution == "Zhejiang University"
+
+
+@pytest.mark.parametrize("line", ["FAIR, Meta", "Meta", "Meta, Menlo Park, CA"])
+def test_context_acronym_as_affiliation(matcher, line):
+    assert matcher.classify(preview(line)).verdict == "large"
@@ -0,0 +1,25 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+
+def test_handoff_uses_upstream_result():
+    results = {"pdf_split": {"date": "2026-10-15", "path": "data/preview_pdf/2026-10-15", "ids": ["2610.00001"]}}
+    assert app.handoff("pdfsplite_to_minerU", results) == (["--date", "2026-10-15"], ["2610.00001"])
+
+
+def test_handoff_falls_back_to_next_candidate():
+    results = {"pdfsplite_to_minerU": None, "stream_preview": {"date": "2026-10-15", "path": "x", "ids": ["a", "b"]}}
+    assert app.handoff("pdf_info", results) == (["--date", "2026-10-15"], ["a", "b"])
+
+
+def test_handoff_without_upstream_lets_the_step_discover_its_input():
+    assert app.handoff("instutions_filter", {}) == ([], None)
+
+
+def test_every_pipeline_step_has_a_handoff_or_is_first():
+    for steps in app.PIPELINES.values():
+        for step in app.order_steps(steps)[1:]:
+            assert step in app.STEP_HANDOFF
@@ -0,0 +1,55 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Controller.affiliation import AffiliationMatcher  # noqa: E402
+from Controller.pdf_convert import pdf_to_markdown  # noqa: E402
+
+pypdf = pytest.importorskip("pypdf")
+
+# 作者与机构行的上标编号用小字号、抬高基线单独绘制，与 LaTeX 论文一致
+FRONT = """BT /F1 17 Tf 1 0 0 1 72 740 Tm (Scaling Sparse Experts) Tj ET
+BT /F1 11 Tf 1 0 0 1 72 710 Tm (Alice Smith) Tj /F1 7 Tf 1 0 0 1 133 715 Tm (1) Tj
+/F1 11 Tf 1 0 0 1 137 710 Tm (Bob Lee) Tj /F1 7 Tf 1 0 0 1 182 715 Tm (2) Tj ET
+BT /F1 7 Tf 1 0 0 1 72 695 Tm (1) Tj /F1 9 Tf 1 0 0 1 76 690 Tm (Google Research, Mountain View) Tj ET
+BT /F1 7 Tf 1 0 0 1 72 680 Tm (2) Tj /F1 9 Tf 1 0 0 1 76 675 Tm (Stanford University, CA) Tj ET
+BT /F1 11 Tf 1 0 0 1 72 650 Tm (Abstract) Tj ET
+BT /F1 10 Tf 1 0 0 1 72 635 Tm (We present a new method for routing tokens.) Tj ET
+"""
+
+
+@pytest.fixture
+def superscript_pdf(tmp_path):
+    from pypdf import PdfWriter
+    from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+    w = PdfWriter()
+    page = w.add_blank_page(612, 792)
+    font = DictionaryObject(
+        {
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject("/Helvetica"),
+        }
+    )
+    page[NameObject("/Resources")] = DictionaryObject({NameObject("/Font"): DictionaryObject({NameObject("/F1"): w._add_object(font)})})
+    stream = DecodedStreamObject()
+    stream.set_data(FRONT.encode("latin-1"))
+    page[NameObject("/Contents")] = w._add_object(stream)
+    path = tmp_path / "sup.pdf"
+    w.write(str(path))
+    return str(path)
+
+
+def test_superscript_markers_are_separated(superscript_pdf):
+    md = pdf_to_markdown(superscript_pdf)
+    assert "Alice Smith 1 Bob Lee 2" in md
+    assert "1 Google Research, Mountain View" in md
+    assert "## Abstract" in md
+
+
+def test_superscript_affiliation_is_large(superscript_pdf):
+    d = AffiliationMatcher().classify(pdf_to_markdown(superscript_pdf))
+    assert (d.verdict, d.institution) == ("large", "Google")
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Controller import token_budget as tb  # noqa: E402
+
+TEXT = "# Method\n\nWe train $\\mathbf{x}_{i}$ with Zxqjvw-style anisotropic regularisation.\n\n表 1：结果 12345"
+
+
+@pytest.fixture(autouse=True)
+def fresh_instances(monkeypatch):
+    monkeypatch.setattr(tb, "_INSTANCES", {})
+
+
+def test_auto_skips_uncalibrated_heuristic(monkeypatch, tmp_path):
+    monkeypatch.setattr(tb, "TOKENIZER_JSON_PATH", str(tmp_path / "missing.json"))
+    monkeypatch.setattr(tb.load_calibration, "__defaults__", (str(tmp_path / "missing_cal.json"),))
+    monkeypatch.delitem(tb._BACKENDS, "tiktoken")
+    assert tb.get_tokenizer("auto").name == "bytes"
+
+
+def test_calibrated_scale_covers_the_reference(tmp_path):
+    docs = []
+    for i, text in enumerate([TEXT, "plain english words only " * 20, "$$\\sum_{k=1}^{n} a_k$$ " * 10]):
+        p = tmp_path / f"{i}.md"
+        p.write_text(text, encoding="utf-8")
+        docs.append(p)
+    reference = tb.ByteTokenizer()
+    cal = tb.calibrate(tb.md_files([str(tmp_path)]), reference)
+    assert cal["files"] == 3 and cal["scale"] >= cal["max_ratio"] >= cal["median_ratio"]
+    scaled = tb.HeuristicTokenizer(scale=cal["scale"])
+    for p in docs:
+        text = p.read_text(encoding="utf-8")
+        assert scaled.count(text) >= reference.count(text)
+
+
+def test_heuristic_reads_saved_calibration(monkeypatch, tmp_path):
+    path = tmp_path / "cal.json"
+    path.write_text('{"scale": 1.3}', encoding="utf-8")
+    monkeypatch.setattr(tb.load_calibration, "__defaults__", (str(path),))
+    tok = tb.HeuristicTokenizer()
+    assert tok.scale == 1.3
+    assert tok.name == "heuristic*1.3"
+    assert tok.count(TEXT) > tb.HeuristicTokenizer(scale=1.0).count(TEXT)